@@ -1,22 +1,128 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import requests
+import asyncio
 import json
 from path_config import API_URL, API_KEY
+from llm_cache import LLMCache
+from http_transport import HTTPTransport
 
 # 请求头
 headers = {"Content-Type": "application/json", "Authorization": f"Bearer {API_KEY}"}
 
+# 共用的HTTP传输层：连接复用、超时和失败重试，transport.metrics()查看请求延迟
+transport = HTTPTransport(API_URL, headers)
 
-def make_api_request(messages):
-    """发送API请求并返回响应"""
-    payload = {
+# LLM响应缓存：相同请求直接返回缓存结果；设为None可关闭，
+# 设为LLMCache(replay=True)则只从缓存回放，不再请求API
+response_cache = LLMCache()
+
+
+def _post(payload):
+    return transport.post_json(payload)
+
+
+def _payload(messages):
+    return {
         "model": "deepseek-chat",
         "messages": messages,
         "temperature": 0.3,
         "max_tokens": 4096,
     }
-    response = requests.post(API_URL, headers=headers, json=payload)
-    response.raise_for_status()
-    return response.json()
+
+
+def make_api_request(messages, use_cache=True):
+    """发送API请求并返回响应（优先使用响应缓存）"""
+    payload = _payload(messages)
+    if use_cache and response_cache is not None:
+        return response_cache.fetch(payload, _post)
+    return _post(payload)
+
+
+def stream_api_request(messages, on_delta=None, use_cache=True):
+    """
+    以流式（SSE）方式发送API请求，边接收边处理
+    参数:
+        messages: 消息列表
+        on_delta: 每收到一段文本时调用on_delta(text)；返回True时提前结束接收
+        use_cache: 是否使用响应缓存（命中时把缓存的完整回复一次性交给on_delta）
+    返回:
+        与make_api_request结构相同的响应字典；提前结束时finish_reason为"stopped"，
+        且不写入缓存
+    """
+    payload = _payload(messages)
+    if use_cache and response_cache is not None:
+        cached = response_cache.get(payload)
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached["choices"][0]["message"]["content"])
+            return cached
+
+    parts = []
+    finish_reason = None
+    usage = None
+    stopped = False
+    events = transport.stream(dict(payload, stream=True))
+    try:
+        for data in events:
+            if data.strip() == "[DONE]":
+                break
+            chunk = json.loads(data)
+            usage = chunk.get("usage") or usage
+            for choice in chunk.get("choices") or []:
+                finish_reason = choice.get("finish_reason") or finish_reason
+                text = (choice.get("delta") or {}).get("content")
+                if not text:
+                    continue
+                parts.append(text)
+                if on_delta is not None and on_delta(text):
+                    stopped = True
+            if stopped:
+                break
+    finally:
+        events.close()
+
+    response = {
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(parts)},
+                "finish_reason": "stopped" if stopped else finish_reason,
+            }
+        ],
+        "usage": usage,
+    }
+    if not stopped and use_cache and response_cache is not None:
+        response_cache.put(payload, response)
+    return response
+
+
+class AsyncLLMClient:
+    """
+    异步LLM客户端：在线程中执行make_api_request/stream_api_request（共用连接池、缓存和重试），
+    用信号量限制同时进行的请求数
+    参数:
+        max_concurrency: 最大并发请求数（不宜超过transport的连接池大小）
+    """
+
+    def __init__(self, max_concurrency=4):
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+
+    def _gate(self):
+        # 信号量在首次使用时创建，绑定到当前事件循环
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def request(self, messages, use_cache=True):
+        """异步版make_api_request"""
+        async with self._gate():
+            return await asyncio.to_thread(make_api_request, messages, use_cache)
+
+    async def stream(self, messages, on_delta=None, use_cache=True):
+        """异步版stream_api_request（on_delta在工作线程中调用）"""
+        async with self._gate():
+            return await asyncio.to_thread(
+                stream_api_request, messages, on_delta, use_cache
+            )
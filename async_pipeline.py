@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步建模流水线：标准化 → 提示词 → 生成有向图 → 提取JSON → 验证
+
+- LLM请求通过AsyncLLMClient在线程中执行，信号量限制并发数，
+  多段描述可以同时处理，共用HTTP连接池和响应缓存
+- 标准化请求与提示词组装（解析背景文档和样例库）同时进行
+- 每个阶段记录耗时；出错时记录出错阶段和错误信息，不影响其他描述
+- Plant Simulation通过COM调用，必须在初始化COM的线程中运行，不放入流水线
+"""
+
+import asyncio
+import functools
+import time
+
+from api_utils import AsyncLLMClient
+from dynamic_prompt import DynamicPromptGenerator
+from graph_preprocessor import convert_zero_capacity_conveyors_to_edges
+from json_utils import (
+    IncrementalGraphParser,
+    extract_json_from_response,
+    validate_edges,
+    validate_node,
+)
+from standardization import standardize_text_async
+
+STAGES = ("standardize", "prompt", "generate", "extract", "validate")
+
+
+@functools.lru_cache(maxsize=1)
+def _prompt_generator():
+    # 背景文档和样例库只解析一次，所有描述共用
+    return DynamicPromptGenerator()
+
+
+def looks_like_question(reply):
+    """与main.py相同的判断：回复中没有有向图时是否在询问补充信息"""
+    return "?" in reply or "请" in reply or "需要" in reply or "缺少" in reply
+
+
+async def standardize(raw_text, client, ask=None):
+    """标准化阶段，失败或需要补充信息（非交互）时返回None"""
+    return await standardize_text_async(raw_text, ask=ask, client=client)
+
+
+async def build_prompt(text):
+    """提示词阶段：在线程中生成动态系统提示词"""
+    return await asyncio.to_thread(
+        lambda: _prompt_generator().generate_dynamic_prompt(text)
+    )
+
+
+async def generate(system_prompt, history, client, on_delta=None):
+    """
+    有向图生成阶段
+    参数:
+        system_prompt: 系统提示词
+        history: 对话历史（最后一条为用户描述）
+        client: 异步LLM客户端
+        on_delta: 流式接收时每段文本的回调；None表示一次性接收
+    返回:
+        (回复文本, 增量解析器)，一次性接收时解析器为None
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend(history)
+    if on_delta is None:
+        result = await client.request(messages)
+        return result["choices"][0]["message"]["content"], None
+
+    parser = IncrementalGraphParser()
+
+    def feed(text):
+        parser.feed(text)
+        on_delta(text)
+
+    result = await client.stream(messages, feed)
+    return result["choices"][0]["message"]["content"], parser
+
+
+async def extract(reply, parser=None):
+    """提取阶段：优先使用流式解析得到的图，否则从完整回复中提取"""
+    if parser is not None and parser.graph is not None:
+        return parser.graph
+    return extract_json_from_response(reply)
+
+
+async def validate(graph_data):
+    """
+    验证阶段：与main.py相同的处理（补全字段、去除无效边、容量为0的传送器转为边），
+    另外列出节点和边的问题
+    返回:
+        (是否有效, 说明, 处理后的图数据, 问题列表)
+    """
+    # 延迟导入：visualize依赖matplotlib和tkinter，只在需要时加载
+    from visualize import ProductionLineVisualizer
+
+    problems = []
+    seen = []
+    for node in graph_data.get("nodes", []) if isinstance(graph_data, dict) else []:
+        name = node.get("name") if isinstance(node, dict) else None
+        for problem in validate_node(node, seen):
+            problems.append(f"节点 {name}: {problem}")
+        seen.append(name)
+    if isinstance(graph_data, dict):
+        problems.extend(validate_edges(graph_data))
+
+    is_valid, message, processed = (
+        ProductionLineVisualizer.process_and_validate_graph_data(graph_data)
+    )
+    if is_valid:
+        processed = convert_zero_capacity_conveyors_to_edges(processed)
+    return is_valid, message, processed, problems
+
+
+async def process_description(text, client=None, ask=None, on_delta=None):
+    """
+    对一段生产线描述运行整个流水线
+    参数:
+        text: 生产线描述
+        client: 异步LLM客户端（默认新建）
+        ask: 标准化阶段获取补充信息的函数；None表示非交互
+        on_delta: 生成阶段流式接收的回调；None表示一次性接收
+    返回:
+        结果字典：input、standardized、reply、graph、problems、question、error、
+        timings（各阶段耗时，秒）
+    """
+    if client is None:
+        client = AsyncLLMClient()
+    record = {
+        "input": text,
+        "standardized": None,
+        "reply": None,
+        "graph": None,
+        "problems": [],
+        "question": None,
+        "error": None,
+        "timings": {},
+    }
+    started = time.perf_counter()
+    stage = "standardize"
+
+    async def timed(name, coroutine):
+        nonlocal stage
+        stage = name
+        stage_start = time.perf_counter()
+        try:
+            return await coroutine
+        finally:
+            record["timings"][name] = time.perf_counter() - stage_start
+
+    try:
+        # 标准化与提示词组装同时进行（提示词按原始描述检索背景模块，与main.py一致）
+        standardized, system_prompt = await asyncio.gather(
+            timed("standardize", standardize(text, client, ask)),
+            timed("prompt", build_prompt(text)),
+        )
+        record["standardized"] = standardized
+        history = [{"role": "user", "content": standardized or text}]
+
+        reply, parser = await timed(
+            "generate", generate(system_prompt, history, client, on_delta)
+        )
+        record["reply"] = reply
+
+        graph_data = await timed("extract", extract(reply, parser))
+        if not graph_data:
+            if (parser is not None and parser.question is not None) or looks_like_question(
+                reply
+            ):
+                record["question"] = reply
+            else:
+                record["error"] = "extract: 无法从响应中提取有效的JSON数据"
+            return record
+
+        is_valid, message, processed, problems = await timed(
+            "validate", validate(graph_data)
+        )
+        record["problems"] = problems
+        if not is_valid:
+            record["error"] = f"validate: {message}"
+            return record
+        record["graph"] = processed
+    except Exception as e:
+        record["error"] = f"{stage}: {type(e).__name__} - {str(e)}"
+    finally:
+        record["timings"]["total"] = time.perf_counter() - started
+    return record
+
+
+async def process_descriptions(texts, max_concurrency=4, on_result=None):
+    """
+    并发处理多段描述
+    参数:
+        texts: 描述列表
+        max_concurrency: 最大并发LLM请求数
+        on_result: 每完成一段时调用on_result(index, record)
+    返回:
+        与texts顺序一致的结果字典列表
+    """
+    client = AsyncLLMClient(max_concurrency)
+
+    async def run(index, text):
+        record = await process_description(text, client)
+        if on_result is not None:
+            on_result(index, record)
+        return record
+
+    return await asyncio.gather(*(run(i, text) for i, text in enumerate(texts)))
+
+
+async def prepare_description(text, ask=None, client=None):
+    """
+    交互式流程的准备阶段：标准化请求进行时同时解析背景文档、初始化字体
+    返回:
+        (标准化后的文本或None, DynamicPromptGenerator)
+    """
+    from visualize import ProductionLineVisualizer
+
+    standardized, generator, _ = await asyncio.gather(
+        standardize_text_async(text, ask=ask, client=client),
+        asyncio.to_thread(DynamicPromptGenerator),
+        asyncio.to_thread(ProductionLineVisualizer.initialize_fonts, False),
+    )
+    return standardized, generator
+
+
+def run_pipeline(texts, max_concurrency=4):
+    """process_descriptions的同步入口"""
+    return asyncio.run(process_descriptions(texts, max_concurrency))
+
+
+def format_pipeline_record(record):
+    """格式化单段描述的处理结果"""
+    timings = ", ".join(
+        f"{name} {record['timings'][name]:.2f}秒"
+        for name in STAGES + ("total",)
+        if name in record["timings"]
+    )
+    if record["error"]:
+        status = f"❌ {record['error']}"
+    elif record["question"]:
+        status = "❓ 需要补充信息"
+    else:
+        graph = record["graph"]
+        status = (
+            f"✅ {len(graph.get('nodes', []))} 个节点, {len(graph.get('edges', []))} 条边"
+        )
+    lines = [status, f"  耗时: {timings}"]
+    lines.extend(f"  ⚠️ {problem}" for problem in record["problems"])
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    sample_descriptions = [
+        "源每隔10分钟产生一个毛坯，进入容量为8的缓冲区，再由加工工位加工，"
+        "加工时间服从均值200秒、标准差30秒的正态分布，加工完成后进入物料终结",
+        "源每隔5分钟产生一个零件，经过长2米、速度1m/s、容量2的传送器送到检测工位，"
+        "检测时间固定为1分钟，检测后进入物料终结",
+    ]
+    for record in run_pipeline(sample_descriptions):
+        print(format_pipeline_record(record))
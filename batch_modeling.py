@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量建模命令：从JSONL文件读取生产线描述，无交互地并发运行
+标准化 → 生成有向图 → 验证 → 生成SimTalk代码，每段描述的结果写为输出文件的一行
+
+- 每完成一段就追加写入并刷新到磁盘；中断后用相同命令重新运行，
+  输出文件中已有结果的描述会被跳过（--retry-failed时重新处理出错的描述）
+- 崩溃时写了一半的最后一行在续跑前被截掉
+- LLM响应缓存默认开启，背景文档修改后重新生成时，标准化结果可直接命中缓存
+
+用法:
+    python batch_modeling.py descriptions.jsonl -o results.jsonl --concurrency 4
+输入每行一个JSON对象，例如 {"id": "line-01", "description": "源每隔10分钟..."}
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import api_utils
+from async_pipeline import process_descriptions
+from http_transport import format_transport_metrics
+from llm_cache import DEFAULT_CACHE_PATH, LLMCache, format_cache_stats
+from simtalk_generator import json_to_simtalk
+
+
+def read_descriptions(path, id_field="id", text_field="description"):
+    """
+    读取输入JSONL
+    参数:
+        path: 输入文件路径
+        id_field: 记录编号字段（缺失时用行号 line-N）
+        text_field: 描述文本字段
+    返回:
+        (描述列表[(编号, 文本)], 无效行的错误记录列表)
+    """
+    items = []
+    invalid = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                invalid.append({"id": f"line-{line_number}", "error": f"input: {e}"})
+                continue
+            if not isinstance(entry, dict):
+                invalid.append({"id": f"line-{line_number}", "error": "input: 不是JSON对象"})
+                continue
+            item_id = str(entry.get(id_field, f"line-{line_number}"))
+            text = entry.get(text_field)
+            if not isinstance(text, str) or not text.strip():
+                invalid.append({"id": item_id, "error": f"input: 缺少{text_field}字段"})
+                continue
+            if item_id in seen:
+                print(f"⚠️ 第{line_number}行编号 {item_id} 重复，已跳过")
+                continue
+            seen.add(item_id)
+            items.append((item_id, text))
+    return items, invalid
+
+
+def load_finished(path):
+    """
+    读取已有输出，截掉崩溃时写了一半的最后一行
+    返回:
+        字典 {编号: 最后一条结果记录}
+    """
+    finished = {}
+    if not os.path.exists(path):
+        return finished
+
+    with open(path, "rb+") as f:
+        content = f.read()
+        if content and not content.endswith(b"\n"):
+            keep = content.rfind(b"\n") + 1
+            print(f"⚠️ 输出文件最后一行不完整，已截掉 {len(content) - keep} 字节")
+            f.truncate(keep)
+            content = content[:keep]
+
+    for line in content.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(record, dict) and "id" in record:
+            finished[str(record["id"])] = record
+    return finished
+
+
+class ResultWriter:
+    """逐行追加结果记录，每行写完即刷新到磁盘"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def build_result(item_id, record):
+    """在流水线结果上生成SimTalk代码，组成输出记录"""
+    result = {
+        "id": item_id,
+        "input": record["input"],
+        "standardized": record["standardized"],
+        "graph": record["graph"],
+        "simtalk": None,
+        "question": record["question"],
+        "problems": record["problems"],
+        "error": record["error"],
+        "timings": dict(record["timings"]),
+    }
+    if record["graph"] is not None and record["error"] is None:
+        started = time.perf_counter()
+        try:
+            model_setup_code, data_writing_code = json_to_simtalk(record["graph"])
+            result["simtalk"] = {
+                "model_setup": model_setup_code,
+                "data_writing": data_writing_code,
+            }
+        except Exception as e:
+            result["error"] = f"simtalk: {type(e).__name__} - {str(e)}"
+        result["timings"]["simtalk"] = time.perf_counter() - started
+    result["finished_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    return result
+
+
+def run_batch(
+    input_path,
+    output_path,
+    concurrency=4,
+    id_field="id",
+    text_field="description",
+    retry_failed=False,
+    limit=None,
+):
+    """
+    批量处理描述文件
+    参数:
+        input_path: 输入JSONL
+        output_path: 输出JSONL（追加写入，可续跑）
+        concurrency: 最大并发LLM请求数
+        id_field, text_field: 输入记录的编号字段和描述字段
+        retry_failed: 是否重新处理输出中出错的描述
+        limit: 本次最多处理的描述数
+    返回:
+        统计字典：total、skipped、processed、succeeded、questions、failed、wall_time
+    """
+    items, invalid = read_descriptions(input_path, id_field, text_field)
+    finished = load_finished(output_path)
+
+    def is_done(item_id):
+        record = finished.get(item_id)
+        return record is not None and not (retry_failed and record.get("error"))
+
+    total = len(items) + len(invalid)
+    pending = [(item_id, text) for item_id, text in items if not is_done(item_id)]
+    invalid = [entry for entry in invalid if not is_done(entry["id"])]
+    skipped = total - len(pending) - len(invalid)
+    if limit is not None:
+        pending = pending[:limit]
+    summary = {
+        "total": total,
+        "skipped": skipped,
+        "processed": 0,
+        "succeeded": 0,
+        "questions": 0,
+        "failed": len(invalid),
+        "wall_time": 0.0,
+    }
+    print(
+        f"📄 共 {summary['total']} 段描述，已完成 {summary['skipped']} 段，"
+        f"本次处理 {len(pending)} 段（并发 {concurrency}）"
+    )
+
+    started = time.perf_counter()
+    with ResultWriter(output_path) as writer:
+        for entry in invalid:
+            writer.write(dict(entry, finished_at=time.strftime("%Y-%m-%d %H:%M:%S")))
+
+        def on_result(index, record):
+            item_id = pending[index][0]
+            result = build_result(item_id, record)
+            writer.write(result)
+            summary["processed"] += 1
+            if result["error"]:
+                summary["failed"] += 1
+                status = f"❌ {result['error']}"
+            elif result["question"]:
+                summary["questions"] += 1
+                status = "❓ 需要补充信息"
+            else:
+                summary["succeeded"] += 1
+                status = f"✅ {len(result['graph'].get('nodes', []))} 个节点"
+            print(
+                f"[{summary['processed']}/{len(pending)}] {item_id}: {status} "
+                f"({result['timings'].get('total', 0.0):.1f}秒)"
+            )
+
+        if pending:
+            asyncio.run(
+                process_descriptions(
+                    [text for _, text in pending], concurrency, on_result=on_result
+                )
+            )
+    summary["wall_time"] = time.perf_counter() - started
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="从JSONL批量生成有向图和Plant Simulation代码（可中断续跑）"
+    )
+    parser.add_argument("input", help="输入JSONL文件，每行一段描述")
+    parser.add_argument("-o", "--output", help="输出JSONL文件（默认为 输入名.results.jsonl）")
+    parser.add_argument("-j", "--concurrency", type=int, default=4, help="最大并发LLM请求数")
+    parser.add_argument("--id-field", default="id", help="编号字段名（缺失时用行号）")
+    parser.add_argument("--text-field", default="description", help="描述字段名")
+    parser.add_argument("--retry-failed", action="store_true", help="重新处理出错的描述")
+    parser.add_argument("--limit", type=int, help="本次最多处理的描述数")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="LLM响应缓存文件")
+    parser.add_argument("--no-cache", action="store_true", help="不使用LLM响应缓存")
+    parser.add_argument(
+        "--replay", action="store_true", help="只从缓存回放，不请求API（未命中记为错误）"
+    )
+    args = parser.parse_args(argv)
+
+    if args.concurrency < 1:
+        parser.error("--concurrency 必须至少为1")
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    if args.no_cache:
+        api_utils.response_cache = None
+    else:
+        api_utils.response_cache = LLMCache(args.cache, replay=args.replay)
+
+    summary = run_batch(
+        args.input,
+        output,
+        concurrency=args.concurrency,
+        id_field=args.id_field,
+        text_field=args.text_field,
+        retry_failed=args.retry_failed,
+        limit=args.limit,
+    )
+    print(
+        f"\n📊 处理 {summary['processed']} 段：成功 {summary['succeeded']}，"
+        f"需要补充信息 {summary['questions']}，失败 {summary['failed']}；"
+        f"跳过 {summary['skipped']} 段，耗时 {summary['wall_time']:.1f} 秒"
+    )
+    print(f"💾 结果已写入: {output}")
+    if api_utils.response_cache is not None:
+        print(format_cache_stats(api_utils.response_cache.stats()))
+    print(format_transport_metrics(api_utils.transport.metrics()))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+瓶颈分析：统计每个工位的工作、阻塞、空闲（缺料）、故障时间占比，
+并用活动周期法（active period method）识别随时间变化的瓶颈
+
+活动周期法：工位处于工作或故障状态时为“活动”，否则（阻塞、缺料）为“非活动”。
+任一时刻，当前活动周期最长的工位是该时刻的瓶颈；相邻两个瓶颈的活动周期
+重叠的时间为“漂移瓶颈”（两者都计入），其余为“唯一瓶颈”。
+瓶颈占比 = 唯一瓶颈占比 + 漂移瓶颈占比，占比最大的为主导瓶颈。
+"""
+
+import numpy as np
+
+from simulation_engine import SECONDS_PER_DAY, STATION, ProductionLineSimulator
+
+WORKING = 0
+BLOCKED = 1
+STARVED = 2
+FAILED = 3
+
+STATE_NAMES = ("working", "blocked", "starved", "failed")
+STATE_LABELS = {
+    "working": "工作",
+    "blocked": "阻塞",
+    "starved": "缺料",
+    "failed": "故障",
+}
+
+# 按时间分段统计主导瓶颈的段数
+DEFAULT_WINDOWS = 8
+
+
+class _StationTrack:
+    """单个工位的状态记录"""
+
+    __slots__ = ("state", "since", "totals", "active_start", "periods")
+
+    def __init__(self):
+        self.state = STARVED
+        self.since = 0.0
+        self.totals = [0.0, 0.0, 0.0, 0.0]
+        self.active_start = None
+        self.periods = []  # 活动周期[(开始, 结束)]
+
+
+class StateTrackingSimulator(ProductionLineSimulator):
+    """在每次可能改变工位状态的操作后记录状态的仿真器"""
+
+    def __init__(self, graph_data, seed=None, end_time=None):
+        super().__init__(graph_data, seed=seed, end_time=end_time)
+        self.tracks = {
+            sim_node.index: _StationTrack() for sim_node in self.nodes if sim_node.type == STATION
+        }
+
+    def _station_state(self, sim_node):
+        if sim_node.failed:
+            return FAILED
+        if not sim_node.parts:
+            return STARVED
+        ready_at = sim_node.parts[0].ready_at
+        if ready_at is None:
+            return FAILED
+        return WORKING if ready_at > self.now else BLOCKED
+
+    def _record(self, sim_node):
+        track = self.tracks.get(sim_node.index)
+        if track is None:
+            return
+        state = self._station_state(sim_node)
+        if state == track.state:
+            return
+        now = self.now
+        track.totals[track.state] += now - track.since
+        was_active = track.state in (WORKING, FAILED)
+        is_active = state in (WORKING, FAILED)
+        if is_active and not was_active:
+            # 同一时刻放行后立即接收新零件时，活动周期视为连续
+            if track.periods and track.periods[-1][1] == now:
+                track.active_start = track.periods.pop()[0]
+            else:
+                track.active_start = now
+        elif was_active and not is_active:
+            track.periods.append((track.active_start, now))
+        track.state = state
+        track.since = now
+
+    def _enter(self, sim_node, part):
+        super()._enter(sim_node, part)
+        self._record(sim_node)
+
+    def _try_release(self, sim_node):
+        super()._try_release(sim_node)
+        self._record(sim_node)
+
+    def _fail(self, sim_node):
+        super()._fail(sim_node)
+        self._record(sim_node)
+
+    def _repair(self, sim_node):
+        super()._repair(sim_node)
+        self._record(sim_node)
+
+    def _start_outage(self, sim_node):
+        super()._start_outage(sim_node)
+        self._record(sim_node)
+
+    def _end_outage(self, sim_node):
+        super()._end_outage(sim_node)
+        self._record(sim_node)
+
+    def finish_tracking(self):
+        """在当前时刻结束所有状态记录"""
+        now = self.now
+        for track in self.tracks.values():
+            track.totals[track.state] += now - track.since
+            track.since = now
+            if track.state in (WORKING, FAILED):
+                track.periods.append((track.active_start, now))
+                track.active_start = now
+
+
+def active_period_bottlenecks(periods, horizon):
+    """
+    活动周期法
+
+    参数:
+        periods: 每个工位的活动周期列表[[(开始, 结束)], ...]
+        horizon: 统计时长
+
+    返回:
+        tuple: (sole, shifting, runs)
+            sole/shifting: 每个工位唯一瓶颈、漂移瓶颈的时间
+            runs: 瞬时瓶颈的时间段[(开始, 结束, 工位序号)]，无瓶颈时工位序号为-1
+    """
+    count = len(periods)
+    sole = np.zeros(count)
+    shifting = np.zeros(count)
+    arrays = [np.asarray(items, dtype=float).reshape(-1, 2) for items in periods]
+    boundaries = np.unique(np.concatenate([[0.0, horizon]] + [a.ravel() for a in arrays]))
+    boundaries = boundaries[(boundaries >= 0) & (boundaries <= horizon)]
+    if len(boundaries) < 2:
+        return sole, shifting, []
+    middles = (boundaries[:-1] + boundaries[1:]) / 2.0
+
+    # 每个基本区间内活动周期最长的工位及其活动周期序号
+    best_duration = np.zeros(len(middles))
+    best_station = np.full(len(middles), -1)
+    best_period = np.full(len(middles), -1)
+    for station, array in enumerate(arrays):
+        if len(array) == 0:
+            continue
+        starts, ends = array[:, 0], array[:, 1]
+        position = np.searchsorted(starts, middles, side="right") - 1
+        clipped = np.maximum(position, 0)
+        covered = (position >= 0) & (middles < ends[clipped])
+        duration = np.where(covered, ends[clipped] - starts[clipped], 0.0)
+        better = duration > best_duration
+        best_duration[better] = duration[better]
+        best_station[better] = station
+        best_period[better] = clipped[better]
+
+    # 合并为连续的瓶颈时间段
+    change = np.flatnonzero(
+        (np.diff(best_station) != 0) | (np.diff(best_period) != 0)
+    ) + 1
+    run_starts = np.concatenate(([0], change))
+    run_ends = np.concatenate((change, [len(middles)]))
+    runs = [
+        (float(boundaries[first]), float(boundaries[last]), int(best_station[first]),
+         int(best_period[first]))
+        for first, last in zip(run_starts, run_ends)
+    ]
+
+    # 相邻瓶颈（不同工位）的活动周期重叠部分为漂移瓶颈
+    overlaps = [None] * len(runs)  # 与下一个瓶颈时间段的重叠区间
+    for position in range(len(runs) - 1):
+        _, _, station, period = runs[position]
+        _, _, next_station, next_period = runs[position + 1]
+        if station < 0 or next_station < 0 or station == next_station:
+            continue
+        start = max(arrays[station][period, 0], arrays[next_station][next_period, 0])
+        end = min(arrays[station][period, 1], arrays[next_station][next_period, 1])
+        if end > start:
+            overlaps[position] = (start, end)
+            shifting[station] += end - start
+            shifting[next_station] += end - start
+
+    for position, (start, end, station, _) in enumerate(runs):
+        if station < 0:
+            continue
+        length = end - start
+        for window in (overlaps[position - 1] if position > 0 else None, overlaps[position]):
+            if window is not None:
+                length -= max(0.0, min(end, window[1]) - max(start, window[0]))
+        sole[station] += max(length, 0.0)
+
+    return sole, shifting, [(start, end, station) for start, end, station, _ in runs]
+
+
+def analyze_bottlenecks(graph_data, seed=None, end_time=None, windows=DEFAULT_WINDOWS):
+    """
+    运行一次仿真并进行瓶颈分析
+
+    参数:
+        graph_data: 与simulate_graph相同的图数据
+        seed: 随机数种子
+        end_time: 仿真结束时间，默认使用源节点的stop_time
+        windows: 按时间等分的段数，每段给出主导瓶颈
+
+    返回:
+        dict: horizon（统计时长，秒）、
+              stations（{工位名称: 各状态占比及sole、shifting、bottleneck瓶颈占比}）、
+              ranking（按瓶颈占比从大到小的工位名称）、dominant（主导瓶颈，无工位时为None）、
+              windows（[{start, end, bottleneck, share}]各时间段的主导瓶颈）、
+              statistics（物料终结统计）
+    """
+    sim = StateTrackingSimulator(graph_data, seed=seed, end_time=end_time)
+    statistics = sim.run()
+    sim.finish_tracking()
+    return bottleneck_report(sim, statistics, windows)
+
+
+def bottleneck_report(sim, statistics, windows=DEFAULT_WINDOWS):
+    """
+    由已运行结束的StateTrackingSimulator生成瓶颈分析结果（返回值同analyze_bottlenecks），
+    供已经运行过一次仿真的调用方（如what-if会话的基准运行）复用，无需再仿真
+
+    参数:
+        sim: 已调用run()和finish_tracking()的StateTrackingSimulator
+        statistics: sim.run()返回的物料终结统计
+        windows: 按时间等分的段数
+    """
+    horizon = sim.now - sim.stat_start
+
+    indices = list(sim.tracks)
+    names = [sim.nodes[index].name for index in indices]
+    tracks = [sim.tracks[index] for index in indices]
+    sole, shifting, runs = active_period_bottlenecks(
+        [track.periods for track in tracks], horizon
+    )
+
+    stations = {}
+    for position, (name, track) in enumerate(zip(names, tracks)):
+        shares = {
+            state_name: (track.totals[state] / horizon if horizon > 0 else 0.0)
+            for state, state_name in enumerate(STATE_NAMES)
+        }
+        shares["sole"] = sole[position] / horizon if horizon > 0 else 0.0
+        shares["shifting"] = shifting[position] / horizon if horizon > 0 else 0.0
+        shares["bottleneck"] = shares["sole"] + shares["shifting"]
+        stations[name] = shares
+    ranking = sorted(
+        names, key=lambda name: (stations[name]["bottleneck"], stations[name]["sole"]), reverse=True
+    )
+
+    window_report = []
+    if horizon > 0 and windows > 0:
+        edges = np.linspace(sim.stat_start, sim.stat_start + horizon, windows + 1)
+        for start, end in zip(edges[:-1], edges[1:]):
+            time_by_station = np.zeros(len(names))
+            for run_start, run_end, station in runs:
+                if station >= 0:
+                    time_by_station[station] += max(0.0, min(end, run_end) - max(start, run_start))
+            leader = int(np.argmax(time_by_station)) if len(names) else -1
+            window_report.append({
+                "start": float(start),
+                "end": float(end),
+                "bottleneck": names[leader] if leader >= 0 and time_by_station[leader] > 0 else None,
+                "share": float(time_by_station[leader] / (end - start)) if leader >= 0 else 0.0,
+            })
+
+    return {
+        "horizon": horizon,
+        "stations": stations,
+        "ranking": ranking,
+        "dominant": ranking[0] if ranking and stations[ranking[0]]["bottleneck"] > 0 else None,
+        "windows": window_report,
+        "statistics": statistics,
+    }
+
+
+def format_bottleneck_report(report):
+    """格式化瓶颈分析结果"""
+    lines = ["工位状态占比及瓶颈占比（活动周期法）:"]
+    header = "  工位\t" + "\t".join(STATE_LABELS[name] for name in STATE_NAMES)
+    lines.append(header + "\t唯一瓶颈\t漂移瓶颈\t瓶颈合计")
+    for name in report["ranking"]:
+        shares = report["stations"][name]
+        values = [shares[key] for key in STATE_NAMES + ("sole", "shifting", "bottleneck")]
+        lines.append(f"  {name}\t" + "\t".join(f"{value * 100:.1f}%" for value in values))
+    if report["dominant"]:
+        share = report["stations"][report["dominant"]]["bottleneck"]
+        lines.append(f"🔴 主导瓶颈: {report['dominant']}（瓶颈占比 {share * 100:.1f}%）")
+    else:
+        lines.append("未发现瓶颈（没有工位处于活动状态）")
+    if report["windows"]:
+        lines.append("各时间段的主导瓶颈:")
+        for window in report["windows"]:
+            lines.append(
+                f"  {window['start'] / SECONDS_PER_DAY:.2f}天 - {window['end'] / SECONDS_PER_DAY:.2f}天: "
+                f"{window['bottleneck'] or '无'}（{window['share'] * 100:.1f}%）"
+            )
+    return "\n".join(lines)
+
+
+def bottleneck_highlight(report):
+    """生成ProductionLineVisualizer.show_static的highlight参数（标记主导瓶颈）"""
+    dominant = report["dominant"]
+    if dominant is None:
+        return {}
+    share = report["stations"][dominant]["bottleneck"]
+    return {dominant: f"瓶颈 {share * 100:.0f}%"}
+
+
+if __name__ == "__main__":
+    sample_graph_data = {
+        "nodes": [
+            {
+                "name": "源",
+                "type": "源",
+                "data": {"time": {"interval_time": "0:0:5:0", "stop_time": "2:0:0:0"}},
+            },
+            {"name": "缓冲区1", "type": "缓冲区", "data": {"capacity": 5}},
+            {
+                "name": "车削工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "normal",
+                            "parameters": {"mean": 250, "sigma": 40},
+                        }
+                    },
+                    "failure": {
+                        "interval_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 7200},
+                        },
+                        "duration_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 1200},
+                        },
+                    },
+                },
+            },
+            {"name": "缓冲区2", "type": "缓冲区", "data": {"capacity": 5}},
+            {
+                "name": "铣削工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "normal",
+                            "parameters": {"mean": 270, "sigma": 30},
+                        }
+                    }
+                },
+            },
+            {
+                "name": "检测工位",
+                "type": "工位",
+                "data": {"time": {"processing_time": "0:0:2:0"}},
+            },
+            {"name": "合格库存", "type": "物料终结", "data": {}},
+        ],
+        "edges": [
+            {"from": "源", "to": "缓冲区1"},
+            {"from": "缓冲区1", "to": "车削工位"},
+            {"from": "车削工位", "to": "缓冲区2"},
+            {"from": "缓冲区2", "to": "铣削工位"},
+            {"from": "铣削工位", "to": "检测工位"},
+            {"from": "检测工位", "to": "合格库存"},
+        ],
+    }
+    print(format_bottleneck_report(analyze_bottlenecks(sample_graph_data, seed=1)))
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缓冲区容量分配优化：在总容量预算内分配各缓冲区（及可选的积放式传送器）的容量，
+使物料终结的吞吐量最大；或寻找达到目标吞吐量所需的最小总容量
+
+- 筛选：串联生产线使用递推求值（固定种子，即公共随机数），其他结构使用排队网络解析估算，
+  也可指定用单次仿真筛选
+- 搜索：从每个节点的最小容量开始，每次把一个单位容量加给边际收益最大的节点（贪心），
+  预算模式下再在节点之间逐个移动容量做局部搜索，直到没有改进
+- 确认：筛选得分最高的若干候选方案用并行重复仿真确认（公共随机数），取仿真均值最优者
+- 输出：设置了最优容量的图数据，可直接交给json_to_simtalk
+"""
+
+import math
+import time
+
+import numpy as np
+
+from experiment_design import apply_factors, run_experiment
+from queueing_estimator import estimate_graph
+from serial_line import evaluate_serial_line, serial_chain
+from simulation_engine import BUFFER, CONVEYOR, parse_quantity, simulate_graph
+
+SCREEN_AUTO = "auto"
+SCREEN_ANALYTIC = "analytic"
+SCREEN_SERIAL = "serial"
+SCREEN_SIMULATION = "simulation"
+
+DEFAULT_FINALISTS = 5
+DEFAULT_REPLICATIONS = 10
+MIN_CAPACITY = 1
+
+# 局部搜索的最大移动次数
+MAX_MOVES = 200
+
+
+def allocatable_nodes(graph_data, include_conveyors=True):
+    """
+    可分配容量的节点：缓冲区，以及设置了正容量的传送器（积放式）
+
+    返回:
+        list: 节点名称
+    """
+    names = []
+    for node in graph_data.get("nodes", []):
+        if node["type"] == BUFFER:
+            names.append(node["name"])
+        elif node["type"] == CONVEYOR and include_conveyors:
+            capacity = parse_quantity(node.get("data", {}).get("capacity"))
+            if capacity and capacity > 0:
+                names.append(node["name"])
+    return names
+
+
+def _capacity_factors(names):
+    return [{"node": name, "field": "capacity"} for name in names]
+
+
+def _throughput(statistics, drain):
+    """物料终结的每天吞吐量（未指定时为所有物料终结之和）"""
+    if drain is not None:
+        return statistics[drain]["statthroughputperday"]
+    return sum(values["statthroughputperday"] for values in statistics.values())
+
+
+def _screening_function(graph_data, names, screening, seed, end_time, drain):
+    """返回筛选函数：容量向量 -> 估算的每天吞吐量"""
+    if screening == SCREEN_AUTO:
+        screening = SCREEN_SERIAL if serial_chain(graph_data) is not None else SCREEN_ANALYTIC
+    factors = _capacity_factors(names)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy  # 所有候选方案共用同一种子
+
+    if screening == SCREEN_ANALYTIC:
+        def screen(capacities):
+            estimate = estimate_graph(apply_factors(graph_data, factors, capacities))
+            return _throughput(estimate["throughput"], drain)
+    elif screening == SCREEN_SERIAL:
+        if serial_chain(graph_data) is None:
+            raise ValueError("递推求值筛选只适用于单一串联生产线")
+
+        def screen(capacities):
+            graph = apply_factors(graph_data, factors, capacities)
+            return _throughput(evaluate_serial_line(graph, seed=seed, end_time=end_time), drain)
+    elif screening == SCREEN_SIMULATION:
+        def screen(capacities):
+            graph = apply_factors(graph_data, factors, capacities)
+            return _throughput(simulate_graph(graph, seed=seed, end_time=end_time), drain)
+    else:
+        raise ValueError(f"未知的筛选方法 '{screening}'")
+    return screening, screen
+
+
+class _Search:
+    """带缓存的容量向量搜索"""
+
+    def __init__(self, screen, count, min_capacity):
+        self.screen = screen
+        self.count = count
+        self.min_capacity = min_capacity
+        self.scores = {}
+
+    def score(self, capacities):
+        capacities = tuple(capacities)
+        if capacities not in self.scores:
+            self.scores[capacities] = self.screen(capacities)
+        return self.scores[capacities]
+
+    def best_increment(self, capacities):
+        """给边际收益最大的节点加一个单位容量"""
+        candidates = []
+        for position in range(self.count):
+            candidate = list(capacities)
+            candidate[position] += 1
+            candidates.append((self.score(candidate), -position, tuple(candidate)))
+        return max(candidates)[2]
+
+    def local_search(self, capacities, max_moves=MAX_MOVES):
+        """在节点之间逐个移动单位容量，直到没有改进"""
+        capacities = tuple(capacities)
+        current = self.score(capacities)
+        for _ in range(max_moves):
+            best = None
+            for giver in range(self.count):
+                if capacities[giver] <= self.min_capacity:
+                    continue
+                for taker in range(self.count):
+                    if taker == giver:
+                        continue
+                    candidate = list(capacities)
+                    candidate[giver] -= 1
+                    candidate[taker] += 1
+                    value = self.score(candidate)
+                    if value > current + 1e-9 and (best is None or value > best[0]):
+                        best = (value, tuple(candidate))
+            if best is None:
+                break
+            current, capacities = best
+        return capacities
+
+
+def optimize_buffers(
+    graph_data,
+    budget=None,
+    target=None,
+    drain=None,
+    include_conveyors=True,
+    min_capacity=MIN_CAPACITY,
+    max_total=None,
+    screening=SCREEN_AUTO,
+    finalists=DEFAULT_FINALISTS,
+    replications=DEFAULT_REPLICATIONS,
+    seed=None,
+    max_workers=None,
+    end_time=None,
+    confidence=0.95,
+):
+    """
+    缓冲区容量分配优化
+
+    参数:
+        graph_data: 已确认的图数据
+        budget: 总容量预算（预算模式：在预算内最大化吞吐量）
+        target: 目标每天吞吐量（目标模式：寻找达到目标的最小总容量），与budget二选一
+        drain: 作为目标的物料终结名称，默认为所有物料终结之和
+        include_conveyors: 是否同时分配积放式传送器的容量
+        min_capacity: 每个节点的最小容量
+        max_total: 目标模式下总容量的上限，默认为节点数×100
+        screening: 筛选方法 "auto"、"analytic"（解析估算）、"serial"（串联递推）、
+                   "simulation"（单次仿真）
+        finalists: 用并行仿真确认的候选方案个数
+        replications: 确认时每个候选方案的重复次数
+        seed: 主随机数种子
+        max_workers, end_time, confidence: 同run_replications
+
+    返回:
+        dict: graph（设置了最优容量的图数据）、allocation（{节点名称: 容量}）、total、
+              throughput（确认仿真的confidence_interval结果，个/天）、
+              target_met（目标模式下是否达到目标）、
+              finalists（[{allocation, total, screened, confirmed}]）、
+              screening、evaluations（筛选次数）、wall_time
+    """
+    if (budget is None) == (target is None):
+        raise ValueError("budget和target必须且只能给出一个")
+    names = allocatable_nodes(graph_data, include_conveyors)
+    if not names:
+        raise ValueError("图中没有可分配容量的缓冲区或传送器")
+    count = len(names)
+    if budget is not None and budget < count * min_capacity:
+        raise ValueError(f"总容量预算 {budget} 小于 {count} 个节点的最小容量之和")
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    start = time.perf_counter()
+    screening, screen = _screening_function(graph_data, names, screening, seed, end_time, drain)
+    search = _Search(screen, count, min_capacity)
+    capacities = (min_capacity,) * count
+
+    if budget is not None:
+        while sum(capacities) < budget:
+            capacities = search.best_increment(capacities)
+        search.local_search(capacities)
+        candidates = sorted(
+            (allocation for allocation in search.scores if sum(allocation) == budget),
+            key=search.score,
+            reverse=True,
+        )[:finalists]
+    else:
+        limit = max_total if max_total is not None else count * 100
+        path = [capacities]
+        while search.score(capacities) < target and sum(capacities) < limit:
+            capacities = search.best_increment(capacities)
+            path.append(capacities)
+        # 筛选刚达到目标的方案及其后几步，用仿真确认后取总容量最小的达标方案
+        for _ in range(finalists - 1):
+            if sum(path[-1]) >= limit:
+                break
+            path.append(search.best_increment(path[-1]))
+        met = [position for position, item in enumerate(path) if search.score(item) >= target]
+        first = met[0] if met else max(0, len(path) - finalists)
+        candidates = path[first:first + finalists]
+
+    confirmation = run_experiment(
+        graph_data,
+        _capacity_factors(names),
+        design=candidates,
+        replications=replications,
+        seed=seed,
+        max_workers=max_workers,
+        end_time=end_time,
+        confidence=confidence,
+    )
+
+    results = []
+    for allocation, row in zip(candidates, confirmation["rows"]):
+        summary = row["summary"]
+        if drain is not None:
+            confirmed = summary[drain]["statthroughputperday"]
+        else:
+            # 多个物料终结时以各重复的吞吐量之和为观测，这里近似为均值之和、半宽按方差合成
+            intervals = [kpis["statthroughputperday"] for kpis in summary.values()]
+            confirmed = {
+                "mean": sum(item["mean"] for item in intervals),
+                "half_width": math.sqrt(sum(item["half_width"] ** 2 for item in intervals)),
+            }
+            confirmed["ci_low"] = confirmed["mean"] - confirmed["half_width"]
+            confirmed["ci_high"] = confirmed["mean"] + confirmed["half_width"]
+        results.append({
+            "allocation": dict(zip(names, allocation)),
+            "total": sum(allocation),
+            "screened": search.score(allocation),
+            "confirmed": confirmed,
+        })
+
+    if budget is not None:
+        best = max(results, key=lambda item: item["confirmed"]["mean"])
+        target_met = None
+    else:
+        reached = [item for item in results if item["confirmed"]["mean"] >= target]
+        target_met = bool(reached)
+        best = (
+            min(reached, key=lambda item: (item["total"], -item["confirmed"]["mean"]))
+            if reached
+            else max(results, key=lambda item: item["confirmed"]["mean"])
+        )
+
+    allocation = best["allocation"]
+    return {
+        "graph": apply_factors(graph_data, _capacity_factors(names), list(allocation.values())),
+        "allocation": allocation,
+        "total": best["total"],
+        "throughput": best["confirmed"],
+        "budget": budget,
+        "target": target,
+        "target_met": target_met,
+        "finalists": results,
+        "screening": screening,
+        "evaluations": len(search.scores),
+        "wall_time": time.perf_counter() - start,
+    }
+
+
+def format_allocation(result):
+    """格式化容量分配优化结果"""
+    screening_labels = {
+        SCREEN_ANALYTIC: "解析估算",
+        SCREEN_SERIAL: "串联递推",
+        SCREEN_SIMULATION: "单次仿真",
+    }
+    if result["target"] is None:
+        header = f"缓冲区容量分配（总预算 {result['budget']}）"
+    else:
+        header = f"缓冲区容量分配（目标每天吞吐量 {result['target']:.2f}）"
+    lines = [
+        f"{header}：{screening_labels[result['screening']]}筛选 {result['evaluations']} 个方案，"
+        f"仿真确认 {len(result['finalists'])} 个，耗时: {result['wall_time']:.2f}秒",
+    ]
+    for item in result["finalists"]:
+        allocation = "，".join(f"{name}={value}" for name, value in item["allocation"].items())
+        confirmed = item["confirmed"]
+        marker = "✅ " if item["allocation"] == result["allocation"] else "   "
+        lines.append(
+            f"{marker}{allocation}（总容量 {item['total']}）: 筛选 {item['screened']:.2f}，"
+            f"仿真 {confirmed['mean']:.2f} ± {confirmed['half_width']:.2f} 个/天"
+        )
+    if result["target_met"] is False:
+        lines.append("⚠️ 在总容量上限内未达到目标吞吐量，已给出吞吐量最高的方案")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    sample_graph_data = {
+        "nodes": [
+            {
+                "name": "源",
+                "type": "源",
+                "data": {"time": {"interval_time": "0:0:4:0", "stop_time": "2:0:0:0"}},
+            },
+            {"name": "缓冲区1", "type": "缓冲区", "data": {"capacity": 1}},
+        ],
+        "edges": [{"from": "源", "to": "缓冲区1"}],
+    }
+    previous = "缓冲区1"
+    for position, mean in enumerate((250, 300, 260, 280), start=1):
+        station = f"工位{position}"
+        sample_graph_data["nodes"].append({
+            "name": station,
+            "type": "工位",
+            "data": {
+                "time": {
+                    "processing_time": {
+                        "distribution_pattern": "negexp",
+                        "parameters": {"mean": mean},
+                    }
+                }
+            },
+        })
+        sample_graph_data["edges"].append({"from": previous, "to": station})
+        previous = station
+        if position < 4:
+            buffer = f"缓冲区{position + 1}"
+            sample_graph_data["nodes"].append(
+                {"name": buffer, "type": "缓冲区", "data": {"capacity": 1}}
+            )
+            sample_graph_data["edges"].append({"from": previous, "to": buffer})
+            previous = buffer
+    sample_graph_data["nodes"].append({"name": "合格库存", "type": "物料终结", "data": {}})
+    sample_graph_data["edges"].append({"from": previous, "to": "合格库存"})
+
+    print(format_allocation(optimize_buffers(sample_graph_data, budget=16, seed=1)))
+    print(format_allocation(optimize_buffers(sample_graph_data, target=230, seed=1)))
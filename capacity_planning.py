@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+产能规划：为达到目标每天吞吐量（statthroughputperday），确定每个工位需要的并行台数，
+并改写图数据（复制工位，连接分流/合流的边）
+
+- 估算：排队网络解析估算（已计入故障可用度和production_status的合格/不合格分流），
+  按目标吞吐量下的负荷确定初始台数（单台利用率不超过max_utilisation），
+  估算吞吐量仍不足时给单台负荷最高的工位增加一台
+- 确认：用重复仿真确认，不达标时给主导瓶颈工位（见bottleneck.py）增加一台后再确认；
+  达标后逐台减少负荷最低的工位，仿真仍达标则保留，得到尽量少的台数
+- 复制的工位与原工位数据相同，名称为“原名称_2”、“原名称_3”……；
+  每台副本连接原工位的全部前驱和后继（后继顺序不变，合格率路由保持有效）
+- 作为其他工位合格率路由目标的工位不复制（Plant Simulation按后继顺序分配百分比，
+  增加后继会改变路由），这类工位在结果中列为不可复制
+"""
+
+import copy
+import math
+import time
+
+import numpy as np
+
+from bottleneck import analyze_bottlenecks
+from queueing_estimator import estimate_graph
+from replication_runner import run_replications
+from simulation_engine import DRAIN, STATION
+
+DEFAULT_MAX_COPIES = 10
+DEFAULT_MAX_UTILISATION = 0.85
+DEFAULT_MAX_ROUNDS = 5
+DEFAULT_REPLICATIONS = 10
+
+
+def copy_names(station_name, count):
+    """工位及其副本的名称"""
+    return [station_name] + [f"{station_name}_{position}" for position in range(2, count + 1)]
+
+
+def routing_targets(graph_data):
+    """被其他节点的合格率路由（production_status）引用为目标的节点名称"""
+    nodes = graph_data.get("nodes", [])
+    successors = {}
+    for edge in graph_data.get("edges", []):
+        successors.setdefault(edge["from"], []).append(edge["to"])
+    targets = set()
+    for node in nodes:
+        data = node.get("data", {})
+        if "production_status" not in data:
+            continue
+        destination = data.get("production_destination", {})
+        targets.update(name for name in destination.values() if name)
+        targets.update(successors.get(node["name"], []))
+    return targets
+
+
+def replicate_stations(graph_data, copies):
+    """
+    复制工位并连接分流/合流的边
+
+    参数:
+        copies: {工位名称: 台数}，台数为1或未列出的工位不变
+
+    返回:
+        dict: 改写后的图数据（不修改原图）
+    """
+    nodes = graph_data.get("nodes", [])
+    types = {node["name"]: node["type"] for node in nodes}
+    blocked = routing_targets(graph_data)
+    for name, count in copies.items():
+        if name not in types:
+            raise ValueError(f"工位 {name} 不存在")
+        if types[name] != STATION:
+            raise ValueError(f"节点 {name} 不是工位，不能复制")
+        if count > 1 and name in blocked:
+            raise ValueError(f"工位 {name} 是合格率路由的目标，复制后会改变路由，不能复制")
+
+    groups = {}
+    new_nodes = []
+    for node in nodes:
+        names = copy_names(node["name"], max(1, int(copies.get(node["name"], 1))))
+        groups[node["name"]] = names
+        new_nodes.append(copy.deepcopy(node))
+        for name in names[1:]:
+            replica = copy.deepcopy(node)
+            replica["name"] = name
+            new_nodes.append(replica)
+
+    new_edges = []
+    for edge in graph_data.get("edges", []):
+        for from_name in groups[edge["from"]]:
+            for to_name in groups[edge["to"]]:
+                new_edge = dict(edge)
+                new_edge["from"], new_edge["to"] = from_name, to_name
+                new_edges.append(new_edge)
+
+    graph = {key: value for key, value in graph_data.items() if key not in ("nodes", "edges")}
+    graph["nodes"] = new_nodes
+    graph["edges"] = new_edges
+    return graph
+
+
+def default_drain(graph_data):
+    """默认的目标物料终结：第一个不是不合格品去向的物料终结"""
+    scrap = set()
+    for node in graph_data.get("nodes", []):
+        destination = node.get("data", {}).get("production_destination", {})
+        if destination.get("unqualified"):
+            scrap.add(destination["unqualified"])
+    drains = [node["name"] for node in graph_data.get("nodes", []) if node["type"] == DRAIN]
+    if not drains:
+        raise ValueError("图中没有物料终结")
+    for name in drains:
+        if name not in scrap:
+            return name
+    return drains[0]
+
+
+class _Planner:
+    """按解析估算确定工位台数"""
+
+    def __init__(self, graph_data, stations, drain, target, max_copies):
+        self.graph_data = graph_data
+        self.stations = stations
+        self.drain = drain
+        self.target = target
+        self.max_copies = max_copies
+        self.evaluations = 0
+
+    def estimate(self, copies):
+        self.evaluations += 1
+        return estimate_graph(replicate_stations(self.graph_data, copies))
+
+    def throughput(self, estimate):
+        return estimate["throughput"][self.drain]["statthroughputperday"]
+
+    def target_loads(self, copies, estimate):
+        """
+        达到目标吞吐量时各工位的总负荷（台数）
+
+        估算的负荷按源的名义产出率计算，按目标吞吐量与名义吞吐量之比缩放
+        """
+        offered = estimate["offered_throughput"][self.drain]
+        scale = self.target / offered if offered > 0 else math.inf
+        return {
+            station: scale * sum(
+                estimate["offered_utilisation"][name]
+                for name in copy_names(station, copies[station])
+            )
+            for station in self.stations
+        }
+
+    def initial(self, max_utilisation):
+        """按单台利用率不超过max_utilisation确定初始台数"""
+        copies = {station: 1 for station in self.stations}
+        loads = self.target_loads(copies, self.estimate(copies))
+        for station, load in loads.items():
+            if math.isfinite(load):
+                copies[station] = min(self.max_copies, max(1, math.ceil(load / max_utilisation)))
+        return copies
+
+    def busiest(self, copies, estimate=None):
+        """目标吞吐量下单台负荷最高且未达到台数上限的工位"""
+        loads = self.target_loads(copies, estimate or self.estimate(copies))
+        best = None
+        for station in self.stations:
+            if copies[station] >= self.max_copies:
+                continue
+            load = loads[station] / copies[station]
+            if best is None or load > best[0]:
+                best = (load, station)
+        return None if best is None else best[1]
+
+
+def plan_capacity(
+    graph_data,
+    target,
+    drain=None,
+    stations=None,
+    max_copies=DEFAULT_MAX_COPIES,
+    max_utilisation=DEFAULT_MAX_UTILISATION,
+    max_rounds=DEFAULT_MAX_ROUNDS,
+    replications=DEFAULT_REPLICATIONS,
+    seed=None,
+    max_workers=None,
+    end_time=None,
+    confidence=0.95,
+):
+    """
+    确定达到目标吞吐量所需的各工位并行台数
+
+    参数:
+        graph_data: 已确认的图数据
+        target: 目标每天吞吐量（个/天）
+        drain: 目标物料终结名称，默认为第一个不是不合格品去向的物料终结
+        stations: 允许复制的工位名称，默认为所有可复制的工位
+        max_copies: 每个工位的台数上限
+        max_utilisation: 初始方案中单台工位的目标利用率上限（越小越保守）
+        max_rounds: 仿真确认的最多轮数，未达标时给主导瓶颈工位增加一台后再确认
+        replications: 确认时的重复次数
+        seed: 主随机数种子（各方案使用公共随机数）
+        max_workers, end_time, confidence: 同run_replications
+
+    返回:
+        dict: graph（改写后的图数据）、copies（{工位名称: 台数}）、
+              estimated（估算每天吞吐量）、throughput（仿真确认的confidence_interval结果）、
+              target_met、source_limited（源的名义产出率低于目标）、
+              checked（[{copies, estimated, confirmed}]依次确认的方案）、
+              not_replicable（不可复制的工位）、evaluations（估算次数）、wall_time
+    """
+    if max_rounds < 1:
+        raise ValueError("max_rounds必须至少为1")
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    start = time.perf_counter()
+    drain = drain or default_drain(graph_data)
+    blocked = routing_targets(graph_data)
+    all_stations = [node["name"] for node in graph_data.get("nodes", []) if node["type"] == STATION]
+    if stations is None:
+        stations = [name for name in all_stations if name not in blocked]
+    not_replicable = [name for name in all_stations if name in blocked]
+    planner = _Planner(graph_data, stations, drain, target, max_copies)
+
+    # 估算：按利用率确定初始台数，估算吞吐量不足时（阻塞损失）再给负荷最高的工位加台
+    copies = planner.initial(max_utilisation)
+    for _ in range(len(stations)):
+        estimate = planner.estimate(copies)
+        if planner.throughput(estimate) >= target:
+            break
+        station = planner.busiest(copies, estimate)
+        if station is None:
+            break
+        copies[station] += 1
+    source_limited = planner.estimate(copies)["offered_throughput"][drain] < target
+
+    checked = []
+
+    def confirm(configuration):
+        report = run_replications(
+            replicate_stations(graph_data, configuration),
+            replications,
+            seed=seed,
+            max_workers=max_workers,
+            end_time=end_time,
+            confidence=confidence,
+        )
+        item = {
+            "copies": dict(configuration),
+            "estimated": planner.throughput(planner.estimate(configuration)),
+            "confirmed": report["summary"][drain]["statthroughputperday"],
+        }
+        checked.append(item)
+        return item
+
+    # 确认：仿真未达标时给主导瓶颈工位（活动周期法）增加一台
+    owner = {}
+    best = None
+    for _ in range(max_rounds):
+        item = confirm(copies)
+        if best is None or item["confirmed"]["mean"] > best["confirmed"]["mean"]:
+            best = item
+        if item["confirmed"]["mean"] >= target or source_limited:
+            best = item
+            break
+        for station in stations:
+            owner.update((name, station) for name in copy_names(station, copies[station]))
+        dominant = analyze_bottlenecks(
+            replicate_stations(graph_data, copies), seed=seed, end_time=end_time
+        )["dominant"]
+        station = owner.get(dominant)
+        if station is None or copies[station] >= max_copies:
+            station = planner.busiest(copies)
+        if station is None:
+            break
+        copies[station] += 1
+
+    # 精简：估算偏保守时逐台减少负荷最低的工位，仿真仍达标则保留
+    if best["confirmed"]["mean"] >= target:
+        copies = dict(best["copies"])
+        loads = planner.target_loads(copies, planner.estimate(copies))
+        for station in sorted(stations, key=lambda name: loads[name] / copies[name]):
+            while copies[station] > 1:
+                trial = dict(copies)
+                trial[station] -= 1
+                item = confirm(trial)
+                if item["confirmed"]["mean"] < target:
+                    break
+                best = item
+                copies = trial
+
+    return {
+        "graph": replicate_stations(graph_data, best["copies"]),
+        "copies": best["copies"],
+        "estimated": best["estimated"],
+        "throughput": best["confirmed"],
+        "target": target,
+        "drain": drain,
+        "target_met": best["confirmed"]["mean"] >= target,
+        "source_limited": source_limited,
+        "checked": checked,
+        "not_replicable": not_replicable,
+        "evaluations": planner.evaluations,
+        "wall_time": time.perf_counter() - start,
+    }
+
+
+def format_capacity_plan(plan):
+    """格式化产能规划结果"""
+    lines = [
+        f"产能规划（{plan['drain']} 目标每天吞吐量 {plan['target']:.2f}）："
+        f"估算 {plan['evaluations']} 次，仿真确认 {len(plan['checked'])} 个方案，"
+        f"耗时: {plan['wall_time']:.2f}秒"
+    ]
+    for item in plan["checked"]:
+        counts = "，".join(f"{name}×{count}" for name, count in item["copies"].items())
+        confirmed = item["confirmed"]
+        half_width = confirmed["half_width"]
+        half_text = "∞" if math.isinf(half_width) else f"{half_width:.2f}"
+        marker = "✅ " if item["copies"] == plan["copies"] else "   "
+        lines.append(
+            f"{marker}{counts}: 估算 {item['estimated']:.2f}，"
+            f"仿真 {confirmed['mean']:.2f} ± {half_text} 个/天"
+        )
+    if plan["not_replicable"]:
+        lines.append(f"不可复制的工位（合格率路由的目标）: {'，'.join(plan['not_replicable'])}")
+    if plan["source_limited"]:
+        lines.append("⚠️ 源的名义产出率低于目标吞吐量，增加工位无法达到目标")
+    elif not plan["target_met"]:
+        lines.append("⚠️ 未达到目标吞吐量（工位台数已达上限或确认轮数用尽）")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    sample_graph_data = {
+        "nodes": [
+            {
+                "name": "源",
+                "type": "源",
+                "data": {"time": {"interval_time": "0:0:1:0", "stop_time": "1:0:0:0"}},
+            },
+            {"name": "缓冲区1", "type": "缓冲区", "data": {"capacity": 10}},
+            {
+                "name": "车削工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 240},
+                        }
+                    },
+                    "failure": {
+                        "interval_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 7200},
+                        },
+                        "duration_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 600},
+                        },
+                    },
+                },
+            },
+            {"name": "缓冲区2", "type": "缓冲区", "data": {"capacity": 10}},
+            {
+                "name": "检测工位",
+                "type": "工位",
+                "data": {
+                    "time": {"processing_time": "0:0:1:30"},
+                    "production_status": {"qualified": 0.9, "unqualified": 0.1},
+                    "production_destination": {"qualified": "合格库存", "unqualified": "废品库"},
+                },
+            },
+            {"name": "合格库存", "type": "物料终结", "data": {}},
+            {"name": "废品库", "type": "物料终结", "data": {}},
+        ],
+        "edges": [
+            {"from": "源", "to": "缓冲区1"},
+            {"from": "缓冲区1", "to": "车削工位"},
+            {"from": "车削工位", "to": "缓冲区2"},
+            {"from": "缓冲区2", "to": "检测工位"},
+            {"from": "检测工位", "to": "合格库存"},
+            {"from": "检测工位", "to": "废品库"},
+        ],
+    }
+    print(format_capacity_plan(plan_capacity(sample_graph_data, target=1000, seed=1)))
@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分布拟合：从车间导出的CSV历史数据（加工时间、故障间隔、故障持续时间等）
+流式读取指定列，用最大似然估计拟合图数据支持的全部分布类型（见prompt_config中的分布说明），
+按拟合优度排序，并把最优的distribution_pattern/parameters直接写入图中的节点
+
+- 按块读取CSV，每块用numpy累加充分统计量（个数、和、平方和、对数和等），
+  最大似然估计只依赖充分统计量，内存占用与文件大小无关
+- 拟合优度：Kolmogorov-Smirnov距离（全部为非负整数的数据用精确的频数表，
+  否则用蓄水池抽样的样本），同时给出对数似然、AIC和BIC
+- 参数由数据估计，KS检验的p值偏乐观，只用于比较各分布
+- 常数数据（方差只剩舍入误差）拟合为sigma为0的正态分布，不拟合参数会趋于无穷的分布
+"""
+
+import csv
+import math
+
+import numpy as np
+
+from time_utils import parse_time_to_seconds
+
+CONTINUOUS_FAMILIES = ("negexp", "normal", "uniform", "lognorm", "gamma", "erlang")
+DISCRETE_FAMILIES = ("geom", "poisson", "binomial")
+FAMILIES = CONTINUOUS_FAMILIES + DISCRETE_FAMILIES
+
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_RESERVOIR_SIZE = 200000
+# 非负整数数据的最大值不超过该值时保留精确的频数表（用于离散分布和KS距离）
+MAX_DISCRETE_VALUE = 1000000
+MAX_BINOMIAL_CANDIDATES = 10000
+SIGNIFICANT_DIGITS = 6
+# KS距离相差不足该值时视为相同，按BIC排序（参数少的分布优先）
+KS_RESOLUTION = 1e-3
+# 方差不超过该值乘以均值平方时视为常数数据（只剩浮点舍入误差）
+DEGENERATE_VARIANCE = 1e-12
+
+
+def read_column_chunks(path, column=0, chunk_size=DEFAULT_CHUNK_SIZE, delimiter=",",
+                       encoding="utf-8-sig", unit=1.0):
+    """
+    按块读取CSV文件的一列数值
+
+    参数:
+        column: 列名（第一行为表头）或从0开始的列序号（没有表头时）
+        unit: 乘到每个值上的换算系数（如数据以分钟记录时为60）；
+              “时:分:秒”形式的值按time_utils解释为秒
+
+    返回:
+        generator: 依次产生(数值数组, 跳过的空值/非法值个数)
+    """
+    with open(path, newline="", encoding=encoding) as file:
+        reader = csv.reader(file, delimiter=delimiter)
+        if isinstance(column, str):
+            header = next(reader, [])
+            if column not in header:
+                raise ValueError(f"CSV文件 {path} 中没有列 {column}")
+            column = header.index(column)
+        chunk = []
+        for row in reader:
+            chunk.append(row[column].strip() if column < len(row) else "")
+            if len(chunk) >= chunk_size:
+                yield _parse_chunk(chunk, unit)
+                chunk = []
+        if chunk:
+            yield _parse_chunk(chunk, unit)
+
+
+def _parse_chunk(texts, unit):
+    try:
+        values = np.array(texts, dtype=float)
+    except ValueError:
+        values = np.empty(len(texts))
+        for position, text in enumerate(texts):
+            try:
+                values[position] = float(text) if ":" not in text else parse_time_to_seconds(text)
+            except ValueError:
+                values[position] = np.nan
+    valid = np.isfinite(values)
+    return values[valid] * unit, int(len(values) - valid.sum())
+
+
+class _StreamStatistics:
+    """流式累加的充分统计量、非负整数频数表和蓄水池样本"""
+
+    def __init__(self, reservoir_size, seed):
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.log_total = 0.0
+        self.log_squares = 0.0
+        self.positive = True
+        self.counts = np.zeros(0, dtype=np.int64)  # 非负整数数据的频数表，None表示不是整数数据
+        self.reservoir = np.empty(reservoir_size)
+        self.filled = 0
+        self._generator = np.random.default_rng(seed)
+
+    def update(self, values):
+        if len(values) == 0:
+            return
+        self.total += float(values.sum())
+        self.squares += float(np.dot(values, values))
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        if self.positive and self.minimum > 0:
+            logs = np.log(values)
+            self.log_total += float(logs.sum())
+            self.log_squares += float(np.dot(logs, logs))
+        else:
+            self.positive = False
+        if self.counts is not None:
+            if self.minimum < 0 or self.maximum > MAX_DISCRETE_VALUE or np.any(values != np.floor(values)):
+                self.counts = None
+            else:
+                chunk_counts = np.bincount(values.astype(np.int64))
+                if len(chunk_counts) > len(self.counts):
+                    chunk_counts[:len(self.counts)] += self.counts
+                    self.counts = chunk_counts
+                else:
+                    self.counts[:len(chunk_counts)] += chunk_counts
+        self._sample(values)
+        self.count += len(values)
+
+    def _sample(self, values):
+        """蓄水池抽样（Algorithm R的分块实现，块内后出现的值覆盖先出现的值）"""
+        size = len(self.reservoir)
+        room = min(size - self.filled, len(values))
+        if room > 0:
+            self.reservoir[self.filled:self.filled + room] = values[:room]
+            self.filled += room
+        rest = values[room:]
+        if len(rest) == 0:
+            return
+        seen = self.count + room + np.arange(1, len(rest) + 1)
+        slots = (self._generator.random(len(rest)) * seen).astype(np.int64)
+        keep = slots < size
+        self.reservoir[slots[keep]] = rest[keep]
+
+    @property
+    def sample(self):
+        return np.sort(self.reservoir[:self.filled])
+
+
+def _digamma(x):
+    result = 0.0
+    while x < 6.0:
+        result -= 1.0 / x
+        x += 1.0
+    inverse = 1.0 / (x * x)
+    return result + math.log(x) - 0.5 / x - inverse * (
+        1.0 / 12 - inverse * (1.0 / 120 - inverse / 252)
+    )
+
+
+def _trigamma(x):
+    result = 0.0
+    while x < 6.0:
+        result += 1.0 / (x * x)
+        x += 1.0
+    inverse = 1.0 / (x * x)
+    return result + 1.0 / x + inverse / 2 + inverse / x * (
+        1.0 / 6 - inverse * (1.0 / 30 - inverse / 42)
+    )
+
+
+def _gamma_shape(mean, mean_log):
+    """Gamma分布形状参数的最大似然估计（牛顿法解log k - ψ(k) = log(均值) - 对数均值）"""
+    s = math.log(mean) - mean_log
+    if s <= 0:
+        return math.inf
+    shape = (3.0 - s + math.sqrt((s - 3.0) ** 2 + 24.0 * s)) / (12.0 * s)
+    for _ in range(50):
+        step = (math.log(shape) - _digamma(shape) - s) / (1.0 / shape - _trigamma(shape))
+        shape = max(shape - step, shape / 10.0)
+        if abs(step) < 1e-10 * shape:
+            break
+    return shape
+
+
+def _normal_cdf(x):
+    """标准正态分布函数（Abramowitz-Stegun 7.1.26，误差<1.5e-7）"""
+    z = np.abs(x) / math.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (
+        1.421413741 + t * (-1.453152027 + t * 1.061405429)
+    )))
+    erf = 1.0 - poly * np.exp(-z * z)
+    return 0.5 * (1.0 + np.where(x >= 0, erf, -erf))
+
+
+def _gamma_cdf(x, shape, rate):
+    """正则化下不完全Gamma函数P(shape, rate·x)：级数与连分式（Lentz）的向量化实现"""
+    y = np.maximum(np.asarray(x, dtype=float) * rate, 0.0)
+    result = np.zeros_like(y)
+    log_prefix = shape * np.log(np.where(y > 0, y, 1.0)) - y - math.lgamma(shape)
+    series = (y > 0) & (y < shape + 1.0)
+    if series.any():
+        ys = y[series]
+        term = np.full_like(ys, 1.0 / shape)
+        total = term.copy()
+        for n in range(1, 1000):
+            term *= ys / (shape + n)
+            total += term
+            if np.all(term < total * 1e-14):
+                break
+        result[series] = total * np.exp(log_prefix[series])
+    fraction = y >= shape + 1.0
+    if fraction.any():
+        yf = y[fraction]
+        tiny = 1e-300
+        b = yf + 1.0 - shape
+        c = np.full_like(yf, 1.0 / tiny)
+        d = 1.0 / b
+        h = d.copy()
+        for n in range(1, 1000):
+            a = -n * (n - shape)
+            b += 2.0
+            d = a * d + b
+            d = np.where(np.abs(d) < tiny, tiny, d)
+            c = b + a / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            d = 1.0 / d
+            delta = d * c
+            h *= delta
+            if np.all(np.abs(delta - 1.0) < 1e-14):
+                break
+        result[fraction] = 1.0 - np.exp(log_prefix[fraction]) * h
+    return np.clip(result, 0.0, 1.0)
+
+
+def _log_factorials(limit):
+    return np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, limit + 1)))))
+
+
+def _round(value):
+    return float(f"{value:.{SIGNIFICANT_DIGITS}g}")
+
+
+def _continuous_fits(stats):
+    """各连续分布的参数、对数似然和分布函数"""
+    n = stats.count
+    mean = stats.total / n
+    variance = max(stats.squares / n - mean * mean, 0.0)
+    degenerate = variance <= DEGENERATE_VARIANCE * mean * mean
+    fits = []
+    if stats.minimum >= 0 and mean > 0:
+        fits.append((
+            "negexp", {"mean": _round(mean)}, 1,
+            -n * math.log(mean) - n,
+            lambda x, m=mean: 1.0 - np.exp(-np.maximum(x, 0.0) / m),
+        ))
+    if degenerate:
+        # 常数数据：sigma为0的正态分布即常数，按点质量计似然（每个值的概率为1）
+        fits.append((
+            "normal", {"mean": _round(mean), "sigma": 0.0}, 1, 0.0,
+            lambda x, c=stats.minimum: (np.asarray(x) >= c).astype(float),
+        ))
+    elif variance > 0:
+        sigma = math.sqrt(variance)
+        fits.append((
+            "normal", {"mean": _round(mean), "sigma": _round(sigma)}, 2,
+            -n / 2 * math.log(2 * math.pi * variance) - n / 2,
+            lambda x, m=mean, s=sigma: _normal_cdf((x - m) / s),
+        ))
+    if stats.maximum > stats.minimum and not degenerate:
+        lower, upper = stats.minimum, stats.maximum
+        fits.append((
+            "uniform", {"lower_bound": _round(lower), "upper_bound": _round(upper)}, 2,
+            -n * math.log(upper - lower),
+            lambda x, a=lower, b=upper: np.clip((x - a) / (b - a), 0.0, 1.0),
+        ))
+    if stats.positive and n > 1 and not degenerate:
+        # 常数数据的对数方差只剩舍入误差，lognorm、gamma、erlang的参数会趋于无穷
+        mean_log = stats.log_total / n
+        log_variance = max(stats.log_squares / n - mean_log * mean_log, 0.0)
+        if log_variance > 0:
+            log_sigma = math.sqrt(log_variance)
+            # Plant Simulation的lognorm参数为分布本身的均值和标准差
+            lognorm_mean = math.exp(mean_log + log_variance / 2)
+            lognorm_sigma = lognorm_mean * math.sqrt(math.expm1(log_variance))
+            fits.append((
+                "lognorm", {"mean": _round(lognorm_mean), "sigma": _round(lognorm_sigma)}, 2,
+                -stats.log_total - n / 2 * math.log(2 * math.pi * log_variance) - n / 2,
+                lambda x, m=mean_log, s=log_sigma: _normal_cdf(
+                    (np.log(np.maximum(x, 1e-300)) - m) / s
+                ),
+            ))
+        shape = _gamma_shape(mean, mean_log)
+        if math.isfinite(shape):
+
+            def gamma_loglik(k):
+                rate = k / mean
+                return n * (k * math.log(rate) - math.lgamma(k) + (k - 1) * mean_log - rate * mean)
+
+            fits.append((
+                "gamma", {"shape": _round(shape), "rate": _round(shape / mean)}, 2,
+                gamma_loglik(shape),
+                lambda x, k=shape, r=shape / mean: _gamma_cdf(x, k, r),
+            ))
+            # Erlang分布的阶数为整数，似然关于阶数单峰，取Gamma形状参数两侧的整数比较
+            orders = {max(1, math.floor(shape)), max(1, math.ceil(shape))}
+            order = max(orders, key=gamma_loglik)
+            fits.append((
+                "erlang", {"mean": _round(mean), "order": int(order)}, 2,
+                gamma_loglik(order),
+                lambda x, k=order, r=order / mean: _gamma_cdf(x, k, r),
+            ))
+    return fits
+
+
+def _discrete_fits(stats):
+    """各离散分布的参数、对数似然和支撑点0..max上的分布函数"""
+    counts = stats.counts
+    n = stats.count
+    values = np.arange(len(counts))
+    total = stats.total
+    mean = total / n
+    variance = max(stats.squares / n - mean * mean, 0.0)
+    support = len(counts) - 1
+    log_factorials = _log_factorials(support)
+    data_log_factorial = float(np.dot(counts, log_factorials))
+    fits = []
+    if mean > 0:
+        # numpy.random.Generator.geometric的取值从1开始
+        if stats.minimum >= 1 and mean > 1:
+            p = 1.0 / mean
+            fits.append((
+                "geom", {"success_probability": _round(p)}, 1,
+                n * math.log(p) + (total - n) * math.log1p(-p),
+                1.0 - (1.0 - p) ** values,
+            ))
+        pmf = np.exp(values * math.log(mean) - mean - log_factorials)
+        fits.append((
+            "poisson", {"mean": _round(mean)}, 1,
+            total * math.log(mean) - n * mean - data_log_factorial,
+            np.cumsum(pmf),
+        ))
+    if 0 < variance < mean and support > 0:
+        # 试验次数的候选：从最大值起，到矩估计的数倍
+        moment_trials = mean * mean / (mean - variance)
+        limit = int(min(max(support, 3 * moment_trials) + 1, support + MAX_BINOMIAL_CANDIDATES))
+        trials = np.arange(support, limit + 1)
+        table = _log_factorials(limit)
+        p = mean / trials
+        observed = np.flatnonzero(counts)
+        log_choose = (
+            n * table[trials]
+            - data_log_factorial
+            - (counts[observed][None, :] * table[trials[:, None] - observed[None, :]]).sum(axis=1)
+        )
+        with np.errstate(divide="ignore"):
+            loglik = log_choose + total * np.log(p) + (n * trials - total) * np.log1p(-p)
+        best = int(np.argmax(loglik))
+        best_trials, best_p = int(trials[best]), float(p[best])
+        pmf = np.exp(
+            table[best_trials] - table[values] - table[best_trials - values]
+            + values * math.log(best_p) + (best_trials - values) * math.log1p(-best_p)
+        )
+        fits.append((
+            "binomial", {"trials": best_trials, "success_probability": _round(best_p)}, 2,
+            float(loglik[best]),
+            np.cumsum(pmf),
+        ))
+    return fits
+
+
+def _kolmogorov_pvalue(distance, n):
+    """KS统计量的渐近p值"""
+    if n <= 0 or distance <= 0:
+        return 1.0
+    root = math.sqrt(n)
+    lam = (root + 0.12 + 0.11 / root) * distance
+    total = 0.0
+    for j in range(1, 101):
+        term = 2.0 * (-1) ** (j - 1) * math.exp(-2.0 * j * j * lam * lam)
+        total += term
+        if abs(term) < 1e-12:
+            break
+    return min(max(total, 0.0), 1.0)
+
+
+def fit_distributions(source, column=0, families=FAMILIES, chunk_size=DEFAULT_CHUNK_SIZE,
+                      reservoir_size=DEFAULT_RESERVOIR_SIZE, unit=1.0, seed=None, **csv_options):
+    """
+    流式读取数据并拟合各分布
+
+    参数:
+        source: CSV文件路径，或数值数组（按块传入的数组序列也可以）
+        column: CSV中的列名或列序号
+        families: 参与比较的分布类型
+        unit: 换算为秒的系数（数据以分钟记录时为60）
+        seed: 蓄水池抽样的随机数种子
+        csv_options: 传给read_column_chunks的delimiter、encoding
+
+    返回:
+        dict: count（有效值个数）、skipped（空值/非法值个数）、
+              summary（mean、stddev、min、max）、
+              fits（按KS距离从小到大（相近时按BIC）排序的[{distribution（可直接写入图数据的
+                    {"distribution_pattern", "parameters"}）, loglik, aic, bic, ks, ks_pvalue}]）、
+              best（fits[0]，无可用分布时为None）
+    """
+    stats = _StreamStatistics(reservoir_size, seed)
+    skipped = 0
+    if isinstance(source, str):
+        chunks = read_column_chunks(source, column, chunk_size, unit=unit, **csv_options)
+    else:
+        if isinstance(source, (list, tuple)) and source and np.isscalar(source[0]):
+            source = np.asarray(source, dtype=float)
+        if isinstance(source, np.ndarray):
+            chunks = ((source[start:start + chunk_size] * unit, 0)
+                      for start in range(0, len(source), chunk_size))
+        else:
+            chunks = ((np.asarray(chunk, dtype=float) * unit, 0) for chunk in source)
+    for values, invalid in chunks:
+        finite = np.isfinite(values)
+        skipped += invalid + int(len(values) - finite.sum())
+        stats.update(values[finite])
+    if stats.count < 2:
+        raise ValueError("有效数据少于2个，无法拟合分布")
+
+    n = stats.count
+    mean = stats.total / n
+    variance = max(stats.squares / n - mean * mean, 0.0)
+    candidates = [fit for fit in _continuous_fits(stats) if fit[0] in families]
+    discrete = stats.counts is not None
+    if discrete:
+        candidates += [fit for fit in _discrete_fits(stats) if fit[0] in families]
+        support = np.arange(len(stats.counts))
+        empirical = np.cumsum(stats.counts) / n
+        previous = np.concatenate(([0.0], empirical[:-1]))
+    else:
+        sample = stats.sample
+        # 有并列值时按并列组两端的经验分布函数值比较（常数数据等）
+        upper = np.searchsorted(sample, sample, "right") / len(sample)
+        lower = np.searchsorted(sample, sample, "left") / len(sample)
+        ties = bool(np.any(sample[1:] == sample[:-1]))
+
+    fits = []
+    for family, parameters, parameter_count, loglik, cdf in candidates:
+        if discrete:
+            # 整数数据：连续分布按四舍五入到整数比较
+            model = cdf if isinstance(cdf, np.ndarray) else cdf(support + 0.5)
+            model_previous = np.concatenate(([0.0], model[:-1]))
+            observed = stats.counts > 0
+            distance = float(max(
+                np.max(np.abs(empirical - model)[observed]),
+                np.max(np.abs(previous - model_previous)[observed]),
+            ))
+            ks_n = n
+        else:
+            model = cdf(sample)
+            # 并列值处还要与模型分布函数的左极限比较
+            model_left = cdf(np.nextafter(sample, -np.inf)) if ties else model
+            distance = float(max(np.max(upper - model), np.max(model_left - lower)))
+            ks_n = len(sample)
+        fits.append({
+            "distribution": {"distribution_pattern": family, "parameters": parameters},
+            "loglik": float(loglik),
+            "aic": 2 * parameter_count - 2 * float(loglik),
+            "bic": parameter_count * math.log(n) - 2 * float(loglik),
+            "ks": distance,
+            "ks_pvalue": _kolmogorov_pvalue(distance, ks_n),
+        })
+    fits.sort(key=lambda fit: (round(fit["ks"] / KS_RESOLUTION), fit["bic"]))
+    if variance <= DEGENERATE_VARIANCE * mean * mean:
+        # 常数数据的KS距离由并列值决定，没有比较意义，优先取常数（sigma为0的正态分布）
+        fits.sort(key=lambda fit: fit["distribution"]["parameters"].get("sigma") != 0.0)
+    return {
+        "count": n,
+        "skipped": skipped,
+        "summary": {
+            "mean": mean,
+            "stddev": math.sqrt(variance * n / (n - 1)),
+            "min": stats.minimum,
+            "max": stats.maximum,
+        },
+        "fits": fits,
+        "best": fits[0] if fits else None,
+    }
+
+
+def write_fit_to_graph(graph_data, node_name, field, fit):
+    """
+    把拟合结果写入图数据中的节点（直接修改graph_data）
+
+    参数:
+        field: 节点data中的属性路径，如"time.processing_time"、"time.interval_time"、
+               "failure.interval_time"、"failure.duration_time"
+        fit: fit_distributions的返回值（使用best）或其中的一项
+
+    返回:
+        dict: 写入的{"distribution_pattern", "parameters"}
+    """
+    entry = fit.get("best", fit) if "fits" in fit else fit
+    if entry is None:
+        raise ValueError("没有可写入的拟合结果")
+    for node in graph_data.get("nodes", []):
+        if node["name"] == node_name:
+            break
+    else:
+        raise ValueError(f"节点 {node_name} 不存在")
+    keys = field.split(".")
+    target = node.setdefault("data", {})
+    for key in keys[:-1]:
+        child = target.get(key)
+        if not isinstance(child, dict):
+            child = target[key] = {}
+        target = child
+    distribution = {
+        "distribution_pattern": entry["distribution"]["distribution_pattern"],
+        "parameters": dict(entry["distribution"]["parameters"]),
+    }
+    target[keys[-1]] = distribution
+    return distribution
+
+
+def format_fits(result, limit=5):
+    """格式化拟合结果（前limit个分布）"""
+    summary = result["summary"]
+    lines = [
+        f"数据: {result['count']} 个有效值（跳过 {result['skipped']} 个），均值 {summary['mean']:.3f}，"
+        f"标准差 {summary['stddev']:.3f}，范围 [{summary['min']:.3f}, {summary['max']:.3f}]"
+    ]
+    for rank, fit in enumerate(result["fits"][:limit], start=1):
+        distribution = fit["distribution"]
+        parameters = "，".join(f"{key}={value}" for key, value in distribution["parameters"].items())
+        lines.append(
+            f"{'✅' if rank == 1 else '  '} {rank}. {distribution['distribution_pattern']}({parameters})"
+            f"  KS {fit['ks']:.4f}（p={fit['ks_pvalue']:.3f}），AIC {fit['aic']:.1f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import json
+    import os
+    import tempfile
+    import time
+
+    # 生成模拟的车间导出数据：加工时间（秒，Gamma分布）和故障持续时间（分钟）
+    generator = np.random.default_rng(1)
+    path = os.path.join(tempfile.gettempdir(), "sitp_shop_floor.csv")
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["工单", "加工时间", "故障持续时间"])
+        processing = generator.gamma(4.0, 75.0, 500000)
+        repairs = generator.lognormal(3.0, 0.5, 500000)
+        for row, (a, b) in enumerate(zip(processing, repairs)):
+            writer.writerow([row, f"{a:.2f}", f"{b:.2f}" if row % 100 else ""])
+
+    sample_graph_data = {
+        "nodes": [
+            {"name": "源", "type": "源", "data": {"time": {"interval_time": "0:0:6:0"}}},
+            {"name": "铣削工位", "type": "工位", "data": {"time": {"processing_time": "0:0:5:0"}}},
+            {"name": "合格库存", "type": "物料终结", "data": {}},
+        ],
+        "edges": [{"from": "源", "to": "铣削工位"}, {"from": "铣削工位", "to": "合格库存"}],
+    }
+    start = time.perf_counter()
+    processing_fit = fit_distributions(path, "加工时间", seed=1)
+    print(f"加工时间（耗时 {time.perf_counter() - start:.2f}秒）")
+    print(format_fits(processing_fit))
+    repair_fit = fit_distributions(path, "故障持续时间", unit=60, seed=1)
+    print("故障持续时间")
+    print(format_fits(repair_fit))
+
+    write_fit_to_graph(sample_graph_data, "铣削工位", "time.processing_time", processing_fit)
+    write_fit_to_graph(sample_graph_data, "铣削工位", "failure.duration_time", repair_fit)
+    print(json.dumps(sample_graph_data["nodes"][1], ensure_ascii=False, indent=2))
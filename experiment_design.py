@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+参数扫描/试验设计：对已确认图数据中的节点属性声明因子，展开为全因子、
+拉丁超立方或二水平部分因子设计，在进程池中并行评估所有设计点，结果汇总为一张表
+
+因子声明示例:
+    {"node": "缓冲区1", "field": "capacity", "levels": [2, 5, 10]}
+    {"node": "传送器", "field": "speed", "low": 0.5, "high": 2.0}
+    {"node": "加工工位", "field": "time.processing_time.parameters.mean",
+     "low": 240, "high": 360, "name": "加工均值"}
+
+- field为节点data中的属性路径，以“.”分隔
+- 全因子设计使用levels（未给出时使用low和high两个水平）
+- 拉丁超立方设计在[low, high]内连续取值（给出levels时在水平之间分层抽取），
+  integer为True时取整
+- 部分因子设计只使用两个水平（low/high或levels的首尾）
+- 所有设计点的第i次重复使用相同的随机数种子（公共随机数），设计点之间的差异更准确
+"""
+
+import copy
+import csv
+import itertools
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from replication_runner import KPI_LABELS, KPI_NAMES, replication_seeds, summarize_replications
+from simulation_engine import simulate_graph
+
+FULL_FACTORIAL = "full"
+LATIN_HYPERCUBE = "lhs"
+FRACTIONAL = "fractional"
+DESIGN_TYPES = (FULL_FACTORIAL, LATIN_HYPERCUBE, FRACTIONAL)
+
+DEFAULT_REPLICATIONS = 3
+DEFAULT_LHS_POINTS = 10
+
+# 工作进程中的设计点图数据（通过initializer只传输一次）
+_worker_graphs = None
+_worker_end_time = None
+
+
+def _init_worker(graphs, end_time):
+    global _worker_graphs, _worker_end_time
+    _worker_graphs = graphs
+    _worker_end_time = end_time
+
+
+def _run_design_task(task):
+    point, seed_sequence = task
+    return simulate_graph(_worker_graphs[point], seed=seed_sequence, end_time=_worker_end_time)
+
+
+def factor_name(factor):
+    """因子在结果表中的列名"""
+    return factor.get("name") or f"{factor['node']}.{factor['field']}"
+
+
+def _factor_levels(factor):
+    if "levels" in factor:
+        levels = list(factor["levels"])
+    elif "low" in factor and "high" in factor:
+        levels = [factor["low"], factor["high"]]
+    else:
+        raise ValueError(f"因子 {factor_name(factor)} 需要给出levels或low/high")
+    if not levels:
+        raise ValueError(f"因子 {factor_name(factor)} 的水平为空")
+    return levels
+
+
+def _find_node(graph_data, node_name):
+    for node in graph_data.get("nodes", []):
+        if node["name"] == node_name:
+            return node
+    raise ValueError(f"因子引用的节点 {node_name} 不存在")
+
+
+def apply_factors(graph_data, factors, values):
+    """
+    生成设置了因子取值的图数据副本
+
+    参数:
+        factors: 因子声明列表
+        values: 与factors一一对应的取值
+
+    返回:
+        dict: 修改后的图数据（不修改原图）
+    """
+    graph = copy.deepcopy(graph_data)
+    for factor, value in zip(factors, values):
+        node = _find_node(graph, factor["node"])
+        keys = factor["field"].split(".")
+        target = node.setdefault("data", {})
+        for key in keys[:-1]:
+            child = target.get(key)
+            if not isinstance(child, dict):
+                # 固定时间（如"0:0:5:0"）不能直接设置分布参数
+                if child is not None:
+                    raise ValueError(
+                        f"节点 {factor['node']} 的属性 {key} 不是字典，无法设置 {factor['field']}"
+                    )
+                child = target[key] = {}
+            target = child
+        target[keys[-1]] = value.item() if isinstance(value, np.generic) else value
+    return graph
+
+
+def full_factorial(factors):
+    """全因子设计：所有水平组合"""
+    return [list(point) for point in itertools.product(*(_factor_levels(f) for f in factors))]
+
+
+def latin_hypercube(factors, points=DEFAULT_LHS_POINTS, seed=None):
+    """
+    拉丁超立方设计：每个因子的取值范围等分为points层，每层恰好取一个点
+
+    参数:
+        points: 设计点个数
+        seed: 随机数种子
+    """
+    generator = np.random.default_rng(seed)
+    design = [[None] * len(factors) for _ in range(points)]
+    for column, factor in enumerate(factors):
+        strata = (generator.permutation(points) + generator.random(points)) / points
+        if "low" in factor and "high" in factor:
+            low, high = float(factor["low"]), float(factor["high"])
+            values = low + strata * (high - low)
+            if factor.get("integer"):
+                values = np.floor(low + strata * (high - low + 1)).clip(low, high).astype(int)
+        else:
+            levels = _factor_levels(factor)
+            values = [levels[int(u * len(levels))] for u in strata]
+        for row in range(points):
+            value = values[row]
+            design[row][column] = value.item() if isinstance(value, np.generic) else value
+    return design
+
+
+def fractional_factorial(factors, runs=None):
+    """
+    二水平部分因子设计2^(k-p)
+
+    前k-p个因子构成基本全因子设计，其余因子依次取基本因子的最高阶交互作用列
+    （如D=ABC），别名结构尽量只涉及高阶交互作用
+
+    参数:
+        runs: 试验次数（2的幂），默认使用能容纳全部因子的最少次数
+    """
+    count = len(factors)
+    if count == 0:
+        return [[]]
+    base = 1
+    while (1 << base) - 1 < count:
+        base += 1
+    if runs is not None:
+        requested = int(round(math.log2(runs)))
+        if 1 << requested != runs:
+            raise ValueError(f"部分因子设计的试验次数 {runs} 不是2的幂")
+        if requested < base:
+            raise ValueError(f"{count} 个因子至少需要 {1 << base} 次试验")
+        base = min(requested, count)
+
+    signs = np.array(list(itertools.product((-1, 1), repeat=base)))
+    # 生成元：基本因子的交互作用，从最高阶开始
+    generators = [
+        subset
+        for order in range(base, 1, -1)
+        for subset in itertools.combinations(range(base), order)
+    ]
+    columns = [signs[:, position] for position in range(base)]
+    columns += [signs[:, list(subset)].prod(axis=1) for subset in generators[: count - base]]
+
+    design = []
+    for row in range(len(signs)):
+        point = []
+        for factor, column in zip(factors, columns):
+            levels = _factor_levels(factor)
+            point.append(levels[0] if column[row] < 0 else levels[-1])
+        design.append(point)
+    return design
+
+
+def build_design(factors, design=FULL_FACTORIAL, points=DEFAULT_LHS_POINTS, runs=None, seed=None):
+    """
+    按设计类型展开设计点
+
+    参数:
+        design: 设计类型，或显式给出的设计点列表（如优化器中待确认的候选方案）
+
+    返回:
+        list: 设计点列表，每个设计点为与factors对应的取值列表
+    """
+    if not isinstance(design, str):
+        return [list(point) for point in design]
+    if design == FULL_FACTORIAL:
+        return full_factorial(factors)
+    if design == LATIN_HYPERCUBE:
+        return latin_hypercube(factors, points, seed)
+    if design == FRACTIONAL:
+        return fractional_factorial(factors, runs)
+    raise ValueError(f"未知的设计类型 '{design}'，可选: {', '.join(DESIGN_TYPES)}")
+
+
+def run_experiment(
+    graph_data,
+    factors,
+    design=FULL_FACTORIAL,
+    points=DEFAULT_LHS_POINTS,
+    runs=None,
+    replications=DEFAULT_REPLICATIONS,
+    seed=None,
+    max_workers=None,
+    end_time=None,
+    confidence=0.95,
+    store=None,
+):
+    """
+    展开试验设计并并行评估所有设计点
+
+    参数:
+        graph_data: 已确认的图数据
+        factors: 因子声明列表（见模块说明）
+        design: 设计类型 "full"（全因子）、"lhs"（拉丁超立方）、"fractional"（二水平部分因子），
+                或显式给出的设计点列表
+        points: 拉丁超立方设计的点数
+        runs: 部分因子设计的试验次数
+        replications: 每个设计点的重复次数
+        seed: 主随机数种子（同时用于拉丁超立方抽样）
+        max_workers: 进程数，默认使用全部CPU核心；为1时在当前进程内顺序运行
+        end_time: 仿真结束时间，默认使用源节点的stop_time
+        confidence: 置信水平
+        store: 结果库（ResultsStore或目录），给出时把每次仿真的结果记入结果库
+
+    返回:
+        dict: factors（因子列名）、design（设计类型）、points（设计点取值）、
+              rows（结果表，每行含设计点序号、因子取值及
+                    {物料终结名称: {统计量名称: confidence_interval结果}}）、
+              replications、confidence、wall_time
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    design_points = build_design(factors, design, points, runs, seed)
+    graphs = [apply_factors(graph_data, factors, values) for values in design_points]
+    seeds = replication_seeds(seed, replications)
+    tasks = [(point, child) for point in range(len(graphs)) for child in seeds]
+    workers = max_workers or os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    start = time.perf_counter()
+
+    if workers <= 1:
+        results = [simulate_graph(graphs[point], seed=child, end_time=end_time) for point, child in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(graphs, end_time),
+        ) as executor:
+            results = list(executor.map(_run_design_task, tasks, chunksize=chunksize))
+
+    names = [factor_name(factor) for factor in factors]
+    rows = []
+    for point, values in enumerate(design_points):
+        point_results = results[point * replications:(point + 1) * replications]
+        rows.append({
+            "point": point + 1,
+            "values": dict(zip(names, values)),
+            "summary": summarize_replications(point_results, confidence),
+        })
+
+    result = {
+        "factors": names,
+        "design": design if isinstance(design, str) else "custom",
+        "points": design_points,
+        "rows": rows,
+        "replications": replications,
+        "confidence": confidence,
+        "wall_time": time.perf_counter() - start,
+    }
+    if store is not None:
+        from results_store import SOURCE_EXPERIMENT, _as_store
+
+        result["run_id"] = _as_store(store).record(
+            SOURCE_EXPERIMENT, graph_data, results,
+            seeds=[child for _, child in tasks],
+            wall_time=result["wall_time"],
+            parameters=[rows[point]["values"] for point, _ in tasks],
+            points=[point + 1 for point, _ in tasks],
+            label=result["design"],
+        )
+    return result
+
+
+def experiment_table(result, kpis=KPI_NAMES):
+    """
+    将试验结果展开为二维表
+
+    返回:
+        tuple: (表头列表, 行列表)，每个统计量占均值和半宽两列
+    """
+    drains = list(result["rows"][0]["summary"]) if result["rows"] else []
+    header = ["设计点"] + result["factors"]
+    for drain in drains:
+        for kpi in kpis:
+            header += [f"{drain}.{KPI_LABELS[kpi]}", f"{drain}.{KPI_LABELS[kpi]}半宽"]
+    table = []
+    for row in result["rows"]:
+        line = [row["point"]] + [row["values"][name] for name in result["factors"]]
+        for drain in drains:
+            for kpi in kpis:
+                interval = row["summary"][drain][kpi]
+                line += [interval["mean"], interval["half_width"]]
+        table.append(line)
+    return header, table
+
+
+def save_experiment_csv(result, path, kpis=KPI_NAMES):
+    """将试验结果表保存为CSV文件（UTF-8 BOM，便于Excel打开）"""
+    header, table = experiment_table(result, kpis)
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(table)
+
+
+def format_experiment(result, kpis=("statthroughputperday",)):
+    """格式化试验结果表（默认只显示每天吞吐量）"""
+    header, table = experiment_table(result, kpis)
+    lines = [
+        f"试验设计: {result['design']}，{len(result['rows'])} 个设计点 × "
+        f"{result['replications']} 次重复，耗时: {result['wall_time']:.2f}秒",
+        "\t".join(header),
+    ]
+    for line in table:
+        lines.append("\t".join(
+            f"{value:.2f}" if isinstance(value, float) and not math.isinf(value)
+            else str(value)
+            for value in line
+        ))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    sample_graph_data = {
+        "nodes": [
+            {
+                "name": "源",
+                "type": "源",
+                "data": {"time": {"interval_time": "0:0:5:0", "stop_time": "1:0:0:0"}},
+            },
+            {"name": "缓冲区1", "type": "缓冲区", "data": {"capacity": 5}},
+            {
+                "name": "车削工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 270},
+                        }
+                    }
+                },
+            },
+            {"name": "传送器", "type": "传送器", "data": {"length": 10, "speed": 1, "capacity": 4}},
+            {
+                "name": "铣削工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 280},
+                        }
+                    }
+                },
+            },
+            {"name": "合格库存", "type": "物料终结", "data": {}},
+        ],
+        "edges": [
+            {"from": "源", "to": "缓冲区1"},
+            {"from": "缓冲区1", "to": "车削工位"},
+            {"from": "车削工位", "to": "传送器"},
+            {"from": "传送器", "to": "铣削工位"},
+            {"from": "铣削工位", "to": "合格库存"},
+        ],
+    }
+    sample_factors = [
+        {"node": "缓冲区1", "field": "capacity", "levels": [1, 5, 10], "low": 1, "high": 10,
+         "integer": True},
+        {"node": "传送器", "field": "capacity", "levels": [1, 4], "low": 1, "high": 4,
+         "integer": True},
+        {"node": "铣削工位", "field": "time.processing_time.parameters.mean", "name": "铣削均值",
+         "levels": [240, 280], "low": 240, "high": 280},
+    ]
+    for design_type in DESIGN_TYPES:
+        print(format_experiment(run_experiment(sample_graph_data, sample_factors, design_type, seed=1)))
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM接口的HTTP传输层：保持连接复用、超时控制和失败重试
+
+- 使用requests.Session和HTTPAdapter连接池，多次请求复用同一个TLS连接
+- 连接超时和读取超时分开设置，服务器无响应时不会一直挂起
+- 429和5xx响应、连接失败、超时按指数退避加随机抖动（full jitter）重试；
+  响应带Retry-After头时按服务器要求的时间等待
+- 每次请求记录耗时、尝试次数、状态码和错误，可查看延迟统计
+- stream()以服务器推送事件（SSE）方式逐条读取流式响应
+"""
+
+import email.utils
+import math
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_CONNECT_TIMEOUT = 10.0  # 秒
+DEFAULT_READ_TIMEOUT = 300.0  # 秒，长推理回复需要较长时间
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF = 1.0  # 第一次重试的最大等待秒数，之后每次翻倍
+DEFAULT_MAX_BACKOFF = 60.0  # 单次等待上限；Retry-After超过此值时不再重试
+DEFAULT_POOL_SIZE = 10
+METRICS_HISTORY = 1000  # 保留的最近请求记录数
+
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value, now=None):
+    """
+    解析Retry-After响应头
+    参数:
+        value: 秒数或HTTP日期字符串
+        now: 当前时间戳（默认time.time()）
+    返回:
+        需要等待的秒数，无法解析时返回None
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            moment = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if moment is None:
+            return None
+        seconds = moment.timestamp() - (time.time() if now is None else now)
+    if math.isnan(seconds):
+        return None
+    return max(0.0, seconds)
+
+
+class HTTPTransport:
+    """
+    带连接池、超时和重试的JSON POST客户端
+    参数:
+        url: 接口地址
+        headers: 每个请求都带的请求头
+        connect_timeout, read_timeout: 连接超时和读取超时（秒）
+        max_retries: 最多重试次数（不含第一次请求）
+        backoff: 第一次重试的最大等待秒数
+        max_backoff: 单次等待上限
+        pool_size: 连接池大小（并发请求数）
+        seed: 抖动随机数种子（None为随机）
+        sleep: 等待函数（默认time.sleep）
+    """
+
+    def __init__(
+        self,
+        url,
+        headers=None,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        pool_size=DEFAULT_POOL_SIZE,
+        seed=None,
+        sleep=time.sleep,
+    ):
+        self.url = url
+        self.headers = dict(headers or {})
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self._random = random.Random(seed)
+        self._sleep = sleep
+        self._session = None
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=METRICS_HISTORY)
+        self._totals = {"requests": 0, "failures": 0, "retries": 0}
+
+    @property
+    def session(self):
+        """首次使用时创建的requests.Session"""
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                # 重试由本类处理，适配器本身不重试
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self.pool_size, max_retries=0
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(self.headers)
+                self._session = session
+            return self._session
+
+    def close(self):
+        """关闭连接池"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _delay(self, attempt, response):
+        """
+        第attempt次重试前的等待秒数
+        返回:
+            等待秒数；Retry-After超过上限时返回None（不再重试）
+        """
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return retry_after if retry_after <= self.max_backoff else None
+        ceiling = min(self.max_backoff, self.backoff * 2 ** attempt)
+        with self._lock:
+            return self._random.uniform(0.0, ceiling)
+
+    def request(self, payload, stream=False):
+        """
+        POST一个JSON请求，失败时按规则重试
+        参数:
+            payload: 请求体字典
+            stream: 是否流式读取响应体（读取超时作用于每个数据块之间）
+        返回:
+            状态码为2xx的requests.Response
+        异常:
+            重试用尽或遇到不可重试的错误时抛出requests.exceptions.RequestException
+        """
+        started = time.perf_counter()
+        attempts = 0
+        waited = 0.0
+        response = None
+        error = None
+        try:
+            while True:
+                attempts += 1
+                response = None
+                try:
+                    response = self.session.post(
+                        self.url, json=payload, timeout=self.timeout, stream=stream
+                    )
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    error = e
+                else:
+                    if response.status_code not in RETRY_STATUS:
+                        response.raise_for_status()
+                        error = None
+                        return response
+                    error = requests.exceptions.HTTPError(
+                        f"{response.status_code} Server Error: {response.reason} for url: {self.url}",
+                        response=response,
+                    )
+
+                retry = attempts - 1
+                delay = self._delay(retry, response) if retry < self.max_retries else None
+                if response is not None:
+                    response.close()
+                if delay is None:
+                    raise error
+                print(
+                    f"⚠️ API请求失败（{_describe(error)}），{delay:.1f}秒后重试 "
+                    f"({retry + 1}/{self.max_retries})"
+                )
+                self._sleep(delay)
+                waited += delay
+        except requests.exceptions.RequestException as e:
+            error = e
+            raise
+        finally:
+            self._record(started, attempts, waited, response, error)
+
+    def post_json(self, payload):
+        """POST一个JSON请求并返回解析后的响应体"""
+        return self.request(payload).json()
+
+    def stream(self, payload):
+        """
+        POST一个JSON请求并逐条返回SSE事件的data字段
+        （重试只发生在收到响应头之前，延迟统计记录的是收到响应头的时间）
+        参数:
+            payload: 请求体字典（需包含"stream": True）
+        返回:
+            生成器；关闭生成器即关闭连接
+        """
+        response = self.request(payload, stream=True)
+        try:
+            # chunk_size=None：分块传输的数据到达即处理，不等待缓冲区填满
+            yield from iter_sse(response.iter_lines(chunk_size=None))
+        finally:
+            response.close()
+
+    # ------------------------------------------------------------------
+    # 延迟统计
+    # ------------------------------------------------------------------
+    def _record(self, started, attempts, waited, response, error):
+        entry = {
+            "time": time.time(),
+            "latency": time.perf_counter() - started,
+            "attempts": attempts,
+            "waited": waited,
+            "status": None if response is None else response.status_code,
+            "error": None if error is None else _describe(error),
+        }
+        with self._lock:
+            self._history.append(entry)
+            self._totals["requests"] += 1
+            self._totals["retries"] += attempts - 1
+            if error is not None:
+                self._totals["failures"] += 1
+
+    def metrics(self):
+        """
+        请求延迟统计
+        返回:
+            字典，含请求数、失败数、重试次数（全部请求），以及最近请求的
+            延迟均值、中位数、95%分位数、最大值（秒）和最近一次请求记录
+        """
+        with self._lock:
+            history = list(self._history)
+            report = dict(self._totals)
+        latencies = sorted(entry["latency"] for entry in history)
+        report["recent"] = len(latencies)
+        if latencies:
+            report["latency_mean"] = sum(latencies) / len(latencies)
+            report["latency_p50"] = _percentile(latencies, 0.5)
+            report["latency_p95"] = _percentile(latencies, 0.95)
+            report["latency_max"] = latencies[-1]
+            report["last"] = history[-1]
+        return report
+
+    def history(self):
+        """最近请求记录的列表"""
+        with self._lock:
+            return list(self._history)
+
+
+def iter_sse(lines):
+    """
+    把SSE文本行解析为事件
+    参数:
+        lines: 字节串或字符串行的可迭代对象（不含换行符）
+    返回:
+        生成器，逐个给出事件的data字段（多行data以换行连接）
+    """
+    data = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.rstrip("\r")
+        if not line:
+            # 空行表示一个事件结束
+            if data:
+                yield "\n".join(data)
+                data = []
+            continue
+        if line.startswith(":"):
+            continue  # 注释（心跳）
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            data.append(value)
+    if data:
+        yield "\n".join(data)
+
+
+def _percentile(ordered, fraction):
+    """已排序列表的线性插值分位数"""
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _describe(error):
+    response = getattr(error, "response", None)
+    if response is not None:
+        return f"HTTP {response.status_code}"
+    return type(error).__name__
+
+
+def format_transport_metrics(metrics):
+    """格式化请求延迟统计"""
+    lines = [
+        f"🌐 API请求: {metrics['requests']} 次, 重试 {metrics['retries']} 次, "
+        f"失败 {metrics['failures']} 次"
+    ]
+    if metrics["recent"]:
+        lines.append(
+            f"  延迟(最近{metrics['recent']}次): 平均 {metrics['latency_mean']:.2f} 秒, "
+            f"中位数 {metrics['latency_p50']:.2f} 秒, 95%分位 {metrics['latency_p95']:.2f} 秒, "
+            f"最大 {metrics['latency_max']:.2f} 秒"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    # 本地模拟接口：前两次返回503/429，之后正常返回
+    responses = [(503, {}), (429, {"Retry-After": "0.2"}), (200, {})]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            status, extra = responses.pop(0) if len(responses) > 1 else responses[0]
+            body = json.dumps(
+                {"choices": [{"message": {"content": "标准化后的描述"}}]}
+            ).encode("utf-8")
+            self.send_response(status)
+            for name, value in extra.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with HTTPTransport(
+        f"http://127.0.0.1:{server.server_port}/chat", backoff=0.1, seed=1
+    ) as transport:
+        for _ in range(3):
+            print(transport.post_json({"messages": []})["choices"][0]["message"])
+        print(format_transport_metrics(transport.metrics()))
+    server.shutdown()
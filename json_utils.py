@@ -37,3 +37,248 @@ def extract_json_from_response(response_text):
         print("原始响应内容:")
         print(response_text)
         return None
+
+
+# 有向图中允许的节点类型
+KNOWN_NODE_TYPES = ("源", "工位", "缓冲区", "传送器", "物料终结")
+
+# 只有直接向用户提问时才会出现的句式（思考过程中一般写作“需要询问用户……”）
+QUESTION_PATTERN = re.compile(r"(请问|请提供|请补充|请确认|请您|请告诉)[^。！!\n]*[？?]")
+
+
+def validate_node(node, seen_names=()):
+    """
+    检查单个节点是否完整
+    参数:
+        node: 节点字典
+        seen_names: 之前已出现的节点名称
+    返回:
+        问题描述列表，为空表示节点有效
+    """
+    if not isinstance(node, dict):
+        return ["不是有效的字典"]
+
+    problems = []
+    name = node.get("name")
+    if not name:
+        problems.append("缺少name属性")
+    elif name in seen_names:
+        problems.append(f"名称 '{name}' 重复")
+
+    node_type = node.get("type")
+    if not node_type:
+        problems.append("缺少type属性")
+    elif node_type not in KNOWN_NODE_TYPES:
+        problems.append(f"未知的节点类型 '{node_type}'")
+
+    data = node.get("data")
+    time_data = data.get("time") if isinstance(data, dict) else None
+    if not isinstance(time_data, dict):
+        time_data = {}
+    if node_type == "源" and "interval_time" not in time_data:
+        problems.append("源缺少interval_time")
+    if node_type == "工位" and "processing_time" not in time_data:
+        problems.append("工位缺少processing_time")
+    return problems
+
+
+def validate_edges(graph_data):
+    """
+    检查边的端点是否都是已有节点
+    返回:
+        问题描述列表
+    """
+    names = {
+        node.get("name") for node in graph_data.get("nodes", []) if isinstance(node, dict)
+    }
+    problems = []
+    for i, edge in enumerate(graph_data.get("edges", [])):
+        if not isinstance(edge, dict) or "from" not in edge or "to" not in edge:
+            problems.append(f"边 {i} 缺少'from'或'to'属性")
+            continue
+        for end in ("from", "to"):
+            if edge[end] not in names:
+                problems.append(f"边 {i} 的节点 '{edge[end]}' 不存在")
+    return problems
+
+
+class IncrementalGraphParser:
+    """
+    流式响应的增量解析器：逐段输入模型输出的文本，
+    发现有向图JSON的起点后逐个解析、验证已完整的节点和边，
+    整个JSON对象结束时给出完整的图数据；在JSON出现前若模型明显在向用户提问则标记为询问
+
+    feed()返回本段文本产生的事件列表，每个事件是一个字典，event字段为:
+        json_start: 有向图JSON开始
+        node: 一个节点完整（index、node、problems）
+        edge: 一条边完整（index、edge）
+        graph: 整个图完整（graph、problems）
+        question: 模型在询问用户（text为截至目前的回复；之后可能还有其他问题，
+                  需要接收完整回复后再使用）
+        error: 图JSON无法解析（message）
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.graph = None
+        self.question = None
+        self.nodes = []
+        self.edges = []
+        self._search = 0  # 尚未检查过的JSON起点候选位置
+        self._start = None  # JSON对象起点
+        self._pos = 0  # 下一个待扫描的字符
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_key = None
+        self._section = None  # 当前所在的顶层数组（nodes或edges）
+        self._item_start = None
+        self._done = False
+
+    def feed(self, chunk):
+        """
+        输入一段新文本
+        参数:
+            chunk: 流式响应中新到达的文本
+        返回:
+            事件字典列表
+        """
+        self.text += chunk
+        events = []
+        if self._start is None:
+            self._find_start(events)
+            if self._start is None:
+                if self.question is None and QUESTION_PATTERN.search(self.text):
+                    self.question = self.text
+                    events.append({"event": "question", "text": self.text})
+                return events
+        if not self._done:
+            self._scan(events)
+        return events
+
+    def _find_start(self, events):
+        """查找后面紧跟"nodes"或"edges"键的左花括号"""
+        while True:
+            index = self.text.find("{", self._search)
+            if index < 0:
+                self._search = len(self.text)
+                return
+            rest = self.text[index + 1 :].lstrip()
+            if rest.startswith('"nodes"') or rest.startswith('"edges"'):
+                self._start = index
+                self._pos = index
+                events.append({"event": "json_start"})
+                return
+            if '"nodes"'.startswith(rest) or '"edges"'.startswith(rest):
+                # 文本还不够长，等待下一段
+                self._search = index
+                return
+            self._search = index + 1
+
+    def _scan(self, events):
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        try:
+                            self._last_key = json.loads(text[self._string_start : i + 1])
+                        except json.JSONDecodeError:
+                            self._last_key = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                if len(self._stack) == 1 and char == "[":
+                    self._section = self._last_key
+                elif len(self._stack) == 2 and char == "{" and self._stack[1] == "[":
+                    self._item_start = i
+                self._stack.append(char)
+            elif char in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                depth = len(self._stack)
+                if depth == 2 and char == "}" and self._item_start is not None:
+                    self._item_complete(text[self._item_start : i + 1], events)
+                    self._item_start = None
+                elif depth == 1 and char == "]":
+                    self._section = None
+                elif depth == 0:
+                    self._pos = i + 1
+                    self._graph_complete(text[self._start : i + 1], events)
+                    return
+        self._pos = len(text)
+
+    def _item_complete(self, item_text, events):
+        try:
+            item = json.loads(item_text)
+        except json.JSONDecodeError:
+            return
+        if self._section == "nodes":
+            seen = [node.get("name") for node in self.nodes if isinstance(node, dict)]
+            events.append(
+                {
+                    "event": "node",
+                    "index": len(self.nodes),
+                    "node": item,
+                    "problems": validate_node(item, seen),
+                }
+            )
+            self.nodes.append(item)
+        elif self._section == "edges":
+            events.append({"event": "edge", "index": len(self.edges), "edge": item})
+            self.edges.append(item)
+
+    def _graph_complete(self, graph_text, events):
+        self._done = True
+        try:
+            graph = json.loads(graph_text)
+        except json.JSONDecodeError as e:
+            events.append({"event": "error", "message": str(e)})
+            return
+        if not isinstance(graph, dict):
+            events.append({"event": "error", "message": "图数据不是有效的字典"})
+            return
+        self.graph = graph
+        events.append(
+            {"event": "graph", "graph": graph, "problems": validate_edges(graph)}
+        )
+
+
+def format_stream_event(event):
+    """把增量解析事件格式化为一行提示，不需要提示的事件返回None"""
+    kind = event["event"]
+    if kind == "json_start":
+        return "🔍 检测到有向图JSON，开始逐个验证节点..."
+    if kind == "node":
+        node = event["node"]
+        label = f"节点 [{event['index'] + 1}]"
+        if isinstance(node, dict):
+            label += f" {node.get('name')} ({node.get('type')})"
+        if event["problems"]:
+            return f"⚠️ {label}: " + "; ".join(event["problems"])
+        return f"✅ {label}"
+    if kind == "graph":
+        graph = event["graph"]
+        line = (
+            f"✅ 有向图接收完成: {len(graph.get('nodes', []))} 个节点, "
+            f"{len(graph.get('edges', []))} 条边"
+        )
+        if event["problems"]:
+            line += "\n⚠️ " + "\n⚠️ ".join(event["problems"])
+        return line
+    if kind == "question":
+        return "❓ 模型正在询问补充信息"
+    if kind == "error":
+        return f"❌ 有向图JSON解析失败: {event['message']}"
+    return None
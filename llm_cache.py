@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLM响应缓存：按请求内容寻址，把相同的标准化、有向图生成请求的响应保存在本地，
+反复运行同一段描述（调试、批处理）时不再重复请求API
+
+- 键为请求内容（模型、温度、最大token数、消息列表）规范化JSON的sha256，
+  与字典键顺序无关
+- 条目数和总字节数有上限，超出时按最近访问时间淘汰（LRU）；超过有效期（TTL）的条目视为未命中
+- 回放模式只读：只从缓存返回，未命中时抛出CacheMiss，不发请求也不写缓存，
+  用于离线复现以前的运行
+- 使用sqlite的WAL模式，写操作在BEGIN IMMEDIATE事务中完成，多个进程同时读写同一个缓存文件是安全的
+- 命中/未命中次数在本进程内计数，同时累计到缓存文件中，可查看所有进程的统计
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = "llm_cache.sqlite"
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_TTL = 30 * 24 * 3600  # 秒
+BUSY_TIMEOUT = 30.0  # 等待其他进程释放写锁的秒数
+
+# 参与计算键的请求字段（stream等只影响传输方式的字段不参与）
+KEY_FIELDS = ("model", "temperature", "max_tokens", "top_p", "messages")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+COUNTER_NAMES = ("hits", "misses", "stores", "evictions", "expired")
+
+
+class CacheMiss(LookupError):
+    """回放模式下请求不在缓存中"""
+
+
+def canonical_request(payload):
+    """
+    请求内容的规范化JSON文本
+    参数:
+        payload: API请求体字典
+    返回:
+        键排序、无多余空白的JSON字符串；温度统一为浮点数，0.3与0.30得到相同的键
+    """
+    canonical = {}
+    for field in KEY_FIELDS:
+        if field not in payload:
+            continue
+        value = payload[field]
+        if field in ("temperature", "top_p") and value is not None:
+            value = float(value)
+        canonical[field] = value
+    return json.dumps(
+        canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":")
+    )
+
+
+def request_key(payload):
+    """请求内容的sha256十六进制摘要"""
+    return hashlib.sha256(canonical_request(payload).encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    基于sqlite文件的LLM响应缓存
+    参数:
+        path: 缓存文件路径（首次使用时创建）
+        max_entries: 最多保留的条目数
+        max_bytes: 响应文本的总字节数上限
+        ttl: 条目有效期（秒），None表示永不过期
+        replay: 只读回放模式
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_CACHE_PATH,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        max_bytes=DEFAULT_MAX_BYTES,
+        ttl=DEFAULT_TTL,
+        replay=False,
+    ):
+        self.path = os.fspath(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.replay = replay
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(COUNTER_NAMES, 0)
+
+    # ------------------------------------------------------------------
+    # 连接管理：每个线程、每个进程各用一个连接（sqlite连接不能跨线程或fork后共用）
+    # ------------------------------------------------------------------
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+
+        if self.replay:
+            if not os.path.exists(self.path):
+                raise CacheMiss(f"回放模式下缓存文件不存在: {self.path}")
+            connection = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT, isolation_level=None
+            )
+        else:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def close(self):
+        """关闭当前线程的连接"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+        self._local.connection = None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    @staticmethod
+    def _add_counters(connection, increments):
+        for name, amount in increments.items():
+            if amount:
+                connection.execute(
+                    "INSERT INTO counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (name, amount),
+                )
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
+    def get(self, payload):
+        """
+        查找请求的缓存响应
+        参数:
+            payload: API请求体字典
+        返回:
+            响应字典；未命中或已过期时返回None（回放模式下抛出CacheMiss）
+        """
+        key = request_key(payload)
+        connection = self._connection()
+        now = time.time()
+
+        if self.replay:
+            # 回放模式忽略有效期，也不更新访问时间
+            row = connection.execute(
+                "SELECT response FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                raise CacheMiss(f"回放模式下缓存未命中: {key[:16]}")
+            self._count("hits")
+            return json.loads(row[0])
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT response, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            expired = (
+                row is not None and self.ttl is not None and now - row[1] > self.ttl
+            )
+            if row is None or expired:
+                if expired:
+                    connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._add_counters(
+                    connection, {"misses": 1, "expired": 1 if expired else 0}
+                )
+                connection.execute("COMMIT")
+                self._count("misses")
+                if expired:
+                    self._count("expired")
+                return None
+
+            connection.execute(
+                "UPDATE entries SET last_access = ?, hits = hits + 1 WHERE key = ?",
+                (now, key),
+            )
+            self._add_counters(connection, {"hits": 1})
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._count("hits")
+        return json.loads(row[0])
+
+    def put(self, payload, response):
+        """
+        保存请求的响应，并按条目数和字节数上限淘汰最久未访问的条目
+        参数:
+            payload: API请求体字典
+            response: 响应字典
+        """
+        if self.replay:
+            return
+        key = request_key(payload)
+        text = json.dumps(response, ensure_ascii=False, separators=(",", ":"))
+        size = len(text.encode("utf-8"))
+        connection = self._connection()
+        now = time.time()
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(key, response, size, created_at, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                (key, text, size, now, now),
+            )
+            evicted = self._evict(connection)
+            self._add_counters(connection, {"stores": 1, "evictions": evicted})
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self._count("stores")
+        self._count("evictions", evicted)
+
+    def _evict(self, connection):
+        """在当前事务中淘汰超出上限的条目，返回淘汰条数"""
+        rows = connection.execute(
+            "SELECT key, size FROM entries ORDER BY last_access DESC"
+        ).fetchall()
+        keep_entries = len(rows)
+        if self.max_entries is not None:
+            keep_entries = min(keep_entries, self.max_entries)
+        if self.max_bytes is not None:
+            total = 0
+            for index, (_, size) in enumerate(rows[:keep_entries]):
+                total += size
+                if total > self.max_bytes:
+                    # 至少保留刚写入的条目
+                    keep_entries = max(index, 1)
+                    break
+
+        victims = [(key,) for key, _ in rows[keep_entries:]]
+        if victims:
+            connection.executemany("DELETE FROM entries WHERE key = ?", victims)
+        return len(victims)
+
+    def fetch(self, payload, request_function):
+        """
+        先查缓存，未命中时调用request_function(payload)并保存结果
+        参数:
+            payload: API请求体字典
+            request_function: 实际发送请求的函数，返回响应字典
+        返回:
+            响应字典
+        """
+        response = self.get(payload)
+        if response is not None:
+            return response
+        response = request_function(payload)
+        # 只缓存正常的补全结果
+        if isinstance(response, dict) and response.get("choices"):
+            self.put(payload, response)
+        return response
+
+    # ------------------------------------------------------------------
+    # 维护与统计
+    # ------------------------------------------------------------------
+    def clear(self):
+        """删除所有条目（累计统计保留）"""
+        if self.replay:
+            return
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("DELETE FROM entries")
+        connection.execute("COMMIT")
+
+    def purge_expired(self):
+        """删除所有过期条目，返回删除条数"""
+        if self.replay or self.ttl is None:
+            return 0
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = connection.execute(
+                "DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+            self._add_counters(connection, {"expired": cursor.rowcount})
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def stats(self):
+        """
+        缓存统计
+        返回:
+            字典，session为本进程的计数，total为缓存文件中所有进程的累计计数，
+            另含当前条目数、总字节数和命中率
+        """
+        with self._lock:
+            session = dict(self._counts)
+        report = {
+            "path": self.path,
+            "replay": self.replay,
+            "session": session,
+            "session_hit_rate": _hit_rate(session),
+            "total": dict.fromkeys(COUNTER_NAMES, 0),
+            "entries": 0,
+            "bytes": 0,
+        }
+        if not os.path.exists(self.path):
+            return report
+
+        connection = self._connection()
+        entries, size = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        report["entries"] = entries
+        report["bytes"] = size
+        for name, value in connection.execute("SELECT name, value FROM counters"):
+            report["total"][name] = value
+        report["total_hit_rate"] = _hit_rate(report["total"])
+        return report
+
+
+def _hit_rate(counts):
+    lookups = counts["hits"] + counts["misses"]
+    return counts["hits"] / lookups if lookups else None
+
+
+def format_cache_stats(stats):
+    """格式化缓存统计"""
+    session = stats["session"]
+    lines = [f"🗄️  LLM响应缓存: {stats['path']}" + (" (回放模式)" if stats["replay"] else "")]
+    rate = stats["session_hit_rate"]
+    lines.append(
+        f"  本次运行: 命中 {session['hits']} 次, 未命中 {session['misses']} 次"
+        + (f", 命中率 {rate:.1%}" if rate is not None else "")
+    )
+    total = stats["total"]
+    rate = stats.get("total_hit_rate")
+    lines.append(
+        f"  累计: 命中 {total['hits']} 次, 未命中 {total['misses']} 次"
+        + (f", 命中率 {rate:.1%}" if rate is not None else "")
+        + f", 淘汰 {total['evictions']} 条, 过期 {total['expired']} 条"
+    )
+    lines.append(f"  当前条目: {stats['entries']} 条, {stats['bytes'] / 1024:.1f} KB")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    sample_messages = [
+        {"role": "system", "content": "你是一个工业建模语言标准化专家"},
+        {"role": "user", "content": "源每隔10分钟产生一个毛坯，经过缓冲区进入铣床"},
+    ]
+    sample_payload = {
+        "model": "deepseek-chat",
+        "messages": sample_messages,
+        "temperature": 0.3,
+        "max_tokens": 4096,
+    }
+
+    def fake_request(payload):
+        time.sleep(0.2)
+        return {"choices": [{"message": {"content": "标准化后的描述"}}]}
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LLMCache(os.path.join(directory, "cache.sqlite"), max_entries=2)
+        for _ in range(3):
+            started = time.perf_counter()
+            cache.fetch(sample_payload, fake_request)
+            print(f"请求耗时: {time.perf_counter() - started:.3f} 秒")
+        print(format_cache_stats(cache.stats()))
+        cache.close()
+
+        replay = LLMCache(os.path.join(directory, "cache.sqlite"), replay=True)
+        print(replay.fetch(sample_payload, fake_request)["choices"][0]["message"])
+        try:
+            replay.fetch(dict(sample_payload, temperature=0.7), fake_request)
+        except CacheMiss as e:
+            print(f"⚠️ {e}")
+        replay.close()
@@ -6,164 +6,233 @@ Created on Thu Jul 17 12:33:39 2025
 
 """
 
+import asyncio
 import time
 import json
 import uuid
 import pythoncom
-from api_utils import make_api_request
-from json_utils import extract_json_from_response
+import api_utils
+from api_utils import make_api_request, stream_api_request
+from json_utils import (
+    IncrementalGraphParser,
+    extract_json_from_response,
+    format_stream_event,
+)
 from graph_preprocessor import convert_zero_capacity_conveyors_to_edges
 from simtalk_generator import json_to_simtalk
 from plant_simulator import create_plant_simulation_model
 from visualize import ProductionLineVisualizer
-from visualization_confirm import visualize_and_confirm
+from visualization_confirm import visualize_and_confirm, reset_what_if_session
+from replication_runner import run_replications, format_replication_summary
+from steady_state import estimate_steady_state, format_steady_state
+from results_store import DEFAULT_STORE_DIR
+from llm_cache import format_cache_stats
+from http_transport import format_transport_metrics
 
 
-from dynamic_prompt import DynamicPromptGenerator
-
-# 新增：导入标准化处理模块
-from standardization import standardize_text
+# 新增：导入标准化处理模块（标准化与提示词准备并行进行）
+from async_pipeline import prepare_description
 
 # 对话历史存储
 conversation_history = []
 
-print("🎯 欢迎使用 Plant Simulation 自动化建模工具！")
-print("📝 请输入您的生产线描述，我将自动生成Plant Simulation模型")
-print("💡 例如：源节点每10分钟生成一个产品，加工工位处理时间5分钟，缓冲区容量10...")
-print("🚪 输入 'exit' 或 'quit' 可退出程序\n")
-
 # 调试模式开关 - 设置为True可查看AI完整思考过程
 DEBUG_MODE = 1
 
-# 初始化COM环境
-pythoncom.CoInitialize()
-try:
-    while True:
-        prompt_generator = DynamicPromptGenerator()
-        user_input = input("👤 请输入生产线描述: ")
-        if user_input.strip().lower() in ["exit", "quit"]:
-            print("👋 再见！")
-            break
-
-        # 先进行文本标准化处理
-        print("🔄 正在进行文本标准化处理...")
-        standardized_text = standardize_text(user_input)
-
-        if standardized_text:
-            print("✅ 文本标准化完成！")
-            print(f"标准化后的文本: {standardized_text}")
-            processed_text = standardized_text
-        else:
-            print("⚠️  标准化处理失败，使用原始文本")
-            processed_text = user_input
-
-        # 创建循环用于支持用户确认流程
-        confirmed = False
-        current_graph = None
-        while not confirmed:
-            conversation_history.append({"role": "user", "content": user_input})
-            dynamic_prompt = prompt_generator.generate_dynamic_prompt(user_input)
-            print(dynamic_prompt)
-
-            # 构造请求消息
-            messages = [{"role": "system", "content": dynamic_prompt}]
-            messages.extend(conversation_history)
-
-            try:
-                print("⏳ 正在生成有向图数据结构...")
-                result = make_api_request(messages)
-                reply = result["choices"][0]["message"]["content"]
-
-                conversation_history.append({"role": "assistant", "content": reply})
-
-                if DEBUG_MODE:
-                    print("\nAI完整响应:")
-                    print(reply)
-                    print()
-
-                print("🔍 提取模型数据结构...")
-                graph_data = extract_json_from_response(reply)
-
-                # 检查API回复是否是询问而不是JSON
-                if not graph_data and (
-                    "?" in reply or "请" in reply or "需要" in reply or "缺少" in reply
-                ):
-                    print("\n❓ 需要补充信息:")
-                    print(reply)
-                    user_input = input("👤 请补充相关信息: ")  # 接收补充信息
-                    # 移除刚添加的用户输入，因为需要替换为新的补充信息
-                    conversation_history.pop()
-                    continue
-
-                if graph_data:
-                    print("✅ 成功解析有向图数据结构！")
-
-                    # 处理并验证图数据
-                    print("🔍 处理并验证图数据结构...")
-                    is_valid, process_msg, processed_graph = (
-                        ProductionLineVisualizer.process_and_validate_graph_data(
-                            graph_data
+# 流式接收有向图回复：边接收边输出思考过程并逐个验证节点，模型提问时提前结束
+STREAM_MODE = True
+
+# 确认后本地仿真的重复次数（0表示跳过本地仿真）
+LOCAL_REPLICATIONS = 10
+
+# 确认后是否进行稳态分析（自动检测预热期，单次长时间运行的批均值估计）
+STEADY_STATE_ANALYSIS = True
+
+
+def main():
+    print("🎯 欢迎使用 Plant Simulation 自动化建模工具！")
+    print("📝 请输入您的生产线描述，我将自动生成Plant Simulation模型")
+    print("💡 例如：源节点每10分钟生成一个产品，加工工位处理时间5分钟，缓冲区容量10...")
+    print("🚪 输入 'exit' 或 'quit' 可退出程序\n")
+
+    # 初始化COM环境
+    pythoncom.CoInitialize()
+    try:
+        while True:
+            user_input = input("👤 请输入生产线描述: ")
+            if user_input.strip().lower() in ["exit", "quit"]:
+                if api_utils.response_cache is not None:
+                    print(format_cache_stats(api_utils.response_cache.stats()))
+                print(format_transport_metrics(api_utils.transport.metrics()))
+                print("👋 再见！")
+                break
+            # 新的描述不与上一条描述的图数据比较
+            reset_what_if_session()
+
+            # 先进行文本标准化处理
+            print("🔄 正在进行文本标准化处理...")
+            # 标准化请求进行的同时解析背景文档、初始化字体
+            standardized_text, prompt_generator = asyncio.run(
+                prepare_description(user_input, ask=input)
+            )
+
+            if standardized_text:
+                print("✅ 文本标准化完成！")
+                print(f"标准化后的文本: {standardized_text}")
+                processed_text = standardized_text
+            else:
+                print("⚠️  标准化处理失败，使用原始文本")
+                processed_text = user_input
+
+            # 创建循环用于支持用户确认流程
+            confirmed = False
+            current_graph = None
+            while not confirmed:
+                conversation_history.append({"role": "user", "content": user_input})
+                dynamic_prompt = prompt_generator.generate_dynamic_prompt(user_input)
+                print(dynamic_prompt)
+
+                # 构造请求消息
+                messages = [{"role": "system", "content": dynamic_prompt}]
+                messages.extend(conversation_history)
+
+                try:
+                    print("⏳ 正在生成有向图数据结构...")
+                    parser = IncrementalGraphParser()
+                    if STREAM_MODE:
+
+                        def on_delta(text):
+                            print(text, end="", flush=True)
+                            for event in parser.feed(text):
+                                line = format_stream_event(event)
+                                if line:
+                                    print(f"\n{line}", flush=True)
+
+                        result = stream_api_request(messages, on_delta)
+                        print()
+                    else:
+                        result = make_api_request(messages)
+                    reply = result["choices"][0]["message"]["content"]
+
+                    conversation_history.append({"role": "assistant", "content": reply})
+
+                    if DEBUG_MODE and not STREAM_MODE:
+                        print("\nAI完整响应:")
+                        print(reply)
+                        print()
+
+                    print("🔍 提取模型数据结构...")
+                    graph_data = parser.graph or extract_json_from_response(reply)
+
+                    # 检查API回复是否是询问而不是JSON
+                    if not graph_data and (
+                        parser.question is not None
+                        or "?" in reply
+                        or "请" in reply
+                        or "需要" in reply
+                        or "缺少" in reply
+                    ):
+                        print("\n❓ 需要补充信息:")
+                        print(reply)
+                        user_input = input("👤 请补充相关信息: ")  # 接收补充信息
+                        # 移除刚添加的用户输入，因为需要替换为新的补充信息
+                        conversation_history.pop()
+                        continue
+
+                    if graph_data:
+                        print("✅ 成功解析有向图数据结构！")
+
+                        # 处理并验证图数据
+                        print("🔍 处理并验证图数据结构...")
+                        is_valid, process_msg, processed_graph = (
+                            ProductionLineVisualizer.process_and_validate_graph_data(
+                                graph_data
+                            )
                         )
-                    )
-                    if not is_valid:
-                        print(f"❌ 图数据结构无效: {process_msg}")
-                        print("请检查输入描述或API响应格式")
-                        break
+                        if not is_valid:
+                            print(f"❌ 图数据结构无效: {process_msg}")
+                            print("请检查输入描述或API响应格式")
+                            break
 
-                    print(process_msg)
-                    graph_data = processed_graph  # 使用处理后的图数据
+                        print(process_msg)
+                        graph_data = processed_graph  # 使用处理后的图数据
 
-                    print("🔄 检查容量为0的传送器节点...")
-                    graph_data = convert_zero_capacity_conveyors_to_edges(graph_data)
-                    print("✅ 成功处理容量为0的传送器节点")
+                        print("🔄 检查容量为0的传送器节点...")
+                        graph_data = convert_zero_capacity_conveyors_to_edges(graph_data)
+                        print("✅ 成功处理容量为0的传送器节点")
 
-                    print("提取的JSON数据:")
-                    print(json.dumps(graph_data, indent=2, ensure_ascii=False))
+                        print("提取的JSON数据:")
+                        print(json.dumps(graph_data, indent=2, ensure_ascii=False))
 
-                    # 新增：初始化字体配置
-                    ProductionLineVisualizer.initialize_fonts(print_fonts=False)
+                        # 新增：初始化字体配置
+                        ProductionLineVisualizer.initialize_fonts(print_fonts=False)
 
-                    # 替换原有可视化代码为确认流程
-                    print("📊 正在可视化并确认有向图...")
-                    confirmed, current_graph = visualize_and_confirm(
-                        graph_data, conversation_history
-                    )
+                        # 替换原有可视化代码为确认流程
+                        print("📊 正在可视化并确认有向图...")
+                        confirmed, current_graph = visualize_and_confirm(
+                            graph_data, conversation_history
+                        )
 
-                    if not confirmed:
-                        # 获取用户最新修改意见
-                        user_input = conversation_history[-1]["content"]
-                        # 保留对话历史但重置当前循环状态
-                        continue
+                        if not confirmed:
+                            # 获取用户最新修改意见
+                            user_input = conversation_history[-1]["content"]
+                            # 保留对话历史但重置当前循环状态
+                            continue
+                        else:
+                            # 用户确认后跳出确认循环
+                            break
                     else:
-                        # 用户确认后跳出确认循环
+                        print("❌ 无法从响应中提取有效的JSON数据")
+                        print("原始API响应:")
+                        print(reply)
                         break
-                else:
-                    print("❌ 无法从响应中提取有效的JSON数据")
-                    print("原始API响应:")
-                    print(reply)
-                    break
 
-            except Exception as e:
-                print(f"❌ 处理过程中发生错误: {str(e)}")
-                break
+                except Exception as e:
+                    print(f"❌ 处理过程中发生错误: {str(e)}")
+                    break
 
-        # 确认后继续生成模型代码
-        if confirmed and current_graph:
-            print("⏳ 正在生成Plant Simulation代码...")
-            model_setup_code, data_writing_code = json_to_simtalk(current_graph)
+            # 确认后继续生成模型代码
+            if confirmed and current_graph:
+                print("⏳ 正在生成Plant Simulation代码...")
+                model_setup_code, data_writing_code = json_to_simtalk(current_graph)
+
+                print("\n生成的模型建立代码:")
+                print(model_setup_code)
+                print("\n生成的数据写入代码:")
+                print(data_writing_code)
+                print()
+
+                if LOCAL_REPLICATIONS > 0:
+                    print("⏳ 正在运行本地仿真重复实验...")
+                    try:
+                        report = run_replications(
+                            current_graph, LOCAL_REPLICATIONS, store=DEFAULT_STORE_DIR
+                        )
+                        print(format_replication_summary(report))
+                        print()
+                    except Exception as e:
+                        print(f"⚠️ 本地仿真失败: {str(e)}")
+
+                if STEADY_STATE_ANALYSIS:
+                    print("⏳ 正在进行稳态分析...")
+                    try:
+                        print(format_steady_state(estimate_steady_state(current_graph)))
+                        print()
+                    except Exception as e:
+                        print(f"⚠️ 稳态分析失败: {str(e)}")
+
+                print("⏳ 正在创建Plant Simulation模型...")
+                if create_plant_simulation_model(
+                    model_setup_code, data_writing_code, graph_data=current_graph
+                ):
+                    print("🎉 模型创建及数据处理成功！Plant Simulation即将启动...")
+                else:
+                    print("❌ 操作失败，请检查错误信息")
 
-            print("\n生成的模型建立代码:")
-            print(model_setup_code)
-            print("\n生成的数据写入代码:")
-            print(data_writing_code)
-            print()
+    finally:
+        # 释放COM环境
+        pythoncom.CoUninitialize()
 
-            print("⏳ 正在创建Plant Simulation模型...")
-            if create_plant_simulation_model(model_setup_code, data_writing_code):
-                print("🎉 模型创建及数据处理成功！Plant Simulation即将启动...")
-            else:
-                print("❌ 操作失败，请检查错误信息")
 
-finally:
-    # 释放COM环境
-    pythoncom.CoUninitialize()
+if __name__ == "__main__":
+    main()
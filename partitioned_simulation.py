@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程分区仿真：将大型工厂的有向图在传送器处切分，各分区在独立进程中仿真
+
+切分与同步方式（保守同步）：
+- 只有一个前驱、一个后继且运输时间length/speed大于0的传送器可以作为切分点；
+  其余节点按边连通关系合并为区域，区域再按拓扑顺序、节点数均衡地分配到各进程
+- 被切分的传送器归下游分区所有；上游分区保留一个代理，记录占用的位置，
+  零件进入代理时把(进入时间, 创建时间)发送给下游
+- 仿真时间按前瞻量（被切分传送器的最短运输时间）划分为时间窗：
+  上游在窗口k-1内送出的零件最早在窗口k才会到达下游出口，
+  下游在窗口k内从传送器取走零件的时刻再发回上游以释放代理中的位置
+- 离开消息没有前瞻量，但上游只有在代理已满、且最早进入的零件可能已到达出口时
+  才需要知道零件是否已离开：此时（判断能否进入代理，或被阻塞的前驱等到该零件
+  可能离开的时刻）才等待下游的窗口k；否则先完成窗口k，结束后再接收离开消息。
+  传送器不满时相邻分区同时推进同一窗口，而不是交替等待
+- 缓冲区没有停留时间，不提供前瞻量，不作为切分点
+
+各分区与顺序仿真使用相同的按(节点, 用途)派生的随机数流，结果与
+simulate_graph(..., method="event")在相同种子下一致。
+"""
+
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from simulation_engine import (
+    _EVENT_CREATE,
+    _EVENT_READY,
+    CONVEYOR,
+    DRAIN,
+    SOURCE,
+    ProductionLineSimulator,
+    _Part,
+)
+
+
+class _PartitionSimulator(ProductionLineSimulator):
+    """只负责部分节点的仿真器：其余节点的副本只用于保持下标和随机数流一致"""
+
+    def __init__(self, graph_data, seed, end_time, owned, outgoing, incoming):
+        """
+        参数:
+            owned: 本分区负责的节点下标（包括归本分区所有的被切分传送器）
+            outgoing: 本分区保留代理的被切分传送器下标（下游分区所有）
+            incoming: 归本分区所有、上游在其他分区的被切分传送器下标
+        """
+        super().__init__(graph_data, seed=seed, end_time=end_time)
+        self.owned = set(owned)
+        self.outgoing = set(outgoing)
+        self.incoming = set(incoming)
+        self.sent = []  # [(传送器下标, 进入时间, 创建时间)]
+        self.exits = []  # [(传送器下标, 离开时间)]
+        # 代理中尚未收到离开时间的零件的进入时间（先进先出）
+        self.unknown = {index: deque() for index in self.outgoing}
+        self.exits_known_until = 0.0  # 早于该时刻的离开消息均已收到
+        self.fetch_exits = None  # 阻塞接收下游当前窗口离开消息的函数，由分区进程设置
+        self._armed = {index: None for index in self.outgoing}
+
+    def _schedule_initial_events(self):
+        for sim_node in self.nodes:
+            if sim_node.index not in self.owned:
+                continue
+            if sim_node.type == SOURCE:
+                self._schedule(sim_node.start_time, _EVENT_CREATE, sim_node.index)
+            if sim_node.failure is not None:
+                first_failure = sim_node.failure["start"] + sim_node.failure["interval"]()
+                self._schedule_failure(sim_node, first_failure)
+
+    def _enter(self, sim_node, part):
+        index = sim_node.index
+        if index in self.outgoing:
+            # 代理：占用位置，等待下游发回离开时间后才放行
+            part.target = None
+            part.ready_at = None
+            sim_node.parts.append(part)
+            self.unknown[index].append(self.now)
+            self.sent.append((index, self.now, part.created_at))
+            return
+        if index not in self.owned:
+            return  # 代理放行到下游分区的节点，零件离开本分区
+        super()._enter(sim_node, part)
+
+    def _can_accept(self, sim_node):
+        if sim_node.index in self.outgoing and len(sim_node.parts) >= sim_node.capacity:
+            self._settle_exits(sim_node)
+            # 已离开的零件直接移出：请求进入的节点正在判断代理是否有空位
+            parts = sim_node.parts
+            while parts and parts[0].ready_at is not None and parts[0].ready_at <= self.now:
+                parts.popleft()
+        return super()._can_accept(sim_node)
+
+    def _wake(self, sim_node):
+        if sim_node.index in self.outgoing and len(sim_node.parts) >= sim_node.capacity:
+            # 被阻塞的前驱等到的时刻：收到离开消息后由放行代理中的零件唤醒前驱
+            self._settle_exits(sim_node)
+        super()._wake(sim_node)
+
+    def _settle_exits(self, proxy):
+        """
+        代理已满时：最早进入的零件可能已离开而本窗口的离开消息还未收到时等待下游，
+        否则在需要再次检查的时刻（该零件最早可能离开的时刻，或下一窗口开始时）安排检查
+        """
+        unknown = self.unknown[proxy.index]
+        while unknown:
+            # 该零件离开之前，且早于已收到的离开消息的时刻，代理一定仍是满的
+            due = max(unknown[0] + proxy.travel_time, self.exits_known_until)
+            if due <= self.now:
+                self.fetch_exits()
+                continue
+            if due < math.inf and self._armed[proxy.index] != due:
+                self._armed[proxy.index] = due
+                self._schedule(due, _EVENT_READY, proxy.index)
+            return
+
+    def _on_space_freed(self, sim_node):
+        if sim_node.index in self.incoming:
+            self.exits.append((sim_node.index, self.now))
+        super()._on_space_freed(sim_node)
+
+    def receive_entries(self, entries):
+        """上游零件进入被切分传送器：按进入时间加运输时间安排到达"""
+        for index, entered_at, created_at in entries:
+            conveyor = self.nodes[index]
+            part = _Part(self._next_part_id, created_at)
+            self._next_part_id += 1
+            part.ready_at = entered_at + conveyor.travel_time
+            conveyor.parts.append(part)
+            self._schedule(part.ready_at, _EVENT_READY, index)
+
+    def receive_exits(self, exits):
+        """
+        下游从被切分传送器取走零件：在对应时刻释放代理中的位置
+        （窗口结束后才收到的消息，离开时间已过，在当前时刻释放）
+        """
+        for index, left_at in exits:
+            for part in self.nodes[index].parts:
+                if part.ready_at is None:
+                    part.ready_at = left_at
+                    break
+            self.unknown[index].popleft()
+            self._schedule(max(left_at, self.now), _EVENT_READY, index)
+
+    def owned_statistics(self):
+        stats = self.statistics()
+        return {
+            name: node_stats
+            for name, node_stats in stats.items()
+            if self.node_index[name] in self.owned
+        }
+
+
+def _find(parent, item):
+    while parent[item] != item:
+        parent[item] = parent[parent[item]]
+        item = parent[item]
+    return item
+
+
+def _union(parent, first, second):
+    first, second = _find(parent, first), _find(parent, second)
+    if first != second:
+        parent[second] = first
+
+
+def _strongly_connected(count, successors):
+    """迭代版Kosaraju算法，返回每个顶点所属强连通分量的编号"""
+    order = []
+    visited = [False] * count
+    for root in range(count):
+        if visited[root]:
+            continue
+        visited[root] = True
+        stack = [(root, iter(successors[root]))]
+        while stack:
+            vertex, children = stack[-1]
+            for child in children:
+                if not visited[child]:
+                    visited[child] = True
+                    stack.append((child, iter(successors[child])))
+                    break
+            else:
+                stack.pop()
+                order.append(vertex)
+
+    predecessors = [[] for _ in range(count)]
+    for vertex in range(count):
+        for child in successors[vertex]:
+            predecessors[child].append(vertex)
+    component = [-1] * count
+    label = 0
+    for root in reversed(order):
+        if component[root] != -1:
+            continue
+        component[root] = label
+        stack = [root]
+        while stack:
+            vertex = stack.pop()
+            for parent in predecessors[vertex]:
+                if component[parent] == -1:
+                    component[parent] = label
+                    stack.append(parent)
+        label += 1
+    return component
+
+
+def partition_graph(graph_data, partitions):
+    """
+    在传送器处切分图数据
+
+    参数:
+        graph_data: 与simulate_graph相同的图数据
+        partitions: 期望的分区数
+
+    返回:
+        dict: assignment（每个节点所属的分区，按nodes顺序）、partitions（实际分区数）、
+              cuts（被切分传送器的名称列表）、lookahead（前瞻量，秒；无切分时为None）
+    """
+    model = ProductionLineSimulator(graph_data)
+    nodes = model.nodes
+    count = len(nodes)
+
+    def cuttable(sim_node):
+        return (
+            sim_node.type == CONVEYOR
+            and sim_node.travel_time > 0
+            and len(sim_node.predecessors) == 1
+            and len(sim_node.successors) == 1
+        )
+
+    # 区域：去掉可切分传送器后的连通块；传送器并入其下游节点所在区域
+    parent = list(range(count))
+    for sim_node in nodes:
+        for successor in sim_node.successors:
+            if not cuttable(sim_node) and not cuttable(nodes[successor]):
+                _union(parent, sim_node.index, successor)
+    for sim_node in nodes:
+        if cuttable(sim_node):
+            _union(parent, sim_node.successors[0], sim_node.index)
+
+    # 区域之间存在环（如返工回路）时合并，使区域图成为有向无环图
+    while True:
+        roots = sorted({_find(parent, index) for index in range(count)})
+        region_of = {root: position for position, root in enumerate(roots)}
+        region_successors = [set() for _ in roots]
+        for sim_node in nodes:
+            if cuttable(sim_node):
+                upstream = region_of[_find(parent, sim_node.predecessors[0])]
+                downstream = region_of[_find(parent, sim_node.index)]
+                if upstream != downstream:
+                    region_successors[upstream].add(downstream)
+        component = _strongly_connected(len(roots), region_successors)
+        if len(set(component)) == len(roots):
+            break
+        first_root = {}
+        for position, root in enumerate(roots):
+            label = component[position]
+            if label in first_root:
+                _union(parent, first_root[label], root)
+            else:
+                first_root[label] = root
+
+    # 按拓扑顺序将区域连续地分配到各分区，分区之间的边只会从前指向后
+    indegree = [0] * len(roots)
+    for children in region_successors:
+        for child in children:
+            indegree[child] += 1
+    ready = [region for region in range(len(roots)) if indegree[region] == 0]
+    topological = []
+    while ready:
+        region = ready.pop()
+        topological.append(region)
+        for child in sorted(region_successors[region]):
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+
+    sizes = [0] * len(roots)
+    for index in range(count):
+        sizes[region_of[_find(parent, index)]] += 1
+    partitions = max(1, min(partitions, len(roots)))
+    target = count / partitions
+    partition_of_region = {}
+    current, filled = 0, 0
+    for position, region in enumerate(topological):
+        remaining_regions = len(topological) - position
+        if filled >= target and current < partitions - 1:
+            current, filled = current + 1, 0
+        elif partitions - current > remaining_regions and filled > 0:
+            current, filled = current + 1, 0
+        partition_of_region[region] = current
+        filled += sizes[region]
+
+    assignment = [partition_of_region[region_of[_find(parent, index)]] for index in range(count)]
+    cuts = [
+        sim_node.index
+        for sim_node in nodes
+        if cuttable(sim_node)
+        and assignment[sim_node.predecessors[0]] != assignment[sim_node.index]
+    ]
+    return {
+        "assignment": assignment,
+        "partitions": len(set(assignment)),
+        "cuts": [nodes[index].name for index in cuts],
+        "lookahead": min((nodes[index].travel_time for index in cuts), default=None),
+    }
+
+
+def _partition_worker(graph_data, seed, end_time, plan, partition, upstream, downstream, result):
+    """
+    分区进程：按时间窗推进，窗口开始前接收上游的进入消息和下游的离开消息
+
+    参数:
+        upstream: [(连接, 来自该上游分区的被切分传送器下标)]
+        downstream: [(连接, 通往该下游分区的被切分传送器下标)]
+        result: 发送最终统计数据的连接
+    """
+    try:
+        assignment = plan["assignment"]
+        owned = [index for index, owner in enumerate(assignment) if owner == partition]
+        incoming = [index for _, indices in upstream for index in indices]
+        outgoing = [index for _, indices in downstream for index in indices]
+        sim = _PartitionSimulator(graph_data, seed, end_time, owned, outgoing, incoming)
+        destination = {index: position for position, (_, indices) in enumerate(downstream) for index in indices}
+        origin = {index: position for position, (_, indices) in enumerate(upstream) for index in indices}
+
+        end = sim.end_time
+        lookahead = plan["lookahead"]
+        windows = max(1, math.ceil(end / lookahead))
+        window_end = 0.0
+
+        def fetch_exits():
+            for connection, _ in downstream:
+                sim.receive_exits(connection.recv())
+            sim.exits_known_until = window_end
+
+        sim.fetch_exits = fetch_exits
+        for window in range(windows):
+            if window > 0:
+                for connection, _ in upstream:
+                    sim.receive_entries(connection.recv())
+
+            if window == windows - 1:
+                window_end = math.inf
+                sim._advance(end)
+            else:
+                window_end = (window + 1) * lookahead
+                sim._advance(window_end, inclusive=False)
+
+            entries = [[] for _ in downstream]
+            for message in sim.sent:
+                entries[destination[message[0]]].append(message)
+            exits = [[] for _ in upstream]
+            for message in sim.exits:
+                exits[origin[message[0]]].append(message)
+            sim.sent, sim.exits = [], []
+            for (connection, _), messages in zip(downstream, entries):
+                if window < windows - 1:
+                    connection.send(messages)
+            for (connection, _), messages in zip(upstream, exits):
+                connection.send(messages)
+            if window < windows - 1 and sim.exits_known_until < window_end:
+                # 本窗口内不需要下游的离开消息，窗口结束后再接收，在下一窗口开始时释放位置
+                sim.now = max(sim.now, window_end)
+                fetch_exits()
+
+        sim.now = max(sim.now, end)
+        result.send(("ok", sim.owned_statistics()))
+    except Exception as e:
+        result.send(("error", f"分区{partition}仿真失败: {str(e)}"))
+
+
+def simulate_partitioned(graph_data, seed=None, end_time=None, workers=None):
+    """
+    多进程分区仿真
+
+    参数:
+        graph_data: 与simulate_graph相同的图数据
+        seed: 随机数种子（整数或SeedSequence）；为None时在主进程生成后分发给各分区
+        end_time: 仿真结束时间，默认使用源节点的stop_time
+        workers: 进程数（即期望分区数），默认使用全部CPU核心
+
+    返回:
+        dict: 与simulate_graph相同格式的物料终结统计；无法切分或只有一个分区时顺序运行
+    """
+    if seed is None:
+        seed = np.random.SeedSequence()
+    workers = workers or os.cpu_count() or 1
+    plan = partition_graph(graph_data, workers)
+    if plan["partitions"] <= 1 or plan["lookahead"] is None:
+        return ProductionLineSimulator(graph_data, seed=seed, end_time=end_time).run()
+
+    model = ProductionLineSimulator(graph_data)
+    assignment = plan["assignment"]
+    links = {}
+    for name in plan["cuts"]:
+        sim_node = model.nodes[model.node_index[name]]
+        pair = (assignment[sim_node.predecessors[0]], assignment[sim_node.index])
+        links.setdefault(pair, []).append(sim_node.index)
+
+    context = multiprocessing.get_context()
+    upstream = {partition: [] for partition in range(plan["partitions"])}
+    downstream = {partition: [] for partition in range(plan["partitions"])}
+    for (source, target), indices in sorted(links.items()):
+        source_end, target_end = context.Pipe()
+        downstream[source].append((source_end, indices))
+        upstream[target].append((target_end, indices))
+
+    processes, results = [], []
+    for partition in range(plan["partitions"]):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_partition_worker,
+            args=(
+                graph_data, seed, end_time, plan, partition,
+                upstream[partition], downstream[partition], sender,
+            ),
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+        results.append(receiver)
+
+    stats = {}
+    try:
+        pending = list(results)
+        while pending:
+            for connection in wait(pending):
+                status, payload = connection.recv()
+                if status != "ok":
+                    raise RuntimeError(payload)
+                stats.update(payload)
+                pending.remove(connection)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    # 按节点顺序排列，与顺序仿真的输出一致
+    return {
+        sim_node.name: stats[sim_node.name]
+        for sim_node in model.nodes
+        if sim_node.type == DRAIN and sim_node.name in stats
+    }
+
+
+if __name__ == "__main__":
+    from simulation_engine import format_statistics, simulate_graph
+
+    # 三段由传送器连接的生产线
+    sample_graph_data = {"nodes": [], "edges": []}
+    previous = "源"
+    sample_graph_data["nodes"].append(
+        {"name": "源", "type": "源", "data": {"time": {"interval_time": "0:0:2:0"}}}
+    )
+    for segment in range(3):
+        for position in range(20):
+            name = f"工位{segment}_{position}"
+            sample_graph_data["nodes"].append(
+                {
+                    "name": name,
+                    "type": "工位",
+                    "data": {
+                        "time": {
+                            "processing_time": {
+                                "distribution_pattern": "negexp",
+                                "parameters": {"mean": 100},
+                            }
+                        }
+                    },
+                }
+            )
+            sample_graph_data["edges"].append({"from": previous, "to": name})
+            previous = name
+        if segment < 2:
+            name = f"传送器{segment}"
+            sample_graph_data["nodes"].append(
+                {"name": name, "type": "传送器", "data": {"capacity": 5, "length": 60, "speed": 1}}
+            )
+            sample_graph_data["edges"].append({"from": previous, "to": name})
+            previous = name
+    sample_graph_data["nodes"].append({"name": "物料终结", "type": "物料终结", "data": {}})
+    sample_graph_data["edges"].append({"from": previous, "to": "物料终结"})
+
+    start = time.perf_counter()
+    sequential = simulate_graph(sample_graph_data, seed=1, method="event")
+    print(f"顺序仿真耗时: {time.perf_counter() - start:.2f}秒")
+    start = time.perf_counter()
+    partitioned = simulate_partitioned(sample_graph_data, seed=1, workers=3)
+    print(f"分区仿真耗时: {time.perf_counter() - start:.2f}秒")
+    print(format_statistics(partitioned))
+    print("✅ 结果与顺序仿真一致" if partitioned == sequential else "⚠️ 结果与顺序仿真不一致")
@@ -8,8 +8,13 @@ import os
 import pythoncom
 
 
-def create_plant_simulation_model(model_setup_code, data_writing_code):
-    """分两步执行：先建立模型，再写入数据"""
+def create_plant_simulation_model(model_setup_code, data_writing_code, graph_data=None):
+    """
+    分两步执行：先建立模型，再写入数据
+
+    参数:
+        graph_data: 生成代码所用的图数据，给出时把导出的统计数据记入本地结果库
+    """
     try:
         # 初始化COM环境
         pythoncom.CoInitialize()
@@ -57,12 +62,14 @@ def create_plant_simulation_model(model_setup_code, data_writing_code):
         plant_sim.loadModel(MODEL_FILE)
 
         # 第一步：执行模型建立代码
+        start = time.perf_counter()
         print("⏳ 正在建立模型结构...")
         plant_sim.ExecuteSimTalk(model_setup_code)
         time.sleep(3)
         # 第二步：执行数据写入代码
         print("⏳ 正在写入仿真数据...")
         plant_sim.ExecuteSimTalk(data_writing_code)
+        wall_time = time.perf_counter() - start
 
         # 保存模型
         from path_config import SAVED_MODEL_FILE
@@ -80,6 +87,15 @@ def create_plant_simulation_model(model_setup_code, data_writing_code):
                 print(fp.read())
         except Exception as e:
             print(f"⚠ 读取Excel失败：{str(e)}")
+        else:
+            if graph_data is not None:
+                try:
+                    from results_store import record_plant_simulation
+
+                    run_id = record_plant_simulation(DATA_OUTPUT_FILE, graph_data, wall_time)
+                    print(f"🗄️ 统计数据已记入结果库（运行编号 {run_id}）")
+                except Exception as e:
+                    print(f"⚠️ 记入结果库失败：{str(e)}")
 
         # 启动Plant Simulation应用程序
         from path_config import PLANT_SIM_PATHS
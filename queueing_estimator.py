@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+排队网络解析估算：不运行仿真，直接由图数据估算吞吐量、利用率和瓶颈
+
+近似方法（串联/Jackson型网络的两矩近似）：
+- 到达：源的interval_time均值的倒数，变异系数取自分布方差
+- 服务：工位/物料终结的processing_time均值与方差；按故障间隔/持续时间计算可用度，
+  有效加工时间 = 加工时间 / 可用度，故障对变异系数的影响按Hopp & Spearman公式计入
+- 传送器：容量个并行服务台，服务时间为length/speed
+- 有限缓冲：工位前的缓冲区容量加上工位本身及上游阻塞时多占用的一个位置，
+  按两矩修正（等效容量N·2/(ca²+cs²)）构成两机器有限缓冲线
+- 源会被阻塞而不是丢弃零件，流量守恒：按Dallery-David-Xie分解求整条线的产出率，
+  上游缺料和下游阻塞计入各链路的等效速率，损失只计一次，不逐站累乘
+- 分支：按production_status的合格率拆分，否则在后继节点间平均分配；
+  离开过程的变异系数按Whitt的连接/拆分/合并公式传播
+
+耗时：分解的正反迭代是逐节点的顺序递推，无法向量化，也没有闭式解，
+几十个工位的线编译和evaluate各约1毫秒；千节点长串联线编译约5-10毫秒，
+evaluate约30-150毫秒（迭代轮数随线长增加），达不到千节点亚毫秒
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+
+from sampling import time_moments
+from simulation_engine import (
+    BUFFER,
+    CONVEYOR,
+    DRAIN,
+    SECONDS_PER_DAY,
+    SOURCE,
+    STATION,
+    parse_quantity,
+)
+
+# 节点类别（evaluate热循环中用整数比较代替字符串比较）
+_KIND_SOURCE = 0
+_KIND_SERVER = 1  # 工位、物料终结
+_KIND_CONVEYOR = 2
+_KIND_PASS = 3  # 缓冲区
+
+_MAX_DECOMPOSITION_ITERATIONS = 500
+_DECOMPOSITION_TOLERANCE = 1e-2  # 各链路产出率相差不超过1%，远小于近似本身的误差
+_ANDERSON_DEPTH = 5
+
+
+def _failure_effect(failure_data, mean):
+    """返回(可用度, 故障引起的变异系数平方增量)"""
+    if not failure_data:
+        return 1.0, 0.0
+    mtbf, _ = time_moments(failure_data.get("interval_time", 0))
+    mttr, var_r = time_moments(failure_data.get("duration_time", "0:0:0:0"))
+    if mttr <= 0:
+        return 1.0, 0.0
+    if mtbf <= 0:
+        return 0.0, 0.0
+    availability = mtbf / (mtbf + mttr)
+    if mean <= 0:
+        return availability, 0.0
+    cr2 = var_r / mttr**2
+    return availability, (1.0 + cr2) * availability * (1.0 - availability) * mttr / mean
+
+
+class QueueingEstimator:
+    """预编译图结构的解析估算器，evaluate()可在交互循环中反复调用"""
+
+    def __init__(self, graph_data):
+        nodes = graph_data.get("nodes", [])
+        edges = graph_data.get("edges", [])
+        self.names = [node["name"] for node in nodes]
+        self.types = [node["type"] for node in nodes]
+        index = {name: i for i, name in enumerate(self.names)}
+        count = len(nodes)
+
+        successors = [[] for _ in range(count)]
+        predecessors = [[] for _ in range(count)]
+        for edge in edges:
+            successors[index[edge["from"]]].append(index[edge["to"]])
+            predecessors[index[edge["to"]]].append(index[edge["from"]])
+
+        # 拓扑排序（存在环时剩余节点按原顺序追加）
+        indegree = [len(preds) for preds in predecessors]
+        queue = deque(i for i in range(count) if indegree[i] == 0)
+        order = []
+        while queue:
+            current = queue.popleft()
+            order.append(current)
+            for neighbor in successors[current]:
+                indegree[neighbor] -= 1
+                if indegree[neighbor] == 0:
+                    queue.append(neighbor)
+        if len(order) < count:
+            seen = set(order)
+            order.extend(i for i in range(count) if i not in seen)
+        self.order = order
+
+        self.kind = [_KIND_PASS] * count
+        self.source_rate = [0.0] * count
+        self.arrival_scv = [0.0] * count  # 源的到达间隔变异系数平方
+        self.service_rate = [math.inf] * count
+        self.service_scv = [0.0] * count
+        self.availability = [1.0] * count
+        self.storage = [0.0] * count
+        self.splits = [[] for _ in range(count)]
+
+        for i, node in enumerate(nodes):
+            data = node.get("data", {})
+            time_data = data.get("time", {})
+            node_type = node["type"]
+            if node_type == SOURCE:
+                self.kind[i] = _KIND_SOURCE
+                mean, variance = time_moments(time_data.get("interval_time", 0))
+                if mean > 0:
+                    self.source_rate[i] = 1.0 / mean
+                    self.arrival_scv[i] = variance / mean**2
+            elif node_type in (STATION, DRAIN):
+                self.kind[i] = _KIND_SERVER
+                mean, variance = time_moments(time_data.get("processing_time", 0))
+                availability, extra_scv = _failure_effect(data.get("failure"), mean)
+                self.availability[i] = availability
+                if mean > 0:
+                    self.service_rate[i] = availability / mean
+                    self.service_scv[i] = variance / mean**2 + extra_scv
+                elif availability <= 0:
+                    self.service_rate[i] = 0.0
+                self.storage[i] = 1.0
+            elif node_type == BUFFER:
+                capacity = parse_quantity(data.get("capacity"), 1.0)
+                self.storage[i] = capacity if capacity > 0 else math.inf
+            elif node_type == CONVEYOR:
+                self.kind[i] = _KIND_CONVEYOR
+                capacity = parse_quantity(data.get("capacity"))
+                capacity = capacity if capacity and capacity > 0 else math.inf
+                length = parse_quantity(data.get("length"), 0.0)
+                speed = parse_quantity(data.get("speed"), 1.0)
+                travel = length / speed if speed > 0 else 0.0
+                self.storage[i] = capacity
+                if travel > 0:
+                    self.service_rate[i] = capacity / travel
+
+            self.splits[i] = self._split_fractions(node, successors[i], index)
+
+        # 工位/物料终结入口链路的容量：自身 + 前方缓冲区 + 上游阻塞占用的1个位置；
+        # 缓冲区由几台并行工位共用时，并行工位各自的位置也计入（零件进入任一空闲工位）
+        # 传送器在分解中是单独的一台机器，其容量计入传送器自己的入口链路
+        self.room = [math.inf] * count
+        for i in range(count):
+            if self.kind[i] != _KIND_SERVER:
+                continue
+            room = self.storage[i] + 1.0
+            if len(predecessors[i]) == 1:
+                pred = predecessors[i][0]
+                if self.types[pred] == BUFFER:
+                    room += self.storage[pred] + sum(
+                        self.storage[sibling] for sibling in successors[pred] if sibling != i
+                    )
+            self.room[i] = room
+
+        # 缓冲区只传递流量：编译时把经过缓冲区的分支比例合并到上游节点，evaluate只遍历其余节点
+        self.flow_order = [i for i in order if self.kind[i] != _KIND_PASS]
+        self.flow_splits = [self._expand_splits(i) for i in range(count)]
+
+        self._is_drain = [t == DRAIN for t in self.types]
+        self._drain_mask = np.array(self._is_drain, dtype=bool)
+        self._server_mask = np.array(
+            [k in (_KIND_SERVER, _KIND_CONVEYOR) for k in self.kind], dtype=bool
+        )
+        self._service_rate = np.array(self.service_rate, dtype=float)
+
+        self._offered, self._link_scv = self._offered_flow()
+        self._build_decomposition()
+
+    def _expand_splits(self, index, depth=0):
+        expanded = {}
+        for target, fraction in self.splits[index]:
+            if self.kind[target] == _KIND_PASS and depth < len(self.kind):
+                for inner, inner_fraction in self._expand_splits(target, depth + 1):
+                    expanded[inner] = expanded.get(inner, 0.0) + fraction * inner_fraction
+            else:
+                expanded[target] = expanded.get(target, 0.0) + fraction
+        return list(expanded.items())
+
+    @staticmethod
+    def _split_fractions(node, successor_indices, index):
+        data = node.get("data", {})
+        if not successor_indices:
+            return []
+        status = data.get("production_status")
+        if node["type"] == STATION and status:
+            destination = data.get("production_destination", {})
+            weights = {}
+            for position, key in enumerate(("qualified", "unqualified")):
+                if key not in status:
+                    continue
+                target = index.get(destination.get(key))
+                if target is None and position < len(successor_indices):
+                    target = successor_indices[position]
+                if target is not None:
+                    weights[target] = weights.get(target, 0.0) + float(status[key])
+            total = sum(weights.values())
+            if total > 0:
+                return [(target, weight / total) for target, weight in weights.items()]
+        share = 1.0 / len(successor_indices)
+        return [(target, share) for target in successor_indices]
+
+    def evaluate(self):
+        """
+        返回估算结果
+
+        返回:
+            dict:
+                throughput: {物料终结名称: {"rate": 个/秒, "statthroughputperday": 个/天}}
+                utilisation: {节点名称: 利用率}（工位、物料终结、传送器）
+                availability: {节点名称: 可用度}（有故障的节点）
+                offered_utilisation: {节点名称: 按源的名义产出率计算的负荷}
+                offered_throughput: {物料终结名称: 按源的名义产出率、不考虑阻塞的每天吞吐量}
+                bottleneck: 负荷最高的节点名称
+                unstable: 名义负荷>=1，即源的产出率超过生产线能力（源将被阻塞、缓冲区堆满）
+        """
+        offered = self._offered
+        line_rate = self._line_rate()
+        total = sum(self.source_rate)
+        scale = line_rate / total if total > 0 else 0.0
+
+        offered_array = np.array(offered)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            load = np.where(
+                self._service_rate > 0,
+                offered_array / self._service_rate,
+                np.where(offered_array > 0, np.inf, 0.0),
+            )
+        load = np.where(self._server_mask, load, -1.0)
+        utilisation = np.minimum(load * scale, 1.0)
+        names = self.names
+
+        throughput = {
+            names[i]: {
+                "rate": offered[i] * scale,
+                "statthroughputperday": offered[i] * scale * SECONDS_PER_DAY,
+            }
+            for i in np.flatnonzero(self._drain_mask)
+        }
+        server_indices = np.flatnonzero(self._server_mask)
+        server_names = [names[i] for i in server_indices]
+        bottleneck = names[int(np.argmax(load))] if len(server_indices) else None
+        worst = float(load.max()) if len(server_indices) else 0.0
+
+        return {
+            "throughput": throughput,
+            "utilisation": dict(zip(server_names, utilisation[server_indices].tolist())),
+            "availability": {
+                names[i]: self.availability[i]
+                for i in server_indices
+                if self.availability[i] < 1.0
+            },
+            "offered_utilisation": dict(zip(server_names, load[server_indices].tolist())),
+            "offered_throughput": {
+                names[i]: offered[i] * SECONDS_PER_DAY for i in np.flatnonzero(self._drain_mask)
+            },
+            "bottleneck": bottleneck,
+            "unstable": worst >= 1.0,
+        }
+
+    def _offered_flow(self):
+        """
+        按源的名义产出率传播流量和变异系数（不考虑阻塞）
+        返回:
+            (各节点的名义流量, 各节点入口链路的变异系数平方和ca²+cs²)
+        """
+        count = len(self.names)
+        offered = [0.0] * count
+        scv_mass = [0.0] * count  # 到达流量×到达变异系数平方（合并时按流量加权）
+        link_scv = [0.0] * count
+        kind = self.kind
+        service_rate = self.service_rate
+        service_scv = self.service_scv
+
+        for i in self.flow_order:
+            if kind[i] == _KIND_SOURCE:
+                rate = offered[i] = self.source_rate[i]
+                scv_out = self.arrival_scv[i]
+            else:
+                rate = offered[i]
+                scv_in = scv_out = scv_mass[i] / rate if rate > 0 else 1.0
+                link_scv[i] = scv_in + service_scv[i]
+                mu = service_rate[i]
+                if kind[i] == _KIND_SERVER and 0 < mu < math.inf:
+                    rho = rate / mu
+                    utilised = rho * rho if rho < 1.0 else 1.0
+                    scv_out = utilised * service_scv[i] + (1.0 - utilised) * scv_in
+            for target, fraction in self.flow_splits[i]:
+                flow = rate * fraction
+                offered[target] += flow
+                # 拆分后变异系数：p·c² + (1-p)
+                scv_mass[target] += flow * (fraction * scv_out + 1.0 - fraction)
+        return offered, link_scv
+
+    def _build_decomposition(self):
+        """
+        编译分解用的结构：名义流量只取决于图，编译时按流量顺序给参与分解的节点编号，
+        预先算好归一化服务时间、前驱份额、后继比例和入口链路的等效容量，
+        evaluate的迭代只在这些列表上按下标访问
+        """
+        offered, link_scv = self._offered, self._link_scv
+        total = sum(self.source_rate)
+        kind = self.kind
+        nodes = [i for i in self.flow_order if offered[i] > 0]
+        slot = {node: k for k, node in enumerate(nodes)}
+
+        self._stalled = False  # 有流量经过的节点完全停机，整条线产出为0
+        self._inv_rate = []  # 归一化服务时间（倒数形式便于处理无穷大速率）
+        self._positions = []  # 入口链路的等效容量，源没有入口链路记为None
+        for i in nodes:
+            if kind[i] == _KIND_SOURCE:
+                self._inv_rate.append(1.0 / total)
+                self._positions.append(None)
+                continue
+            if self.service_rate[i] <= 0:
+                self._stalled = True
+                self._inv_rate.append(math.inf)
+            else:
+                self._inv_rate.append(offered[i] / total / self.service_rate[i])
+            # 两矩修正 N·2/(ca²+cs²)
+            room = self.room[i] if kind[i] == _KIND_SERVER else self.storage[i] + 1.0
+            variability = link_scv[i]
+            self._positions.append(room * 2.0 / variability if variability > 0 else math.inf)
+
+        self._upstream = [[] for _ in nodes]  # [(前驱编号, 流量份额)]
+        self._downstream = [[] for _ in nodes]  # [(后继编号, 分支比例)]
+        for k, i in enumerate(nodes):
+            for target, fraction in self.flow_splits[i]:
+                if target in slot and fraction > 0:
+                    share = offered[i] * fraction / offered[target]
+                    self._upstream[slot[target]].append((k, share))
+                    self._downstream[k].append((slot[target], fraction))
+        self._links = [k for k, positions in enumerate(self._positions) if positions is not None]
+        self._reverse = [k for k in range(len(nodes) - 1, -1, -1) if self._downstream[k]]
+
+    def _line_rate(self):
+        """
+        有限缓冲生产线的总产出率（个/秒，与源的总名义产出率同一口径）
+
+        按Dallery-David-Xie分解：每个工位/传送器/物料终结与其上游之间的缓冲区
+        视为一条两机器线，上游机器的等效速率计入上游的缺料，下游机器的等效速率
+        计入下游的阻塞，正反交替迭代直到各链路的产出率相差不超过容差。
+        源被阻塞时不丢失零件，流量守恒，因此损失只在整条线上计一次而不是逐站累乘。
+        所有速率按访问比例归一化到源的总流量（节点速率 / 访问比例），
+        分支与合并按流量比例取调和平均。
+        长串联线上正反迭代收敛很慢（每轮误差只缩小约1%），用Anderson加速：
+        以最近几轮的残差做最小二乘外推下一轮的等效服务时间。
+        """
+        total = sum(self.source_rate)
+        if total <= 0 or self._stalled:
+            return 0.0
+        if not self._links:
+            return total
+        count = len(self._inv_rate)
+        floor = np.array(self._inv_rate * 2)  # 等效服务时间不小于自身的服务时间
+        state = floor  # [计入缺料后的上游等效服务时间..., 计入阻塞后的下游等效服务时间...]
+        history = []  # 最近几轮的(迭代结果, 残差)
+        line_rate = 0.0
+        for _ in range(_MAX_DECOMPOSITION_ITERATIONS):
+            inv_up, inv_down, inv_link = self._sweep(
+                state[:count].tolist(), state[count:].tolist()
+            )
+            rates = [1.0 / inv_link[k] for k in self._links]
+            line_rate = min(rates)
+            if max(rates) - line_rate <= _DECOMPOSITION_TOLERANCE * line_rate:
+                break
+            mapped = np.array(inv_up + inv_down)
+            history.append((mapped, mapped - state))
+            del history[: -_ANDERSON_DEPTH - 1]
+            if len(history) < 2:
+                state = mapped
+                continue
+            mapped_steps = np.array([b[0] - a[0] for a, b in zip(history, history[1:])]).T
+            residual_steps = np.array([b[1] - a[1] for a, b in zip(history, history[1:])]).T
+            weights = np.linalg.lstsq(residual_steps, history[-1][1], rcond=None)[0]
+            state = np.maximum(mapped - mapped_steps @ weights, floor)
+            if not np.all(np.isfinite(state)):
+                state = mapped
+                history.clear()
+        return min(line_rate, total)
+
+    def _sweep(self, inv_up, inv_down):
+        """正向更新各入口链路和上游等效服务时间，再反向更新下游等效服务时间"""
+        inv_rate = self._inv_rate
+        positions = self._positions
+        upstream = self._upstream
+        downstream = self._downstream
+        inv_link = [0.0] * len(inv_rate)  # 入口链路产出率的倒数
+        for k in self._links:
+            rate = inv_rate[k]
+            sources = upstream[k]
+            if len(sources) == 1:
+                supply = inv_up[sources[0][0]] * sources[0][1]
+            else:
+                supply = sum(share * inv_up[p] for p, share in sources)
+            inv_link[k] = link = 1.0 / _two_machine_rate(supply, inv_down[k], positions[k])
+            link -= inv_down[k]
+            inv_up[k] = rate + link if link > 0 else rate
+        for k in self._reverse:
+            rate = inv_rate[k]
+            targets = downstream[k]
+            if len(targets) == 1:
+                outgoing = inv_link[targets[0][0]] * targets[0][1]
+            else:
+                outgoing = sum(fraction * inv_link[j] for j, fraction in targets)
+            outgoing -= inv_up[k]
+            inv_down[k] = rate + outgoing if outgoing > 0 else rate
+        return inv_up, inv_down, inv_link
+
+
+def _two_machine_rate(inv_up, inv_down, positions):
+    """
+    两机器有限缓冲线的产出率（M/M/1/N，N为两台机器之间可容纳的零件数）
+    参数:
+        inv_up, inv_down: 上游、下游机器的平均服务时间（0表示无限快）
+        positions: 等效容量N（inf表示无限缓冲）
+    """
+    if inv_up <= 0 and inv_down <= 0:
+        return math.inf
+    if inv_up <= 0:
+        return 1.0 / inv_down
+    if inv_down <= 0:
+        return 1.0 / inv_up
+    if positions == math.inf:
+        return 1.0 / max(inv_up, inv_down)
+    r = inv_down / inv_up  # 上游速率 / 下游速率
+    if abs(r - 1.0) < 1e-9:
+        return positions / (positions + 1.0) / inv_up
+    if r > 1.0:
+        # 上游更快：以下游速率表示，避免r**N溢出
+        s = 1.0 / r
+        return (1.0 - s**positions) / (1.0 - s ** (positions + 1.0)) / inv_down
+    return (1.0 - r**positions) / (1.0 - r ** (positions + 1.0)) / inv_up
+
+
+def estimate_graph(graph_data):
+    """对图数据进行一次解析估算，见QueueingEstimator.evaluate()"""
+    return QueueingEstimator(graph_data).evaluate()
+
+
+def format_estimate(estimate):
+    """格式化估算结果，用于在可视化确认时显示"""
+    lines = ["📈 解析估算（未运行仿真）:"]
+    for name, values in estimate["throughput"].items():
+        lines.append(f"  {name} 每天吞吐量 ≈ {values['statthroughputperday']:.1f}")
+    if estimate["bottleneck"] is not None:
+        load = estimate["offered_utilisation"][estimate["bottleneck"]]
+        lines.append(f"  瓶颈: {estimate['bottleneck']}（负荷 {load:.0%}）")
+    if estimate["unstable"]:
+        lines.append("  ⚠️ 源的产出率超过生产线能力，源将被阻塞、缓冲区会堆满")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from simulation_engine import simulate_graph
+
+    # 回归检查：40个工位、缓冲区容量为1的长串联线，解析估算应与仿真接近
+    station_count = 40
+    nodes = [
+        {
+            "name": "源",
+            "type": "源",
+            "data": {"time": {"interval_time": "0:0:1:0", "stop_time": "10:0:0:0"}},
+        }
+    ]
+    edges = []
+    previous = "源"
+    for k in range(1, station_count + 1):
+        nodes.append({"name": f"缓冲区{k}", "type": "缓冲区", "data": {"capacity": 1}})
+        nodes.append(
+            {
+                "name": f"工位{k}",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 50},
+                        }
+                    },
+                    "failure": {
+                        "failure_name": "failure1",
+                        "interval_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 2000},
+                        },
+                        "duration_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 200},
+                        },
+                    },
+                },
+            }
+        )
+        edges.append({"from": previous, "to": f"缓冲区{k}"})
+        edges.append({"from": f"缓冲区{k}", "to": f"工位{k}"})
+        previous = f"工位{k}"
+    nodes.append({"name": "物料终结", "type": "物料终结", "data": {}})
+    edges.append({"from": previous, "to": "物料终结"})
+    sample_graph_data = {"nodes": nodes, "edges": edges}
+
+    estimate = estimate_graph(sample_graph_data)
+    print(format_estimate(estimate))
+    estimated = estimate["throughput"]["物料终结"]["statthroughputperday"]
+    simulated = simulate_graph(sample_graph_data, seed=1, end_time="10:0:0:0")[
+        "物料终结"
+    ]["statthroughputperday"]
+    ratio = estimated / simulated
+    mark = "✅" if 0.75 <= ratio <= 1.25 else "❌"
+    print(f"{mark} 仿真每天吞吐量 {simulated:.1f}，估算/仿真 = {ratio:.2f}")
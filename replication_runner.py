@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重复实验运行器：在进程池中并行运行多次独立仿真，汇总物料终结统计量的置信区间
+
+方差缩减：
+- 公共随机数（CRN）：比较两个场景时使用相同的重复种子，同一节点、同一用途的
+  随机数流在两个场景中相同，差值的方差远小于两次独立运行方差之和
+- 对偶重复：每对仿真分别使用逆变换法的u和1-u，以每对的平均值作为一个独立观测
+"""
+
+import copy
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from sampling import RandomStreams
+from simulation_engine import simulate_graph
+from stats_utils import confidence_interval
+
+KPI_NAMES = (
+    "statavglifespan",
+    "statavgexitinterval",
+    "statdeleted",
+    "statthroughputperday",
+)
+
+KPI_LABELS = {
+    "statavglifespan": "平均寿命",
+    "statavgexitinterval": "平均退出间隔",
+    "statdeleted": "总吞吐量",
+    "statthroughputperday": "每天吞吐量",
+}
+
+# 工作进程中的图数据（通过initializer只传输一次）
+_worker_graph = None
+_worker_end_time = None
+
+
+def _init_worker(graph_data, end_time):
+    global _worker_graph, _worker_end_time
+    _worker_graph = graph_data
+    _worker_end_time = end_time
+
+
+def _run_replication(seed_sequence):
+    return simulate_graph(_worker_graph, seed=seed_sequence, end_time=_worker_end_time)
+
+
+def replication_seeds(seed, replications, antithetic=False):
+    """
+    由主种子派生每次重复实验的随机数种子
+
+    参数:
+        antithetic: 为True时按对生成（重复次数向上取偶数），
+                    每对共用一个SeedSequence，分别使用u和1-u
+
+    返回:
+        list: SeedSequence（非对偶）或RandomStreams（对偶）的列表
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        root = seed
+    else:
+        root = np.random.SeedSequence(seed)
+    if not antithetic:
+        return root.spawn(replications)
+    pairs = root.spawn((replications + 1) // 2)
+    return [RandomStreams(child, antithetic=flag) for child in pairs for flag in (False, True)]
+
+
+def _observations(results, node_name, kpi, antithetic):
+    """取出某个统计量的独立观测值，对偶重复时为每对的平均值"""
+    values = np.array([result[node_name][kpi] for result in results], dtype=float)
+    if antithetic:
+        values = values.reshape(-1, 2).mean(axis=1)
+    return values
+
+
+def _variance(values):
+    return float(np.var(values, ddof=1)) if len(values) > 1 else 0.0
+
+
+def _reduction(reduced_variance, reference_variance):
+    """方差缩减比例及等效重复次数倍数（参考方差为0时视为没有缩减）"""
+    if reference_variance <= 0:
+        return {"reduction": 0.0, "factor": 1.0}
+    return {
+        "reduction": 1.0 - reduced_variance / reference_variance,
+        "factor": reference_variance / reduced_variance if reduced_variance > 0 else math.inf,
+    }
+
+
+def summarize_replications(results, confidence=0.95, antithetic=False):
+    """
+    汇总多次仿真结果
+
+    参数:
+        results: simulate_graph返回结果的列表
+        confidence: 置信水平
+        antithetic: results是否按对偶对排列（相邻两次为一对）
+
+    返回:
+        dict: {物料终结名称: {统计量名称: confidence_interval结果}}
+    """
+    summary = {}
+    if not results:
+        return summary
+    for node_name in results[0]:
+        summary[node_name] = {
+            kpi: confidence_interval(
+                _observations(results, node_name, kpi, antithetic), confidence
+            )
+            for kpi in KPI_NAMES
+        }
+    return summary
+
+
+def antithetic_variance_reduction(results):
+    """
+    对偶重复的方差缩减：每对平均值的方差与两次独立运行平均值的方差（单次方差/2）之比
+
+    返回:
+        dict: {物料终结名称: {统计量名称: {"reduction": 缩减比例, "factor": 等效倍数}}}
+    """
+    reduction = {}
+    if not results:
+        return reduction
+    for node_name in results[0]:
+        reduction[node_name] = {}
+        for kpi in KPI_NAMES:
+            single = _observations(results, node_name, kpi, False)
+            pairs = _observations(results, node_name, kpi, True)
+            reduction[node_name][kpi] = _reduction(_variance(pairs), _variance(single) / 2.0)
+    return reduction
+
+
+def run_replications(
+    graph_data,
+    replications=10,
+    seed=None,
+    max_workers=None,
+    end_time=None,
+    confidence=0.95,
+    antithetic=False,
+    store=None,
+):
+    """
+    并行运行多次独立仿真并计算置信区间
+
+    参数:
+        graph_data: 与json_to_simtalk相同的图数据
+        replications: 重复次数（对偶重复时向上取偶数）
+        seed: 主随机数种子，每次重复使用由其派生的独立随机数流；
+              不同场景使用相同的种子即为公共随机数
+        max_workers: 进程数，默认使用全部CPU核心；为1时在当前进程内顺序运行
+        end_time: 仿真结束时间，默认使用源节点的stop_time
+        confidence: 置信水平
+        antithetic: 是否使用对偶重复
+        store: 结果库（ResultsStore或目录），给出时把每次仿真的结果记入结果库
+
+    返回:
+        dict: summary（汇总结果）、results（每次仿真结果）、replications、wall_time；
+              对偶重复时另有variance_reduction（见antithetic_variance_reduction）
+    """
+    seeds = replication_seeds(seed, replications, antithetic)
+    replications = len(seeds)
+    workers = max_workers or os.cpu_count() or 1
+    workers = min(workers, replications)
+    start = time.perf_counter()
+
+    if workers <= 1:
+        results = [simulate_graph(graph_data, seed=child, end_time=end_time) for child in seeds]
+    else:
+        chunksize = max(1, replications // (workers * 4))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(graph_data, end_time),
+        ) as executor:
+            results = list(executor.map(_run_replication, seeds, chunksize=chunksize))
+
+    report = {
+        "summary": summarize_replications(results, confidence, antithetic),
+        "results": results,
+        "replications": replications,
+        "confidence": confidence,
+        "antithetic": antithetic,
+        "wall_time": time.perf_counter() - start,
+    }
+    if antithetic:
+        report["variance_reduction"] = antithetic_variance_reduction(results)
+    if store is not None:
+        # 延迟导入：results_store依赖本模块
+        from results_store import SOURCE_REPLICATIONS, _as_store
+
+        report["run_id"] = _as_store(store).record(
+            SOURCE_REPLICATIONS, graph_data, results, seeds=seeds, wall_time=report["wall_time"],
+            parameters={"end_time": end_time, "antithetic": antithetic},
+        )
+    return report
+
+
+def compare_scenarios(
+    baseline_graph,
+    variant_graph,
+    replications=10,
+    seed=None,
+    common_random_numbers=True,
+    antithetic=False,
+    max_workers=None,
+    end_time=None,
+    confidence=0.95,
+):
+    """
+    比较两个场景（如缓冲区容量8与12）的物料终结统计量
+
+    参数:
+        common_random_numbers: 为True时两个场景使用相同的重复种子（公共随机数），
+                               否则使用相互独立的种子
+        antithetic: 是否使用对偶重复（可与公共随机数同时使用）
+        其余参数同run_replications
+
+    返回:
+        dict: baseline、variant（各自的run_replications结果）、
+              difference（{物料终结名称: {统计量名称: 差值(变体-基准)的置信区间}}）、
+              variance_reduction（差值方差相对两场景独立运行时方差之和的缩减，
+              仅公共随机数时计算）
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy  # 两个场景必须共享同一个主种子
+    if common_random_numbers:
+        baseline_seed = variant_seed = seed
+    else:
+        baseline_seed, variant_seed = np.random.SeedSequence(seed).spawn(2)
+
+    options = dict(
+        replications=replications,
+        max_workers=max_workers,
+        end_time=end_time,
+        confidence=confidence,
+        antithetic=antithetic,
+    )
+    baseline = run_replications(baseline_graph, seed=baseline_seed, **options)
+    variant = run_replications(variant_graph, seed=variant_seed, **options)
+
+    difference = {}
+    variance_reduction = {}
+    for node_name in baseline["summary"]:
+        if node_name not in variant["summary"]:
+            continue
+        difference[node_name] = {}
+        variance_reduction[node_name] = {}
+        for kpi in KPI_NAMES:
+            base_values = _observations(baseline["results"], node_name, kpi, antithetic)
+            variant_values = _observations(variant["results"], node_name, kpi, antithetic)
+            deltas = variant_values - base_values
+            difference[node_name][kpi] = confidence_interval(deltas, confidence)
+            if common_random_numbers:
+                variance_reduction[node_name][kpi] = _reduction(
+                    _variance(deltas), _variance(base_values) + _variance(variant_values)
+                )
+
+    return {
+        "baseline": baseline,
+        "variant": variant,
+        "difference": difference,
+        "variance_reduction": variance_reduction if common_random_numbers else {},
+        "common_random_numbers": common_random_numbers,
+        "antithetic": antithetic,
+        "confidence": confidence,
+    }
+
+
+def _precision(results, targets, confidence):
+    """按目标计算当前达到的相对精度（置信区间半宽 / |均值|）"""
+    precision = {}
+    for node_name, kpis in targets.items():
+        precision[node_name] = {}
+        for kpi, target in kpis.items():
+            interval = confidence_interval(
+                [result[node_name][kpi] for result in results], confidence
+            )
+            if interval["half_width"] == 0:
+                achieved = 0.0
+            elif interval["mean"] == 0:
+                achieved = math.inf
+            else:
+                achieved = interval["half_width"] / abs(interval["mean"])
+            precision[node_name][kpi] = {
+                "target": target,
+                "achieved": achieved,
+                "met": achieved <= target,
+            }
+    return precision
+
+
+def _precision_met(precision):
+    return all(item["met"] for kpis in precision.values() for item in kpis.values())
+
+
+def run_until_precision(
+    graph_data,
+    targets,
+    seed=None,
+    confidence=0.95,
+    min_replications=5,
+    max_replications=500,
+    max_workers=None,
+    end_time=None,
+):
+    """
+    序贯停止规则：按批并行派发重复实验，直到所有目标统计量的相对精度达到要求
+
+    参数:
+        graph_data: 与json_to_simtalk相同的图数据
+        targets: {物料终结名称: {统计量名称: 相对精度}}，
+                 如{"合格库存": {"statthroughputperday": 0.01}}表示每天吞吐量±1%
+        seed: 主随机数种子（第k次重复的种子与run_replications相同）
+        confidence: 置信水平
+        min_replications: 最少重复次数（样本太少时方差估计不可靠）
+        max_replications: 最多重复次数，达到后即使未满足精度也停止
+        max_workers: 进程数，默认使用全部CPU核心；为1时在当前进程内顺序运行
+        end_time: 仿真结束时间，默认使用源节点的stop_time
+
+    返回:
+        dict: run_replications的结果，另含precision（每个目标的target、achieved、met）
+              和converged（是否全部达到精度）
+    """
+    for node_name, kpis in targets.items():
+        for kpi in kpis:
+            if kpi not in KPI_NAMES:
+                raise ValueError(f"未知的统计量: {kpi}")
+
+    if isinstance(seed, np.random.SeedSequence):
+        root = seed
+    else:
+        root = np.random.SeedSequence(seed)
+    workers = max_workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    results = []
+    precision = {}
+
+    def finished():
+        nonlocal precision
+        if len(results) < min_replications:
+            return len(results) >= max_replications
+        missing = [name for name in targets if name not in results[0]]
+        if missing:
+            raise ValueError(f"图中不存在物料终结: {', '.join(missing)}")
+        precision = _precision(results, targets, confidence)
+        return _precision_met(precision) or len(results) >= max_replications
+
+    if workers <= 1:
+        while not finished():
+            results.append(simulate_graph(graph_data, seed=root.spawn(1)[0], end_time=end_time))
+    else:
+        # 保持两批（每批workers个）在运行中；只按重复序号连续的前缀判断是否停止，
+        # 使停止时使用的重复与完成顺序无关
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(graph_data, end_time),
+        )
+        in_flight = {}
+        completed = {}
+        submitted = 0
+        try:
+            stop = finished()
+            while not stop:
+                while len(in_flight) < 2 * workers and submitted < max_replications:
+                    future = executor.submit(_run_replication, root.spawn(1)[0])
+                    in_flight[future] = submitted
+                    submitted += 1
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    completed[in_flight.pop(future)] = future.result()
+                while not stop and len(results) in completed:
+                    results.append(completed.pop(len(results)))
+                    stop = finished()
+        finally:
+            # 取消尚未开始的重复实验，不等待正在运行的进程
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return {
+        "summary": summarize_replications(results, confidence),
+        "results": results,
+        "replications": len(results),
+        "confidence": confidence,
+        "antithetic": False,
+        "wall_time": time.perf_counter() - start,
+        "precision": precision,
+        "converged": bool(precision) and _precision_met(precision),
+    }
+
+
+def format_precision_report(report):
+    """格式化序贯停止规则的结果（使用的重复次数、耗时及各目标达到的精度）"""
+    confidence = int(round(report["confidence"] * 100))
+    status = "已达到目标精度" if report["converged"] else "⚠️ 达到最大重复次数仍未满足精度"
+    lines = [
+        f"{status}：使用重复次数 {report['replications']}，耗时 {report['wall_time']:.2f}秒"
+    ]
+    for node_name, kpis in report["precision"].items():
+        lines.append(node_name)
+        for kpi, item in kpis.items():
+            interval = report["summary"][node_name][kpi]
+            lines.append(
+                f"  {KPI_LABELS[kpi]}: {interval['mean']:.2f} ± {interval['half_width']:.2f}"
+                f"（{confidence}%置信水平，相对精度 ±{item['achieved'] * 100:.2f}%，"
+                f"目标 ±{item['target'] * 100:.2f}%{'，✅' if item['met'] else '，❌'}）"
+            )
+    return "\n".join(lines)
+
+
+def _format_reduction(reduction):
+    factor = reduction["factor"]
+    factor_text = "∞" if math.isinf(factor) else f"{factor:.1f}"
+    return f"方差缩减 {reduction['reduction'] * 100:.1f}%，等效重复次数 ×{factor_text}"
+
+
+def format_replication_summary(report):
+    """格式化重复实验汇总结果"""
+    confidence = int(round(report["confidence"] * 100))
+    header = f"重复次数: {report['replications']}，耗时: {report['wall_time']:.2f}秒"
+    if report.get("antithetic"):
+        header += "（对偶重复）"
+    lines = [header]
+    reductions = report.get("variance_reduction", {})
+    for node_name, kpis in report["summary"].items():
+        lines.append(node_name)
+        for kpi, interval in kpis.items():
+            line = (
+                f"  {KPI_LABELS[kpi]}: {interval['mean']:.2f} ± {interval['half_width']:.2f}"
+                f" (标准差 {interval['stddev']:.2f}，{confidence}%置信区间"
+                f" [{interval['ci_low']:.2f}, {interval['ci_high']:.2f}])"
+            )
+            if node_name in reductions:
+                line += f"，{_format_reduction(reductions[node_name][kpi])}"
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def format_comparison(comparison):
+    """格式化场景比较结果（变体减基准的差值及方差缩减）"""
+    confidence = int(round(comparison["confidence"] * 100))
+    modes = []
+    if comparison["common_random_numbers"]:
+        modes.append("公共随机数")
+    if comparison["antithetic"]:
+        modes.append("对偶重复")
+    lines = [
+        f"场景比较（{'+'.join(modes) or '独立重复'}，"
+        f"每个场景重复 {comparison['baseline']['replications']} 次）"
+    ]
+    for node_name, kpis in comparison["difference"].items():
+        lines.append(node_name)
+        for kpi, interval in kpis.items():
+            significant = interval["ci_low"] > 0 or interval["ci_high"] < 0
+            line = (
+                f"  {KPI_LABELS[kpi]}差值: {interval['mean']:.2f} ± {interval['half_width']:.2f}"
+                f" ({confidence}%置信区间 [{interval['ci_low']:.2f}, {interval['ci_high']:.2f}]"
+                f"{'，差异显著' if significant else ''})"
+            )
+            reduction = comparison["variance_reduction"].get(node_name, {}).get(kpi)
+            if reduction is not None:
+                line += f"，{_format_reduction(reduction)}"
+            lines.append(line)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    sample_graph_data = {
+        "nodes": [
+            {
+                "name": "源",
+                "type": "源",
+                "data": {"time": {"interval_time": "0:0:10:0", "stop_time": "1:0:0:0"}},
+            },
+            {"name": "缓冲区", "type": "缓冲区", "data": {"capacity": 8}},
+            {
+                "name": "测试工位",
+                "type": "工位",
+                "data": {
+                    "time": {"processing_time": "0:0:8:0"},
+                    "failure": {
+                        "interval_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 2000},
+                        },
+                        "duration_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 200},
+                        },
+                    },
+                },
+            },
+            {"name": "合格库存", "type": "物料终结", "data": {}},
+        ],
+        "edges": [
+            {"from": "源", "to": "缓冲区"},
+            {"from": "缓冲区", "to": "测试工位"},
+            {"from": "测试工位", "to": "合格库存"},
+        ],
+    }
+    print(format_replication_summary(run_replications(sample_graph_data, 40, seed=1)))
+    print(format_replication_summary(run_replications(sample_graph_data, 40, seed=1, antithetic=True)))
+
+    print(
+        format_precision_report(
+            run_until_precision(
+                sample_graph_data, {"合格库存": {"statthroughputperday": 0.001}}, seed=1
+            )
+        )
+    )
+
+    # 缓冲区容量8与2的比较：公共随机数与独立重复
+    variant_graph_data = copy.deepcopy(sample_graph_data)
+    variant_graph_data["nodes"][1]["data"]["capacity"] = 2
+    for common in (True, False):
+        print(
+            format_comparison(
+                compare_scenarios(
+                    sample_graph_data, variant_graph_data, 20, seed=1, common_random_numbers=common
+                )
+            )
+        )
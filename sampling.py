@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+随机抽样模块：将图数据中的时间值编译为基于NumPy的分块抽样器
+
+支持format_time_value能处理的全部分布（negexp、normal、uniform、lognorm、geom、
+erlang）以及背景文档中列出的binomial、poisson、gamma，常量时间字符串
+（"天:小时:分钟:秒"）编译为常量抽样器。分布参数与Plant Simulation一致，单位为秒。
+
+每个(节点, 用途)拥有独立且可复现的随机数流，抽样值按块预先生成，
+避免仿真事件循环中逐次调用随机数生成器的开销。相同种子下各场景的同一节点、
+同一用途使用相同的流，即公共随机数（CRN）。
+
+对偶（antithetic）抽样时改用逆变换法：一对仿真分别使用均匀随机数u和1-u，
+使两次运行的抽样值负相关。
+"""
+
+import hashlib
+import math
+
+import numpy as np
+
+from time_utils import parse_time_to_seconds
+
+DEFAULT_BLOCK_SIZE = 1024
+
+# 随机数流的用途
+PURPOSE_INTERVAL = "interval"
+PURPOSE_PROCESSING = "processing"
+PURPOSE_FAILURE_INTERVAL = "failure_interval"
+PURPOSE_FAILURE_DURATION = "failure_duration"
+PURPOSE_ROUTING = "routing"
+
+
+def _stream_key(node_name, purpose):
+    """由节点名称和用途生成稳定的整数键（不依赖Python的hash随机化）"""
+    digest = hashlib.sha256(f"{node_name}\x00{purpose}".encode("utf-8")).digest()
+    return tuple(int.from_bytes(digest[i:i + 4], "little") for i in range(0, 16, 4))
+
+
+class RandomStreams:
+    """按(节点, 用途)派生独立随机数流的工厂，相同种子得到相同的流"""
+
+    def __init__(self, seed=None, antithetic=None):
+        """
+        参数:
+            seed: 整数种子、numpy.random.SeedSequence或None（使用系统熵）
+            antithetic: None使用NumPy的直接抽样方法；False/True使用逆变换法，
+                        True时以1-u代替u（对偶的一方）
+        """
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+        self.antithetic = antithetic
+
+    def generator(self, node_name, purpose):
+        """返回指定节点及用途的numpy.random.Generator"""
+        root = self.seed_sequence
+        sequence = np.random.SeedSequence(
+            root.entropy, spawn_key=tuple(root.spawn_key) + _stream_key(node_name, purpose)
+        )
+        return np.random.Generator(np.random.PCG64(sequence))
+
+
+class BlockSampler:
+    """分块抽样器：每次生成block_size个样本，按需逐个取出"""
+
+    __slots__ = ("_draw_block", "_block", "_position", "block_size", "drawn")
+
+    def __init__(self, draw_block, block_size=DEFAULT_BLOCK_SIZE):
+        self._draw_block = draw_block
+        self._block = []
+        self._position = 0
+        self.block_size = block_size
+        self.drawn = 0  # 已取出的样本数
+
+    def __call__(self):
+        if self._position >= len(self._block):
+            # tolist()使事件循环中取到的是Python浮点数，避免numpy标量开销
+            self._block = self._draw_block(self.block_size).tolist()
+            self._position = 0
+        value = self._block[self._position]
+        self._position += 1
+        self.drawn += 1
+        return value
+
+    def take(self, count):
+        """按顺序取出count个样本，返回numpy数组（与逐个调用得到的序列相同）"""
+        values = np.empty(count, dtype=float)
+        filled = min(count, len(self._block) - self._position)
+        if filled > 0:
+            values[:filled] = self._block[self._position:self._position + filled]
+            self._position += filled
+        while filled < count:
+            self._block = self._draw_block(self.block_size).tolist()
+            chunk = min(count - filled, self.block_size)
+            values[filled:filled + chunk] = self._block[:chunk]
+            self._position = chunk
+            filled += chunk
+        self.drawn += count
+        return values
+
+
+class ConstantSampler:
+    """常量抽样器：时间字符串或数值对应的固定时间"""
+
+    __slots__ = ("value", "drawn")
+
+    def __init__(self, value):
+        self.value = float(value)
+        self.drawn = 0
+
+    def __call__(self):
+        self.drawn += 1
+        return self.value
+
+    def take(self, count):
+        self.drawn += count
+        return np.full(count, self.value)
+
+
+def _distribution_params(time_data):
+    """返回按名称取分布参数的函数，缺少名称时按format_time_value的顺序取值"""
+    params = time_data.get("parameters", {})
+    values = list(params.values())
+
+    def param(name, position):
+        if name in params:
+            return float(params[name])
+        if position < len(values):
+            return float(values[position])
+        raise ValueError(
+            f"分布 {time_data['distribution_pattern']} 缺少参数 {name}"
+        )
+
+    return param
+
+
+def _block_function(time_data, generator):
+    """根据分布类型构造“生成n个样本”的函数"""
+    dist_type = time_data["distribution_pattern"]
+    param = _distribution_params(time_data)
+
+    if dist_type == "negexp":
+        mean = param("mean", 0)
+        return lambda n: generator.exponential(mean, n)
+    if dist_type == "normal":
+        mean, sigma = param("mean", 0), param("sigma", 1)
+        # 时间不能为负，按0截断
+        return lambda n: np.maximum(generator.normal(mean, sigma, n), 0.0)
+    if dist_type == "uniform":
+        lower, upper = param("lower_bound", 0), param("upper_bound", 1)
+        return lambda n: generator.uniform(lower, upper, n)
+    if dist_type == "lognorm":
+        # Plant Simulation的lognorm参数为分布本身的均值和标准差
+        mean, sigma = param("mean", 0), param("sigma", 1)
+        if mean <= 0:
+            raise ValueError("lognorm分布的均值必须大于0")
+        s2 = math.log(1.0 + (sigma / mean) ** 2)
+        mu = math.log(mean) - s2 / 2.0
+        s = math.sqrt(s2)
+        return lambda n: generator.lognormal(mu, s, n)
+    if dist_type == "erlang":
+        mean, order = param("mean", 0), max(1, int(param("order", 1)))
+        return lambda n: generator.gamma(order, mean / order, n)
+    if dist_type == "gamma":
+        shape, rate = param("shape", 0), param("rate", 1)
+        return lambda n: generator.gamma(shape, 1.0 / rate, n)
+    if dist_type == "geom":
+        p = param("success_probability", 0)
+        return lambda n: generator.geometric(p, n).astype(float)
+    if dist_type == "binomial":
+        trials, p = int(param("trials", 0)), param("success_probability", 1)
+        return lambda n: generator.binomial(trials, p, n).astype(float)
+    if dist_type == "poisson":
+        mean = param("mean", 0)
+        return lambda n: generator.poisson(mean, n).astype(float)
+    raise ValueError(f"不支持的分布类型: {dist_type}")
+
+
+# Acklam正态分位数近似的系数（相对误差<1.2e-9）
+_PPF_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+          1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_PPF_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+          6.680131188771972e+01, -1.328068155288572e+01)
+_PPF_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+          -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_PPF_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+          3.754408661907416e+00)
+_PPF_LOW = 0.02425
+
+
+def _polynomial(coefficients, x):
+    result = np.zeros_like(x)
+    for coefficient in coefficients:
+        result = result * x + coefficient
+    return result
+
+
+def normal_ppf(u):
+    """标准正态分布的分位数（向量化，不依赖SciPy）"""
+    u = np.clip(np.asarray(u, dtype=float), 1e-300, 1.0 - 1e-16)
+    result = np.empty_like(u)
+    central = np.abs(u - 0.5) <= 0.5 - _PPF_LOW
+    q = u[central] - 0.5
+    r = q * q
+    result[central] = q * _polynomial(_PPF_A, r) / (_polynomial(_PPF_B, r) * r + 1.0)
+    tail = ~central
+    # 两侧尾部对称：下尾用u，上尾用1-u并取负
+    tail_u = np.minimum(u[tail], 1.0 - u[tail])
+    q = np.sqrt(-2.0 * np.log(tail_u))
+    value = _polynomial(_PPF_C, q) / (_polynomial(_PPF_D, q) * q + 1.0)
+    result[tail] = np.where(u[tail] < 0.5, value, -value)
+    return result
+
+
+def _discrete_ppf(pmf):
+    """由概率质量函数表构造逆变换函数（0, 1, 2, ...）"""
+    cdf = np.cumsum(pmf)
+    cdf[-1] = 1.0
+    return lambda u: np.searchsorted(cdf, u, side="right").astype(float)
+
+
+def _inverse_block_function(time_data, generator, antithetic):
+    """逆变换法的“生成n个样本”函数，antithetic为True时使用1-u"""
+    dist_type = time_data["distribution_pattern"]
+    param = _distribution_params(time_data)
+
+    def uniforms(*shape):
+        u = generator.random(shape)
+        return 1.0 - u if antithetic else u
+
+    if dist_type == "negexp":
+        mean = param("mean", 0)
+        return lambda n: -mean * np.log1p(-uniforms(n))
+    if dist_type == "normal":
+        mean, sigma = param("mean", 0), param("sigma", 1)
+        return lambda n: np.maximum(mean + sigma * normal_ppf(uniforms(n)), 0.0)
+    if dist_type == "uniform":
+        lower, upper = param("lower_bound", 0), param("upper_bound", 1)
+        return lambda n: lower + (upper - lower) * uniforms(n)
+    if dist_type == "lognorm":
+        mean, sigma = param("mean", 0), param("sigma", 1)
+        if mean <= 0:
+            raise ValueError("lognorm分布的均值必须大于0")
+        s2 = math.log(1.0 + (sigma / mean) ** 2)
+        mu = math.log(mean) - s2 / 2.0
+        s = math.sqrt(s2)
+        return lambda n: np.exp(mu + s * normal_ppf(uniforms(n)))
+    if dist_type == "erlang":
+        # k阶Erlang为k个指数分布之和，对每个分量分别取对偶
+        mean, order = param("mean", 0), max(1, int(param("order", 1)))
+        return lambda n: -(mean / order) * np.log1p(-uniforms(n, order)).sum(axis=1)
+    if dist_type == "gamma":
+        # Wilson-Hilferty近似：(X·rate/shape)^(1/3)近似服从正态分布
+        shape, rate = param("shape", 0), param("rate", 1)
+        scale = 1.0 / (9.0 * shape)
+        return lambda n: shape / rate * np.maximum(
+            1.0 - scale + normal_ppf(uniforms(n)) * math.sqrt(scale), 0.0
+        ) ** 3
+    if dist_type == "geom":
+        p = param("success_probability", 0)
+        if p >= 1:
+            return lambda n: np.ones(n)
+        return lambda n: np.maximum(np.ceil(np.log1p(-uniforms(n)) / math.log1p(-p)), 1.0)
+    if dist_type == "binomial":
+        trials, p = int(param("trials", 0)), param("success_probability", 1)
+        k = np.arange(trials + 1)
+        log_pmf = (
+            np.array([math.lgamma(trials + 1) - math.lgamma(i + 1) - math.lgamma(trials - i + 1)
+                      for i in k])
+            + k * math.log(max(p, 1e-300)) + (trials - k) * math.log(max(1.0 - p, 1e-300))
+        )
+        ppf = _discrete_ppf(np.exp(log_pmf))
+        return lambda n: ppf(uniforms(n))
+    if dist_type == "poisson":
+        mean = param("mean", 0)
+        k = np.arange(int(mean + 12.0 * math.sqrt(mean) + 20.0))
+        log_pmf = k * math.log(max(mean, 1e-300)) - mean - np.array([math.lgamma(i + 1) for i in k])
+        ppf = _discrete_ppf(np.exp(log_pmf))
+        return lambda n: ppf(uniforms(n))
+    raise ValueError(f"不支持的分布类型: {dist_type}")
+
+
+def is_distribution(time_data):
+    """判断时间值是否为分布对象"""
+    return isinstance(time_data, dict) and "distribution_pattern" in time_data
+
+
+def compile_sampler(time_data, generator, block_size=DEFAULT_BLOCK_SIZE, antithetic=None):
+    """
+    将时间值编译为抽样器
+
+    参数:
+        time_data: 时间字符串、数值（秒）或分布对象
+        generator: numpy.random.Generator（通常来自RandomStreams.generator）
+        block_size: 每块预生成的样本数
+        antithetic: 含义同RandomStreams的antithetic参数
+
+    返回:
+        BlockSampler或ConstantSampler，调用返回一个样本（秒），take(n)返回n个样本
+    """
+    if is_distribution(time_data):
+        if antithetic is None:
+            return BlockSampler(_block_function(time_data, generator), block_size)
+        return BlockSampler(_inverse_block_function(time_data, generator, antithetic), block_size)
+    return ConstantSampler(parse_time_to_seconds(time_data))
+
+
+def uniform_sampler(generator, block_size=DEFAULT_BLOCK_SIZE, antithetic=None):
+    """[0, 1)均匀分布抽样器（用于合格/不合格路由），antithetic为True时返回1-u"""
+    if antithetic:
+        return BlockSampler(lambda n: 1.0 - generator.random(n), block_size)
+    return BlockSampler(generator.random, block_size)
+
+
+def time_moments(time_data):
+    """
+    返回时间值的均值和方差（秒、秒²），用于解析估算
+    normal分布忽略0处截断的影响
+    """
+    if not is_distribution(time_data):
+        return parse_time_to_seconds(time_data), 0.0
+
+    dist_type = time_data["distribution_pattern"]
+    param = _distribution_params(time_data)
+    if dist_type == "negexp":
+        mean = param("mean", 0)
+        return mean, mean**2
+    if dist_type in ("normal", "lognorm"):
+        return param("mean", 0), param("sigma", 1) ** 2
+    if dist_type == "uniform":
+        lower, upper = param("lower_bound", 0), param("upper_bound", 1)
+        return (lower + upper) / 2.0, (upper - lower) ** 2 / 12.0
+    if dist_type == "erlang":
+        mean, order = param("mean", 0), max(1, int(param("order", 1)))
+        return mean, mean**2 / order
+    if dist_type == "gamma":
+        shape, rate = param("shape", 0), param("rate", 1)
+        return shape / rate, shape / rate**2
+    if dist_type == "geom":
+        p = param("success_probability", 0)
+        return 1.0 / p, (1.0 - p) / p**2
+    if dist_type == "binomial":
+        trials, p = int(param("trials", 0)), param("success_probability", 1)
+        return trials * p, trials * p * (1.0 - p)
+    if dist_type == "poisson":
+        mean = param("mean", 0)
+        return mean, mean
+    raise ValueError(f"不支持的分布类型: {dist_type}")
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+串联生产线的离开时间递推求值器
+
+对于 源 → 缓冲区/工位/传送器 → … → 物料终结 的无分支生产线，不逐个处理事件，
+而是按“加工后阻塞”（blocking after service）递推公式直接计算每个零件i在每个
+节点j的离开时间D_j(i)：
+
+- 源：c_i = max(c_{i-1} + a_{i-1}, D_0(i-1))，D_0(i) = max(c_i, B_0(i))
+- 工位/物料终结（容量1，加工时间w）：
+  D_j(i) = max(max(D_{j-1}(i), D_j(i-1)) + w_j(i), B_j(i))
+- 缓冲区/传送器（容量c，停留时间τ，先进先出）：
+  D_j(i) = max(D_{j-1}(i) + τ_j, D_j(i-1), B_j(i))
+- 阻塞约束：B_j(i) = D_{j+1}(i - c_{j+1})，即下游第i-c个零件离开后才有空位
+- 故障：预先生成停机时间轴，加工按“有效工作时间”推进，故障期间不能放行
+
+求解分两步：
+1. 按零件向量化的正反交替扫描：每个节点的递推通过累计和变换为
+   numpy.maximum.accumulate，阻塞较少时几次扫描即收敛
+2. 阻塞严重、扫描未收敛时，按2i + j的波前逐层求解（每层内各单元互不依赖，
+   一次向量化计算整层），结果精确且与零件数、节点数呈线性关系
+
+两种方法与ProductionLineSimulator使用相同的随机数流，相同种子下结果一致
+（同一时刻多个事件的先后顺序及浮点舍入除外）。
+"""
+
+import numpy as np
+
+from simulation_engine import (
+    BUFFER,
+    CONVEYOR,
+    DRAIN,
+    SECONDS_PER_DAY,
+    SOURCE,
+    STATION,
+    ProductionLineSimulator,
+)
+
+# 按零件向量化扫描的最大次数，超过后改用波前求解
+DEFAULT_MAX_SWEEPS = 8
+
+# 节点数少于该值时波前求解不比逐事件仿真快，自动模式下交给仿真引擎
+WAVEFRONT_MIN_NODES = 64
+
+
+def serial_chain(graph_data):
+    """
+    判断图是否为单一串联生产线
+
+    返回:
+        list: 从源到物料终结的节点名称顺序；存在分支、合流或多个源时返回None
+    """
+    nodes = graph_data.get("nodes", [])
+    edges = graph_data.get("edges", [])
+    types = {node["name"]: node["type"] for node in nodes}
+    successor = {}
+    indegree = {name: 0 for name in types}
+    for edge in edges:
+        if edge["from"] in successor:
+            return None
+        successor[edge["from"]] = edge["to"]
+        indegree[edge["to"]] += 1
+
+    sources = [name for name, node_type in types.items() if node_type == SOURCE]
+    if len(sources) != 1 or any(count > 1 for count in indegree.values()):
+        return None
+
+    chain = [sources[0]]
+    while chain[-1] in successor:
+        chain.append(successor[chain[-1]])
+        if len(chain) > len(types):
+            return None  # 存在环
+    if len(chain) != len(types) or types[chain[-1]] != DRAIN:
+        return None
+    if any(types[name] not in (STATION, BUFFER, CONVEYOR) for name in chain[1:-1]):
+        return None
+    return chain
+
+
+def _take_until(sampler, offset, limit, chunk=1024):
+    """从抽样器中按块取样，直到offset加累计和超过limit，返回取出的全部样本"""
+    blocks = []
+    total = offset
+    while True:
+        block = sampler.take(chunk)
+        blocks.append(block)
+        total += block.sum()
+        if total > limit or not np.any(block > 0):
+            break
+        chunk *= 2
+    return np.concatenate(blocks)
+
+
+class _FailureTimeline:
+    """
+    单个节点的故障时间轴及“有效工作时间”坐标变换
+
+    首尾各加一个哨兵：开头为-inf处持续时间为0的虚拟故障，结尾为+inf，
+    使查找结果总能直接用作下标
+    """
+
+    def __init__(self, fail_times, repair_times):
+        down = repair_times - fail_times
+        self.fail = np.concatenate(([-np.inf], fail_times, [np.inf]))
+        self.repair = np.concatenate(([-np.inf], repair_times, [np.inf]))
+        self.down = np.concatenate(([0.0], down, [0.0]))
+        # 截至第k次故障修复时的累计停机时间（含第k次）
+        self.down_total = np.cumsum(self.down)
+        # 第k次故障开始时的有效工作时间
+        self.uptime_at_fail = self.fail - (self.down_total - self.down)
+
+    def last_failure(self, t):
+        """最后一次开始时间不晚于t的故障下标"""
+        return np.searchsorted(self.fail, t, side="right") - 1
+
+    def uptime(self, t, position):
+        """U(t)：截至t的有效工作时间，position为last_failure(t)"""
+        down = self.down[position]
+        passed = np.minimum(t - self.fail[position], down)
+        return t - (self.down_total[position] - down) - passed
+
+    def first_time_at(self, u):
+        """U的左逆：最早达到有效工作时间u的时刻"""
+        position = np.searchsorted(self.uptime_at_fail, u, side="left") - 1
+        return u + self.down_total[position]
+
+    def next_up(self, t, position):
+        """t时刻若处于故障中则返回修复时刻，否则返回t，position为last_failure(t)"""
+        repair = self.repair[position]
+        return np.where(t < repair, repair, t)
+
+
+class SerialLineEvaluator:
+    """串联生产线的向量化离开时间递推求值器"""
+
+    def __init__(self, graph_data, seed=None, end_time=None, chain=None):
+        """
+        参数:
+            graph_data: 串联结构的图数据（见serial_chain）
+            seed: 随机数种子，与ProductionLineSimulator使用相同的随机数流
+            end_time: 仿真结束时间，默认使用源节点的stop_time
+            chain: 已知的节点顺序，省略时调用serial_chain判断
+        """
+        chain = chain or serial_chain(graph_data)
+        if chain is None:
+            raise ValueError("图数据不是单一串联生产线，无法使用递推求值")
+        # 复用仿真器的模型构建，保证参数解析和随机数流与逐事件仿真完全一致
+        self.model = ProductionLineSimulator(graph_data, seed=seed, end_time=end_time)
+        self.end_time = self.model.end_time
+        self.chain = [self.model.nodes[self.model.node_index[name]] for name in chain]
+        self.method = None  # 实际使用的求解方法："sweep"或"wavefront"
+        self.sweeps = 0
+        self.created = None
+        self.departures = None  # 形状为(节点数, 零件数)的离开时间
+        self._sample()
+
+    # ------------------------------------------------------------------
+    # 抽样
+    # ------------------------------------------------------------------
+    def _sample(self):
+        """一次性抽取全部随机量（顺序与逐事件仿真中各随机数流的使用顺序一致）"""
+        source = self.chain[0]
+        end = self.end_time
+        limit = end if source.stop_time is None else min(end, source.stop_time)
+
+        # 不考虑阻塞时的生成时间S_i；实际生成时间只会更晚，故零件数以此为上界
+        intervals = _take_until(source.interval_sampler, source.start_time, limit)
+        unblocked = source.start_time + np.concatenate(([0.0], np.cumsum(intervals)))
+        count = int(np.searchsorted(unblocked, limit, side="right"))
+        if source.stop_time is not None:
+            count = min(count, int(np.searchsorted(unblocked, source.stop_time, side="left")))
+        self.count = count
+        self.intervals = intervals[:count]
+        self.unblocked = unblocked[:count]
+
+        size = len(self.chain)
+        self.work = np.zeros((size, count))
+        self.servers = np.zeros(size, dtype=bool)
+        self.timelines = [None] * size
+        for j, sim_node in enumerate(self.chain[1:], start=1):
+            if sim_node.type in (STATION, DRAIN):
+                self.servers[j] = True
+                self.work[j] = sim_node.proc_sampler.take(count)
+                self.timelines[j] = self._failure_timeline(sim_node)
+            else:
+                self.work[j] = sim_node.travel_time
+
+    def _failure_timeline(self, sim_node):
+        failure = sim_node.failure
+        if failure is None:
+            return None
+        stop = failure["stop"]
+        limit = self.end_time if stop is None else min(self.end_time, stop)
+        intervals = _take_until(failure["interval"], failure["start"], limit)
+        durations = failure["duration"].take(len(intervals))
+        # f_k = start + Σ_{l≤k} I_l + Σ_{l<k} L_l
+        fail_times = failure["start"] + np.cumsum(intervals)
+        fail_times[1:] += np.cumsum(durations)[:-1]
+        keep = fail_times <= self.end_time
+        if stop is not None:
+            keep &= fail_times < stop
+        count = len(keep) if keep.all() else int(np.argmin(keep))
+        fail_times = fail_times[:count]
+        return _FailureTimeline(fail_times, fail_times + durations[:count])
+
+    def _next_capacity(self, j):
+        """节点j+1的容量（整数），不会发生阻塞时返回None"""
+        if j + 1 >= len(self.chain):
+            return None
+        capacity = self.chain[j + 1].capacity
+        if capacity == np.inf or capacity >= self.count:
+            return None
+        return int(capacity)
+
+    # ------------------------------------------------------------------
+    # 求解
+    # ------------------------------------------------------------------
+    def run(self, max_sweeps=DEFAULT_MAX_SWEEPS, wavefront=True):
+        """
+        执行递推求值
+
+        参数:
+            max_sweeps: 按零件向量化扫描的最大次数
+            wavefront: 扫描未收敛时是否改用波前求解
+
+        返回:
+            dict: 与ProductionLineSimulator.statistics()相同格式的物料终结统计；
+                  扫描未收敛且不允许波前求解时返回None
+        """
+        departures = self._solve_sweeps(max_sweeps)
+        if departures is not None:
+            self.method = "sweep"
+        elif wavefront:
+            departures = self._solve_wavefront()
+            self.method = "wavefront"
+        else:
+            return None
+        self.departures = departures
+        return self.statistics()
+
+    def _solve_sweeps(self, max_sweeps):
+        """正反交替扫描，每次按节点对全部零件向量化更新，未收敛时返回None"""
+        size = len(self.chain)
+        count = self.count
+        unblocked = self.unblocked
+        departures = np.full((size, count), -np.inf)
+        self.created = unblocked.copy()
+
+        def blocking(j):
+            capacity = self._next_capacity(j)
+            shifted = np.full(count, -np.inf)
+            if capacity is not None:
+                shifted[capacity:] = departures[j + 1][: count - capacity]
+            return shifted
+
+        def update(j):
+            limit_b = blocking(j)
+            if j == 0:
+                # c_i - S_i = max(c_{i-1} - S_{i-1}, B_0(i-1) - S_i)
+                previous_b = np.concatenate(([-np.inf], limit_b[:-1]))
+                offset = np.maximum.accumulate(np.maximum(previous_b - unblocked, 0.0))
+                self.created = unblocked + offset
+                return np.maximum(self.created, limit_b)
+
+            entry = departures[j - 1]
+            w = self.work[j]
+            if not self.servers[j]:
+                return np.maximum.accumulate(np.maximum(entry + w, limit_b))
+
+            timeline = self.timelines[j]
+            if timeline is None:
+                # D_i - W_i = max(E_i - W_{i-1}, B_i - W_i, D_{i-1} - W_{i-1})
+                cumulative = np.cumsum(w)
+                shifted = np.maximum(entry - (cumulative - w), limit_b - cumulative)
+                return np.maximum.accumulate(shifted) + cumulative
+
+            # 容量为1，进入时工位必然空闲：加工完成于有效工作时间达到U(E_i) + w_i的时刻，
+            # 故障期间不能放行，故离开时间为max(完成, B_i)之后的第一个非故障时刻
+            position = timeline.last_failure(entry)
+            finished = np.where(
+                w > 0,
+                timeline.first_time_at(timeline.uptime(entry, position) + w),
+                timeline.next_up(entry, position),
+            )
+            released = timeline.next_up(limit_b, timeline.last_failure(limit_b))
+            return np.maximum.accumulate(np.maximum(finished, released))
+
+        if count == 0:
+            return departures
+
+        order = list(range(size))
+        for sweep in range(max_sweeps):
+            self.sweeps = sweep + 1
+            changed = False
+            for j in order if sweep % 2 == 0 else order[::-1]:
+                updated = update(j)
+                if not np.array_equal(updated, departures[j]):
+                    departures[j] = updated
+                    changed = True
+            if not changed:
+                return departures
+        return None
+
+    def _solve_wavefront(self):
+        """
+        按层L = 2i + j求解：单元(j, i)依赖的(j-1, i)、(j, i-1)、(j+1, i-c)都位于更早的层，
+        每层内的单元（不同零件、不同节点）一次向量化计算
+        """
+        size = len(self.chain)
+        count = self.count
+        # 多一行（物料终结之后，恒为-inf）和一列（第-1个零件，恒为-inf），省去边界判断
+        table = np.full((size + 1, count + 1), -np.inf)
+        created = np.empty(count)
+        work = self.work
+        server_scale = self.servers.astype(float)
+        next_capacity = np.array(
+            [self._next_capacity(j) or count + 1 for j in range(size)], dtype=np.int64
+        )
+
+        # 各节点的故障时间轴拼接为全局数组，每个节点保存自己在其中的游标；
+        # 同一节点的查询时间随零件序号单调不减，游标只需前移
+        failing = np.array([timeline is not None for timeline in self.timelines])
+        timelines = [timeline for timeline in self.timelines if timeline is not None]
+        base = np.zeros(size, dtype=np.int64)
+        if timelines:
+            lengths = [len(timeline.fail) for timeline in timelines]
+            base[failing] = np.cumsum([0] + lengths[:-1])
+            fail = np.concatenate([timeline.fail for timeline in timelines])
+            repair = np.concatenate([timeline.repair for timeline in timelines])
+            down = np.concatenate([timeline.down for timeline in timelines])
+            down_total = np.concatenate([timeline.down_total for timeline in timelines])
+            uptime_at_fail = np.concatenate([timeline.uptime_at_fail for timeline in timelines])
+        entry_cursor = base.copy()
+        block_cursor = base.copy()
+
+        def advance(cursor, keys, query, strict=False):
+            while True:
+                following = keys[cursor + 1]
+                step = following < query if strict else following <= query
+                if not step.any():
+                    return cursor
+                cursor = cursor + step
+
+        intervals = self.intervals
+        first_capacity = int(next_capacity[0])
+        for level in range(2 * (count - 1) + size):
+            # 源（第0个节点）位于偶数层
+            if level % 2 == 0 and level // 2 < count:
+                i = level // 2
+                if i == 0:
+                    created[0] = self.unblocked[0]
+                else:
+                    created[i] = max(created[i - 1] + intervals[i - 1], table[0, i])
+                table[0, i + 1] = max(created[i], table[1, max(i - first_capacity + 1, 0)])
+
+            low = max(1, level - 2 * (count - 1))
+            low += (level - low) % 2
+            high = min(size - 1, level)
+            if low > high:
+                continue
+            js = np.arange(low, high + 1, 2)
+            parts = (level - js) >> 1
+            columns = parts + 1
+            entry = table[js - 1, columns]
+            previous = table[js, parts]
+            limit_b = table[js + 1, np.maximum(parts - next_capacity[js] + 1, 0)]
+            w = work[js, parts]
+            result = np.maximum(
+                np.maximum(entry + w, previous + w * server_scale[js]), limit_b
+            )
+
+            selected = failing[js]
+            if timelines and selected.any():
+                fj = js[selected]
+                start = np.maximum(entry[selected], previous[selected])
+                fw = w[selected]
+                position = advance(entry_cursor[fj], fail, start)
+                entry_cursor[fj] = position
+                passed = np.minimum(start - fail[position], down[position])
+                target = start - (down_total[position] - down[position]) - passed + fw
+                # 加工中途可能再次故障：从当前故障起向后查找有效工作时间达到target的位置
+                done = advance(position, uptime_at_fail, target, strict=True)
+                finished = np.where(
+                    fw > 0,
+                    target + down_total[done],
+                    np.where(start < repair[position], repair[position], start),
+                )
+                fb = limit_b[selected]
+                block_position = advance(block_cursor[fj], fail, fb)
+                block_cursor[fj] = block_position
+                released = np.where(fb < repair[block_position], repair[block_position], fb)
+                result[selected] = np.maximum(finished, released)
+
+            table[js, columns] = result
+
+        self.created = created
+        return table[:size, 1:]
+
+    # ------------------------------------------------------------------
+    # 统计
+    # ------------------------------------------------------------------
+    def statistics(self):
+        """按ProductionLineSimulator.statistics()的格式计算物料终结统计"""
+        end = self.end_time
+        drain = self.chain[-1]
+        source = self.chain[0]
+        valid = self.created <= end
+        if source.stop_time is not None:
+            valid &= self.created < source.stop_time
+        exits = self.departures[-1][valid]
+        created = self.created[valid]
+        done = exits <= end
+        exit_times = exits[done]
+        lifespans = exit_times - created[done]
+        count = len(exit_times)
+        horizon = end - self.model.stat_start
+        return {
+            drain.name: {
+                "statavglifespan": float(lifespans.mean()) if count else 0.0,
+                "statavgexitinterval": (
+                    float((exit_times[-1] - exit_times[0]) / (count - 1)) if count > 1 else 0.0
+                ),
+                "statdeleted": count,
+                "statthroughputperday": (
+                    count * SECONDS_PER_DAY / horizon if horizon > 0 else 0.0
+                ),
+            }
+        }
+
+
+def evaluate_serial_line(graph_data, seed=None, end_time=None, min_wavefront_nodes=0):
+    """
+    对串联生产线进行递推求值
+
+    参数:
+        min_wavefront_nodes: 扫描未收敛时，节点数不少于该值才改用波前求解
+
+    返回:
+        dict: 物料终结统计；不是串联结构或未能求解时返回None
+    """
+    chain = serial_chain(graph_data)
+    if chain is None:
+        return None
+    evaluator = SerialLineEvaluator(graph_data, seed=seed, end_time=end_time, chain=chain)
+    return evaluator.run(wavefront=len(chain) >= min_wavefront_nodes)
@@ -0,0 +1,659 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离散事件仿真引擎：直接运行确认后的有向图JSON，无需Plant Simulation
+
+输入与json_to_simtalk相同的nodes/edges字典，输出与数据表相同的物料终结统计量
+（statavglifespan、statavgexitinterval、statdeleted、statthroughputperday），
+时间单位统一为秒。
+
+建模约定（与生成的SimTalk模型对应）：
+- 源：从start_time开始按interval_time生成零件，stop_time之后不再生成；
+  零件无法离开时源被阻塞，下一次生成顺延到零件离开之后
+- 工位/物料终结：容量为1，按processing_time加工，加工完成后才放行
+- 缓冲区：按capacity排队，先进先出，无停留时间
+- 传送器：按capacity累积，先进先出，运输时间为length/speed
+- 故障：按仿真时间（SimulationTime）交替产生故障间隔和持续时间；
+  故障期间暂停加工且不能放行零件（仍可接收零件）
+- 路由：有production_status时按合格率抽样并阻塞等待目标节点，
+  否则按边的顺序循环选择第一个可接收的后继节点
+"""
+
+import heapq
+import math
+from collections import deque
+
+from sampling import (
+    PURPOSE_FAILURE_DURATION,
+    PURPOSE_FAILURE_INTERVAL,
+    PURPOSE_INTERVAL,
+    PURPOSE_PROCESSING,
+    PURPOSE_ROUTING,
+    RandomStreams,
+    compile_sampler,
+    uniform_sampler,
+)
+from time_utils import parse_time_to_seconds
+
+SECONDS_PER_DAY = 86400.0
+
+# 默认仿真时长与json_to_simtalk中的默认值保持一致
+DEFAULT_START_TIME = "0:0:0:0"
+DEFAULT_STOP_TIME = "8:0:0:0"
+
+SOURCE = "源"
+STATION = "工位"
+BUFFER = "缓冲区"
+CONVEYOR = "传送器"
+DRAIN = "物料终结"
+
+NODE_TYPES = (SOURCE, STATION, BUFFER, CONVEYOR, DRAIN)
+
+# 事件类型
+_EVENT_CREATE = 0
+_EVENT_READY = 1
+_EVENT_FAIL = 2
+_EVENT_REPAIR = 3
+_EVENT_OUTAGE_START = 4  # 计划停机（如从第3天起停机4小时的场景）
+_EVENT_OUTAGE_END = 5
+
+
+def parse_quantity(value, default=None):
+    """将容量、长度、速度等属性转换为浮点数（兼容"2"、"2m"、"1m/s"等字符串）"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip().lower()
+    for suffix in ("m/s", "m"):
+        if text.endswith(suffix):
+            text = text[: -len(suffix)].strip()
+            break
+    try:
+        return float(text)
+    except ValueError:
+        return default
+
+
+class _Part:
+    """仿真中的零件（MU）"""
+
+    __slots__ = ("part_id", "created_at", "ready_at", "remaining", "target")
+
+    def __init__(self, part_id, created_at):
+        self.part_id = part_id
+        self.created_at = created_at
+        self.ready_at = created_at  # 可以离开当前节点的时间，None表示因故障暂停加工
+        self.remaining = 0.0  # 故障暂停时剩余的加工时间
+        self.target = None  # 按合格率抽样得到的目标节点索引
+
+
+class _SimNode:
+    """仿真中的节点运行状态"""
+
+    __slots__ = (
+        "index", "name", "type", "data", "capacity", "successors", "predecessors",
+        "parts", "travel_time", "proc_sampler", "interval_sampler",
+        "start_time", "stop_time", "next_create_due",
+        "failure", "failed", "broken", "outages", "version", "routing", "cyclic_pos", "pending",
+        "exit_times", "lifespans",
+    )
+
+    def __init__(self, index, name, node_type, data):
+        self.index = index
+        self.name = name
+        self.type = node_type
+        self.data = data
+        self.capacity = 1
+        self.successors = []
+        self.predecessors = []
+        self.parts = deque()
+        self.travel_time = 0.0
+        self.proc_sampler = None
+        self.interval_sampler = None
+        self.start_time = 0.0
+        self.stop_time = None
+        self.next_create_due = None
+        self.failure = None
+        self.failed = False  # 是否停止加工（故障或计划停机）
+        self.broken = False  # 是否处于随机故障中
+        self.outages = 0  # 进行中的计划停机数
+        self.version = 0
+        self.routing = None
+        self.cyclic_pos = 0
+        self.pending = False
+        self.exit_times = []
+        self.lifespans = []
+
+
+class ProductionLineSimulator:
+    """基于事件表（小顶堆）的生产线离散事件仿真器"""
+
+    def __init__(self, graph_data, seed=None, end_time=None):
+        """
+        参数:
+            graph_data: 经过process_and_validate_graph_data处理的图数据
+            seed: 随机数种子（整数、SeedSequence或RandomStreams），相同种子得到相同结果
+            end_time: 仿真结束时间（秒或时间字符串），默认使用源节点的stop_time
+        """
+        self.seed = seed
+        self.graph_data = graph_data
+        self.streams = seed if isinstance(seed, RandomStreams) else RandomStreams(seed)
+        self.now = 0.0
+        self.stat_start = 0.0
+        self._events = []
+        self._seq = 0
+        self._pending = deque()
+        self._next_part_id = 0
+
+        self.nodes = []
+        self.node_index = {}
+        self._build(graph_data)
+
+        if end_time is None:
+            end_time = self._source_stop_time
+        self.end_time = parse_time_to_seconds(end_time)
+        self._started = False
+
+    # ------------------------------------------------------------------
+    # 模型构建
+    # ------------------------------------------------------------------
+    def _sampler(self, node_name, purpose, time_data):
+        """为节点的指定用途编译抽样器，每个(节点, 用途)使用独立的随机数流"""
+        return compile_sampler(
+            time_data,
+            self.streams.generator(node_name, purpose),
+            antithetic=self.streams.antithetic,
+        )
+
+    def _build(self, graph_data):
+        nodes = graph_data.get("nodes", [])
+        edges = graph_data.get("edges", [])
+
+        # 提取源节点的时间属性（与json_to_simtalk一致，用作故障及仿真时间默认值）
+        source_start_time = DEFAULT_START_TIME
+        source_stop_time = DEFAULT_STOP_TIME
+        for node in nodes:
+            if node["type"] == SOURCE and "time" in node.get("data", {}):
+                time_data = node["data"]["time"]
+                source_start_time = time_data.get("start_time", source_start_time)
+                source_stop_time = time_data.get("stop_time", source_stop_time)
+                break
+        self._source_stop_time = source_stop_time
+        default_start = parse_time_to_seconds(source_start_time)
+        default_stop = parse_time_to_seconds(source_stop_time)
+
+        for index, node in enumerate(nodes):
+            node_type = node["type"]
+            if node_type not in NODE_TYPES:
+                raise ValueError(f"节点 {node['name']} 的类型 '{node_type}' 无法仿真")
+            sim_node = _SimNode(index, node["name"], node_type, node.get("data", {}))
+            self.nodes.append(sim_node)
+            self.node_index[sim_node.name] = index
+
+        for edge in edges:
+            from_node = self.nodes[self.node_index[edge["from"]]]
+            to_node = self.nodes[self.node_index[edge["to"]]]
+            from_node.successors.append(to_node.index)
+            to_node.predecessors.append(from_node.index)
+
+        for sim_node in self.nodes:
+            data = sim_node.data
+            time_data = data.get("time", {})
+
+            if sim_node.type == SOURCE:
+                sim_node.interval_sampler = self._sampler(
+                    sim_node.name, PURPOSE_INTERVAL, time_data.get("interval_time", 0)
+                )
+                sim_node.start_time = parse_time_to_seconds(time_data.get("start_time", 0))
+                stop_time = parse_time_to_seconds(time_data.get("stop_time", source_stop_time))
+                sim_node.stop_time = stop_time if stop_time > sim_node.start_time else None
+
+            elif sim_node.type in (STATION, DRAIN):
+                sim_node.proc_sampler = self._sampler(
+                    sim_node.name, PURPOSE_PROCESSING, time_data.get("processing_time", 0)
+                )
+                if "failure" in data:
+                    failure_data = data["failure"]
+                    start = parse_time_to_seconds(failure_data.get("start_time", default_start))
+                    stop = parse_time_to_seconds(failure_data.get("stop_time", default_stop))
+                    sim_node.failure = {
+                        "start": start,
+                        "stop": stop if stop > start else None,
+                        "interval": self._sampler(
+                            sim_node.name,
+                            PURPOSE_FAILURE_INTERVAL,
+                            failure_data.get("interval_time", 0),
+                        ),
+                        "duration": self._sampler(
+                            sim_node.name,
+                            PURPOSE_FAILURE_DURATION,
+                            failure_data.get("duration_time", "0:0:0:0"),
+                        ),
+                    }
+                if "production_status" in data and sim_node.successors:
+                    sim_node.routing = self._build_routing(sim_node)
+
+            elif sim_node.type == BUFFER:
+                capacity = parse_quantity(data.get("capacity"), 1.0)
+                sim_node.capacity = int(capacity) if capacity > 0 else math.inf
+
+            elif sim_node.type == CONVEYOR:
+                capacity = parse_quantity(data.get("capacity"))
+                sim_node.capacity = int(capacity) if capacity and capacity > 0 else math.inf
+                length = parse_quantity(data.get("length"), 0.0)
+                speed = parse_quantity(data.get("speed"), 1.0)
+                sim_node.travel_time = length / speed if speed > 0 else 0.0
+
+    def _build_routing(self, sim_node):
+        """根据production_status和production_destination构建合格/不合格路由"""
+        status = sim_node.data["production_status"]
+        destination = sim_node.data.get("production_destination", {})
+        weights = []
+        targets = []
+        for position, key in enumerate(("qualified", "unqualified")):
+            if key not in status:
+                continue
+            target_name = destination.get(key)
+            if target_name in self.node_index:
+                target = self.node_index[target_name]
+            elif position < len(sim_node.successors):
+                target = sim_node.successors[position]
+            else:
+                continue
+            weights.append(float(status[key]))
+            targets.append(target)
+
+        total = sum(weights)
+        if total <= 0:
+            return None
+        cumulative = []
+        running = 0.0
+        for weight in weights:
+            running += weight / total
+            cumulative.append(running)
+        return {
+            "cumulative": cumulative,
+            "targets": targets,
+            "sampler": uniform_sampler(
+                self.streams.generator(sim_node.name, PURPOSE_ROUTING),
+                antithetic=self.streams.antithetic,
+            ),
+        }
+
+    def _schedule_initial_events(self):
+        for sim_node in self.nodes:
+            if sim_node.type == SOURCE:
+                self._schedule(sim_node.start_time, _EVENT_CREATE, sim_node.index)
+            if sim_node.failure is not None:
+                first_failure = sim_node.failure["start"] + sim_node.failure["interval"]()
+                self._schedule_failure(sim_node, first_failure)
+
+    # ------------------------------------------------------------------
+    # 事件处理
+    # ------------------------------------------------------------------
+    def _schedule(self, time, kind, index, token=None):
+        heapq.heappush(self._events, (time, self._seq, kind, index, token))
+        self._seq += 1
+
+    def _schedule_failure(self, sim_node, time):
+        stop = sim_node.failure["stop"]
+        if stop is None or time < stop:
+            self._schedule(time, _EVENT_FAIL, sim_node.index)
+
+    def run(self, until=None):
+        """
+        运行仿真直到指定时间（默认到结束时间）
+
+        返回:
+            dict: 各物料终结的统计数据，见statistics()
+        """
+        until = self.end_time if until is None else parse_time_to_seconds(until)
+        self._advance(until)
+        self.now = max(self.now, until)
+        return self.statistics()
+
+    def _advance(self, until, inclusive=True):
+        """处理时间不晚于until（inclusive为False时早于until）的全部事件"""
+        if not self._started:
+            # 初始事件在首次运行时安排，构建后的模型参数可供其他求值器直接复用
+            self._schedule_initial_events()
+            self._started = True
+        events = self._events
+        nodes = self.nodes
+        while events and (events[0][0] <= until if inclusive else events[0][0] < until):
+            time, _, kind, index, token = heapq.heappop(events)
+            self.now = time
+            sim_node = nodes[index]
+            if kind == _EVENT_READY:
+                if token is None or token == sim_node.version:
+                    self._wake(sim_node)
+            elif kind == _EVENT_CREATE:
+                self._create_part(sim_node)
+            elif kind == _EVENT_FAIL:
+                self._fail(sim_node)
+            elif kind == _EVENT_REPAIR:
+                self._repair(sim_node)
+            elif kind == _EVENT_OUTAGE_START:
+                self._start_outage(sim_node)
+            elif kind == _EVENT_OUTAGE_END:
+                self._end_outage(sim_node)
+            self._process_pending()
+
+    def _wake(self, sim_node):
+        """将节点加入待放行队列（迭代处理，避免长生产线递归过深）"""
+        if not sim_node.pending:
+            sim_node.pending = True
+            self._pending.append(sim_node)
+
+    def _process_pending(self):
+        pending = self._pending
+        while pending:
+            sim_node = pending.popleft()
+            sim_node.pending = False
+            self._try_release(sim_node)
+
+    def _create_part(self, sim_node):
+        if sim_node.stop_time is not None and self.now >= sim_node.stop_time:
+            return
+        part = _Part(self._next_part_id, self.now)
+        self._next_part_id += 1
+        sim_node.parts.append(part)
+        sim_node.next_create_due = self.now + sim_node.interval_sampler()
+        self._wake(sim_node)
+
+    def _try_release(self, sim_node):
+        """尽可能将已就绪的队首零件送往后继节点"""
+        now = self.now
+        parts = sim_node.parts
+        while parts and not sim_node.failed:
+            part = parts[0]
+            if part.ready_at is None or part.ready_at > now:
+                break
+            if sim_node.type == DRAIN:
+                parts.popleft()
+                sim_node.exit_times.append(now)
+                sim_node.lifespans.append(now - part.created_at)
+                self._on_release(sim_node, part, None)
+                self._on_space_freed(sim_node)
+                continue
+            target = self._select_target(sim_node, part)
+            if target is None:
+                self._on_blocked(sim_node, part)
+                break
+            parts.popleft()
+            self._on_release(sim_node, part, target)
+            self._enter(target, part)
+            self._on_space_freed(sim_node)
+
+    def _on_release(self, sim_node, part, target):
+        """零件离开节点时调用（target为None表示物料终结删除零件），供子类记录事件"""
+
+    def _on_blocked(self, sim_node, part):
+        """队首零件已完成但后继节点无法接收时调用，供子类记录事件"""
+
+    def _select_target(self, sim_node, part):
+        routing = sim_node.routing
+        nodes = self.nodes
+        if routing is not None:
+            # 按合格率抽样，阻塞等待抽中的目标节点（exitstrategyblocking）
+            if part.target is None:
+                draw = routing["sampler"]()
+                targets = routing["targets"]
+                part.target = targets[-1]
+                for position, bound in enumerate(routing["cumulative"]):
+                    if draw < bound:
+                        part.target = targets[position]
+                        break
+            target = nodes[part.target]
+            return target if self._can_accept(target) else None
+
+        successors = sim_node.successors
+        count = len(successors)
+        for offset in range(count):
+            position = (sim_node.cyclic_pos + offset) % count
+            target = nodes[successors[position]]
+            if self._can_accept(target):
+                sim_node.cyclic_pos = (position + 1) % count
+                return target
+        return None
+
+    @staticmethod
+    def _can_accept(sim_node):
+        return sim_node.type != SOURCE and len(sim_node.parts) < sim_node.capacity
+
+    def _enter(self, sim_node, part):
+        now = self.now
+        part.target = None
+        sim_node.parts.append(part)
+        if sim_node.type in (STATION, DRAIN):
+            work = sim_node.proc_sampler()
+            if sim_node.failed:
+                part.ready_at = None
+                part.remaining = work
+                return
+            part.ready_at = now + work
+            if work > 0:
+                self._schedule(part.ready_at, _EVENT_READY, sim_node.index, sim_node.version)
+                return
+        else:
+            part.ready_at = now + sim_node.travel_time
+            if sim_node.travel_time > 0:
+                self._schedule(part.ready_at, _EVENT_READY, sim_node.index)
+                return
+        self._wake(sim_node)
+
+    def _on_space_freed(self, sim_node):
+        if sim_node.type == SOURCE and sim_node.next_create_due is not None:
+            self._schedule(max(sim_node.next_create_due, self.now), _EVENT_CREATE, sim_node.index)
+            sim_node.next_create_due = None
+        nodes = self.nodes
+        for index in sim_node.predecessors:
+            self._wake(nodes[index])
+
+    def _fail(self, sim_node):
+        sim_node.broken = True
+        if not sim_node.failed:
+            self._suspend(sim_node)
+        self._schedule(self.now + sim_node.failure["duration"](), _EVENT_REPAIR, sim_node.index)
+
+    def _repair(self, sim_node):
+        sim_node.broken = False
+        if not sim_node.outages:
+            self._resume(sim_node)
+        self._schedule_failure(sim_node, self.now + sim_node.failure["interval"]())
+
+    def _start_outage(self, sim_node):
+        sim_node.outages += 1
+        if not sim_node.failed:
+            self._suspend(sim_node)
+
+    def _end_outage(self, sim_node):
+        sim_node.outages -= 1
+        if not sim_node.outages and not sim_node.broken:
+            self._resume(sim_node)
+
+    def _suspend(self, sim_node):
+        """停止加工：暂停所有零件的剩余加工时间"""
+        now = self.now
+        sim_node.failed = True
+        sim_node.version += 1  # 使已安排的加工完成事件失效
+        for part in sim_node.parts:
+            if part.ready_at is not None and part.ready_at > now:
+                part.remaining = part.ready_at - now
+                part.ready_at = None
+
+    def _resume(self, sim_node):
+        """恢复加工：按剩余加工时间重新安排完成事件"""
+        now = self.now
+        sim_node.failed = False
+        for part in sim_node.parts:
+            if part.ready_at is None:
+                part.ready_at = now + part.remaining
+                part.remaining = 0.0
+                if part.ready_at > now:
+                    self._schedule(part.ready_at, _EVENT_READY, sim_node.index, sim_node.version)
+        self._wake(sim_node)
+
+    def schedule_outage(self, node_name, start, duration):
+        """
+        安排一次计划停机（与随机故障相互独立，两者都结束后才恢复加工）
+
+        参数:
+            node_name: 工位或物料终结名称
+            start: 停机开始时间（秒或时间字符串），早于当前时刻时从当前时刻开始
+            duration: 停机时长（秒或时间字符串）
+        """
+        if node_name not in self.node_index:
+            raise ValueError(f"节点 {node_name} 不存在")
+        sim_node = self.nodes[self.node_index[node_name]]
+        if sim_node.type not in (STATION, DRAIN):
+            raise ValueError(f"节点 {node_name} 不是工位或物料终结，不能停机")
+        start = max(parse_time_to_seconds(start), self.now)
+        self._schedule(start, _EVENT_OUTAGE_START, sim_node.index)
+        self._schedule(start + parse_time_to_seconds(duration), _EVENT_OUTAGE_END, sim_node.index)
+
+    # ------------------------------------------------------------------
+    # 统计
+    # ------------------------------------------------------------------
+    def statistics(self):
+        """
+        返回各物料终结的统计数据（与数据表中的四项统计对应）
+
+        返回:
+            dict: {物料终结名称: {"statavglifespan": 秒, "statavgexitinterval": 秒,
+                                 "statdeleted": 个数, "statthroughputperday": 个/天}}
+        """
+        horizon = self.now - self.stat_start
+        stats = {}
+        for sim_node in self.nodes:
+            if sim_node.type != DRAIN:
+                continue
+            count = len(sim_node.exit_times)
+            exit_times = sim_node.exit_times
+            stats[sim_node.name] = {
+                "statavglifespan": sum(sim_node.lifespans) / count if count else 0.0,
+                "statavgexitinterval": (
+                    (exit_times[-1] - exit_times[0]) / (count - 1) if count > 1 else 0.0
+                ),
+                "statdeleted": count,
+                "statthroughputperday": (
+                    count * SECONDS_PER_DAY / horizon if horizon > 0 else 0.0
+                ),
+            }
+        return stats
+
+
+def simulate_graph(graph_data, seed=None, end_time=None, method="auto"):
+    """
+    运行一次仿真并返回各物料终结的统计数据
+
+    参数:
+        method: "event"为逐事件仿真；"serial"为串联生产线递推求值（见serial_line），
+                图不是串联结构时报错；"auto"（默认）对串联生产线优先使用递推求值，
+                存在分支或递推不划算时自动回退到逐事件仿真；
+                "partitioned"为在传送器处切分后的多进程仿真（见partitioned_simulation）
+    """
+    if method == "partitioned":
+        from partitioned_simulation import simulate_partitioned
+
+        return simulate_partitioned(graph_data, seed=seed, end_time=end_time)
+    if method != "event":
+        # 延迟导入：serial_line依赖本模块
+        from serial_line import WAVEFRONT_MIN_NODES, evaluate_serial_line
+
+        min_nodes = WAVEFRONT_MIN_NODES if method == "auto" else 0
+        stats = evaluate_serial_line(graph_data, seed, end_time, min_wavefront_nodes=min_nodes)
+        if stats is not None:
+            return stats
+        if method == "serial":
+            raise ValueError("图数据不是单一串联生产线，无法使用递推求值")
+    return ProductionLineSimulator(graph_data, seed=seed, end_time=end_time).run()
+
+
+def format_statistics(stats):
+    """按数据表（data_output.txt）的行布局格式化统计数据"""
+    lines = []
+    for node_name, node_stats in stats.items():
+        lines.append(node_name)
+        lines.append(f"平均寿命\t{node_stats['statavglifespan']:.2f}")
+        lines.append(f"平均退出间隔\t{node_stats['statavgexitinterval']:.2f}")
+        lines.append(f"总吞吐量\t{node_stats['statdeleted']}")
+        lines.append(f"每天吞吐量\t{node_stats['statthroughputperday']:.2f}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    sample_graph_data = {
+        "nodes": [
+            {
+                "name": "源",
+                "type": "源",
+                "data": {
+                    "time": {
+                        "interval_time": "0:0:10:0",
+                        "start_time": "0:0:0:0",
+                        "stop_time": "1:0:0:0",
+                    }
+                },
+            },
+            {"name": "缓冲区", "type": "缓冲区", "data": {"capacity": 8}},
+            {
+                "name": "加工工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "normal",
+                            "parameters": {"mean": 200, "sigma": 30},
+                        }
+                    },
+                    "failure": {
+                        "failure_name": "failure1",
+                        "interval_time": "0:0:33:20",
+                        "duration_time": "0:0:3:20",
+                    },
+                },
+            },
+            {
+                "name": "传送器",
+                "type": "传送器",
+                "data": {"capacity": "2", "length": "2", "width": "0.5", "speed": "1"},
+            },
+            {
+                "name": "测试工位",
+                "type": "工位",
+                "data": {
+                    "time": {"processing_time": "0:0:1:0"},
+                    "failure": {
+                        "failure_name": "failure2",
+                        "interval_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 2000},
+                        },
+                        "duration_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 200},
+                        },
+                    },
+                    "production_status": {"qualified": 0.7, "unqualified": 0.3},
+                    "production_destination": {
+                        "qualified": "合格库存",
+                        "unqualified": "废品库存",
+                    },
+                },
+            },
+            {"name": "合格库存", "type": "物料终结", "data": {}},
+            {"name": "废品库存", "type": "物料终结", "data": {}},
+        ],
+        "edges": [
+            {"from": "源", "to": "缓冲区"},
+            {"from": "缓冲区", "to": "加工工位"},
+            {"from": "加工工位", "to": "传送器"},
+            {"from": "传送器", "to": "测试工位"},
+            {"from": "测试工位", "to": "合格库存"},
+            {"from": "测试工位", "to": "废品库存"},
+        ],
+    }
+    print(format_statistics(simulate_graph(sample_graph_data, seed=1)))
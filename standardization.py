@@ -1,8 +1,9 @@
 """LLM主导的输入标准化处理模块（简化版）"""
 
-from typing import Optional
+import asyncio
+from typing import Callable, Optional
 import requests
-from api_utils import make_api_request
+from api_utils import AsyncLLMClient
 
 SYSTEM_PROMPT = """你是一个工业建模语言标准化专家，请将用户输入转换为标准化的建模语言描述。
 主要任务：
@@ -23,18 +24,64 @@ SYSTEM_PROMPT = """你是一个工业建模语言标准化专家，请将用户
 """
 
 
-def standardize_text(raw_text: str, max_attempts: int = 3) -> Optional[str]:
+def needs_more_information(result: str) -> bool:
+    """判断标准化回复是否在向用户询问缺失信息（而不是AI的思考过程）"""
+    # 更精确的检测逻辑：检查是否包含明确的询问句式，而不是简单的关键词
+    check_phrases = [
+        "需要补充",
+        "缺失",
+        "请提供",
+        "请说明",
+        "需要说明",
+        "缺少",
+        "不完整",
+        "请详细描述",
+    ]
+
+    # 排除思考过程中的描述性关键词
+    exclude_phrases = [
+        "思考过程",
+        "标准化输出",
+        "示例输出",
+        "流程顺序为",
+        "术语标准化",
+        "消除模糊表述",
+        "检查信息完整性",
+    ]
+
+    # 检测是否为真正的询问：包含询问关键词但不包含思考过程描述
+    has_inquiry = any(phrase in result for phrase in check_phrases)
+    is_thought_process = (
+        any(phrase in result for phrase in exclude_phrases)
+        or "### 思考过程：" in result
+    )
+
+    # 只有当包含询问关键词且不是思考过程时才要求补充信息
+    return has_inquiry and not is_thought_process
+
+
+async def standardize_text_async(
+    raw_text: str,
+    max_attempts: int = 3,
+    ask: Optional[Callable[[str], str]] = None,
+    client: Optional[AsyncLLMClient] = None,
+) -> Optional[str]:
     """
-    LLM主导的标准化处理主函数(交互式)
+    LLM主导的标准化处理（异步版）
     参数:
         raw_text: 原始输入文本
         max_attempts: 最大交互次数
+        ask: 获取补充信息的函数（如input，在线程中调用）；None表示非交互，
+             需要补充信息时直接返回None
+        client: 异步LLM客户端（默认新建）
     返回:
         - 标准化后的字符串文本
         - 处理失败时返回None
     """
     if not raw_text or not isinstance(raw_text, str):
         return None
+    if client is None:
+        client = AsyncLLMClient()
 
     # 初始化对话历史
     conversation_history = [{"role": "system", "content": SYSTEM_PROMPT}]
@@ -47,46 +94,17 @@ def standardize_text(raw_text: str, max_attempts: int = 3) -> Optional[str]:
         messages.append({"role": "user", "content": current_text})
 
         try:
-            response = make_api_request(messages)
+            response = await client.request(messages)
             if not response.get("choices"):
                 print(f"API响应格式异常: {response}")
                 return None
 
             result = response["choices"][0]["message"]["content"]
 
-            # 检查是否为真正的信息缺失询问（而不是AI的思考过程）
-            # 更精确的检测逻辑：检查是否包含明确的询问句式，而不是简单的关键词
-            check_phrases = [
-                "需要补充",
-                "缺失",
-                "请提供",
-                "请说明",
-                "需要说明",
-                "缺少",
-                "不完整",
-                "请详细描述",
-            ]
-
-            # 排除思考过程中的描述性关键词
-            exclude_phrases = [
-                "思考过程",
-                "标准化输出",
-                "示例输出",
-                "流程顺序为",
-                "术语标准化",
-                "消除模糊表述",
-                "检查信息完整性",
-            ]
-
-            # 检测是否为真正的询问：包含询问关键词但不包含思考过程描述
-            has_inquiry = any(phrase in result for phrase in check_phrases)
-            is_thought_process = (
-                any(phrase in result for phrase in exclude_phrases)
-                or "### 思考过程：" in result
-            )
-
-            # 只有当包含询问关键词且不是思考过程时才要求补充信息
-            if has_inquiry and not is_thought_process:
+            if needs_more_information(result):
+                if ask is None:
+                    print("⚠️ 标准化过程需要补充信息，非交互模式下无法补充")
+                    return None
                 print("标准化过程需要补充信息:")
                 print(result)
                 # 记录完整对话到上下文
@@ -95,7 +113,7 @@ def standardize_text(raw_text: str, max_attempts: int = 3) -> Optional[str]:
 
                 print(f"\n=== 需要补充信息 (尝试 {attempts + 1}/{max_attempts}) ===")
                 print(result)
-                current_text = input("请输入补充内容: ")
+                current_text = await asyncio.to_thread(ask, "请输入补充内容: ")
                 attempts += 1
                 continue
 
@@ -111,6 +129,19 @@ def standardize_text(raw_text: str, max_attempts: int = 3) -> Optional[str]:
             return None
 
 
+def standardize_text(raw_text: str, max_attempts: int = 3) -> Optional[str]:
+    """
+    LLM主导的标准化处理主函数(交互式)
+    参数:
+        raw_text: 原始输入文本
+        max_attempts: 最大交互次数
+    返回:
+        - 标准化后的字符串文本
+        - 处理失败时返回None
+    """
+    return asyncio.run(standardize_text_async(raw_text, max_attempts, ask=input))
+
+
 # 测试示例
 if __name__ == "__main__":
     test_input = "我想让你帮我建一个缸盖生产线的模型。整个流程是这样的：最开始有个放缸盖毛坯的地方，它从0分钟开始干活，每隔10分钟就放出来一个毛坯，这样一直干满一整天。毛坯出来之后呢，会先到一个地方排队等着加工，这个地方不大，最多能堆8个毛坯。等排到了，就送去铣床加工那个关键的缸盖面。这台铣床干活的速度按正态分布来，平均要弄200秒左右，但有时快点有时慢点，大概差个30秒上下。它还有个爱坏的毛病，平均干个2000秒左右就会随机坏一次，一坏就得停下来修，平均修200秒才能好。铣床前面也有个小地方让加工完的缸盖稍微等等再走，也是最多能放8个。铣好的缸盖接下来要运去做检测，用的是条传送带，差不多2米长，半米宽，跑的速度是1米每秒，一次最多能运2个缸盖。运到了就开始做气密性测试，看缸盖漏不漏气，这个测试挺快，每个缸盖固定就卡1分钟。不过这个测试设备更不让人省心，它坏的时间间隔完全是按负指数分布随机来的，平均大概2000秒就坏一次，而且每次修多久也是按负指数分布随机的，平均得修200秒。测完结果就得分路了：大概七成（70%）的缸盖是合格的，是好产品，就直接送到存放好缸盖的仓库里；剩下三成（30%）是不合格的废品，就送到专门堆放废料的地方去。整个线就这么个顺序走下来：从出毛坯开始，经过第一个排队点，再到铣床加工，然后上传送带运去测试，最后测试完根据好坏分到好仓库或者废料堆。你就按我上面说的这些干活时间、机器爱坏的毛病、地方的大小、传送带的尺寸速度、还有合格率这些细节，把模型设定好跑起来看看。"
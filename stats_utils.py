@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+from statistics import NormalDist
+
+
+def t_quantile(probability, df):
+    """
+    学生t分布的分位数（不依赖SciPy）
+    自由度1、2使用解析公式，其余使用Cornish-Fisher展开（自由度>=3时误差<1%）
+    """
+    if df <= 0:
+        return math.inf
+    if df == 1:
+        return math.tan(math.pi * (probability - 0.5))
+    if df == 2:
+        return (2 * probability - 1) / math.sqrt(2 * probability * (1 - probability))
+    z = NormalDist().inv_cdf(probability)
+    v = float(df)
+    return (
+        z
+        + (z**3 + z) / (4 * v)
+        + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * v**2)
+        + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * v**3)
+        + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z)
+        / (92160 * v**4)
+    )
+
+
+def confidence_interval(values, confidence=0.95):
+    """
+    计算样本均值、标准差及置信区间
+
+    返回:
+        dict: mean, stddev, half_width, ci_low, ci_high, n
+    """
+    values = [float(value) for value in values]
+    count = len(values)
+    mean = sum(values) / count if count else 0.0
+    if count > 1:
+        variance = sum((value - mean) ** 2 for value in values) / (count - 1)
+        stddev = math.sqrt(variance)
+        half_width = t_quantile(0.5 + confidence / 2, count - 1) * stddev / math.sqrt(count)
+    else:
+        stddev = 0.0
+        half_width = math.inf
+    return {
+        "mean": mean,
+        "stddev": stddev,
+        "half_width": half_width,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "n": count,
+    }
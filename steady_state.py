@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+稳态分析：用MSER规则自动检测预热期，再用批均值法从单次长时间运行中估计
+物料终结的稳态吞吐量和平均寿命
+
+- 预热期：分别对吞吐量序列（按时间分桶的退出数）和寿命序列（按退出顺序）
+  应用MSER-5规则，取两者中较晚的时刻，所有物料终结使用整条线的最大预热期
+- 批均值：截断后的观测按顺序分为若干批，以批均值作为近似独立的观测计算置信区间；
+  批均值的一阶自相关过大时合并相邻批次（批数减半）
+- 稳态运行中源持续生成零件、故障持续发生，不受stop_time限制
+"""
+
+import math
+
+import numpy as np
+
+from simulation_engine import DRAIN, SECONDS_PER_DAY, SOURCE, ProductionLineSimulator
+from stats_utils import confidence_interval
+
+# MSER-5：先将观测按5个一组取平均再计算MSER统计量
+MSER_BATCH_SIZE = 5
+
+DEFAULT_BATCHES = 20
+MIN_BATCHES = 10
+
+# 批均值一阶自相关的上限，超过时合并批次
+MAX_LAG1_CORRELATION = 0.2
+
+# 吞吐量序列的分桶数
+DEFAULT_BUCKETS = 400
+
+
+def mser_truncation(values, batch_size=MSER_BATCH_SIZE):
+    """
+    MSER截断点：使截断后样本均值的标准误（的平方）最小的删除个数
+
+    MSER(d) = Σ_{i>d}(Y_i - Ȳ_d)² / (n - d)²，只在前一半观测中搜索d
+
+    返回:
+        int: 应删除的原始观测个数
+    """
+    values = np.asarray(values, dtype=float)
+    count = len(values) // batch_size
+    if count < 4:
+        return 0
+    batched = values[: count * batch_size].reshape(count, batch_size).mean(axis=1)
+    # 从尾部累计的和与平方和，得到每个截断点之后的均值和离差平方和
+    tail_sum = np.cumsum(batched[::-1])[::-1]
+    tail_square = np.cumsum((batched**2)[::-1])[::-1]
+    remaining = np.arange(count, 0, -1, dtype=float)
+    squared_error = tail_square - tail_sum**2 / remaining
+    statistic = squared_error / remaining**2
+    best = int(np.argmin(statistic[: count // 2 + 1]))
+    return best * batch_size
+
+
+def batch_means(values, batches=DEFAULT_BATCHES, confidence=0.95):
+    """
+    批均值法置信区间
+
+    参数:
+        values: 截断预热期后的按时间顺序排列的观测
+        batches: 初始批数，批均值一阶自相关超过MAX_LAG1_CORRELATION时减半，最少MIN_BATCHES
+
+    返回:
+        dict: confidence_interval结果，另含batches、batch_size、lag1（批均值一阶自相关）
+    """
+    values = np.asarray(values, dtype=float)
+    batches = max(2, min(batches, len(values)))
+    while True:
+        size = len(values) // batches
+        if size == 0:
+            return {**confidence_interval(values, confidence), "batches": len(values),
+                    "batch_size": 1, "lag1": 0.0}
+        # 舍去最靠近预热期的余数观测
+        means = values[len(values) - size * batches:].reshape(batches, size).mean(axis=1)
+        lag1 = _lag1_correlation(means)
+        if lag1 <= MAX_LAG1_CORRELATION or batches // 2 < MIN_BATCHES:
+            break
+        batches //= 2
+    result = confidence_interval(means, confidence)
+    result.update({"batches": batches, "batch_size": size, "lag1": lag1})
+    return result
+
+
+def _lag1_correlation(values):
+    centered = values - values.mean()
+    denominator = float(np.dot(centered, centered))
+    if len(values) < 3 or denominator <= 0:
+        return 0.0
+    return float(np.dot(centered[:-1], centered[1:]) / denominator)
+
+
+def _exit_counts(exit_times, start, end, buckets):
+    edges = np.linspace(start, end, buckets + 1)
+    counts, _ = np.histogram(exit_times, bins=edges)
+    return counts, (end - start) / buckets
+
+
+def run_steady_state(graph_data, seed=None, run_length=None):
+    """
+    单次长时间运行：源持续生成零件、故障持续发生
+
+    参数:
+        run_length: 运行时长（秒或时间字符串），默认使用源节点的stop_time
+
+    返回:
+        ProductionLineSimulator: 运行结束的仿真器（各物料终结的exit_times、lifespans可用）
+    """
+    sim = ProductionLineSimulator(graph_data, seed=seed, end_time=run_length)
+    for sim_node in sim.nodes:
+        if sim_node.type == SOURCE:
+            sim_node.stop_time = None
+        if sim_node.failure is not None:
+            sim_node.failure["stop"] = None
+    sim.run()
+    return sim
+
+
+def estimate_steady_state(
+    graph_data,
+    seed=None,
+    run_length=None,
+    batches=DEFAULT_BATCHES,
+    confidence=0.95,
+    buckets=DEFAULT_BUCKETS,
+):
+    """
+    检测预热期并用批均值估计稳态吞吐量和平均寿命
+
+    参数:
+        graph_data: 与simulate_graph相同的图数据
+        seed: 随机数种子
+        run_length: 运行时长（秒或时间字符串），默认使用源节点的stop_time
+        batches: 批均值的初始批数
+        confidence: 置信水平
+        buckets: 吞吐量序列的分桶数
+
+    返回:
+        dict: warmup_time（预热期，秒）、run_length、
+              stats（{物料终结名称: {"throughput_per_day": 批均值结果（个/天），
+                                    "lifespan": 批均值结果（秒）, "observations": 个数}}）
+    """
+    sim = run_steady_state(graph_data, seed=seed, run_length=run_length)
+    end = sim.end_time
+    drains = [node for node in sim.nodes if node.type == DRAIN]
+
+    warmup = 0.0
+    for drain in drains:
+        exit_times = np.asarray(drain.exit_times)
+        if len(exit_times) == 0:
+            continue
+        counts, width = _exit_counts(exit_times, 0.0, end, buckets)
+        warmup = max(warmup, mser_truncation(counts) * width)
+        deleted = mser_truncation(drain.lifespans)
+        if deleted > 0:
+            warmup = max(warmup, float(exit_times[deleted - 1]))
+
+    # 分桶边界对齐到预热期结束，保证每桶宽度相同
+    remaining_buckets = max(MIN_BATCHES, int(round(buckets * (end - warmup) / end)))
+    stats = {}
+    for drain in drains:
+        exit_times = np.asarray(drain.exit_times)
+        lifespans = np.asarray(drain.lifespans)
+        kept = exit_times > warmup
+        counts, width = _exit_counts(exit_times, warmup, end, remaining_buckets)
+        throughput = batch_means(counts * (SECONDS_PER_DAY / width), batches, confidence)
+        lifespan = (
+            batch_means(lifespans[kept], batches, confidence)
+            if kept.sum() >= 2
+            else {**confidence_interval(lifespans[kept], confidence), "batches": 0,
+                  "batch_size": 0, "lag1": 0.0}
+        )
+        stats[drain.name] = {
+            "throughput_per_day": throughput,
+            "lifespan": lifespan,
+            "observations": int(kept.sum()),
+        }
+    return {"warmup_time": warmup, "run_length": end, "stats": stats}
+
+
+def format_steady_state(result):
+    """格式化稳态分析结果"""
+    warmup = result["warmup_time"]
+    lines = [
+        f"运行时长: {result['run_length'] / SECONDS_PER_DAY:.2f}天，"
+        f"检测到的预热期: {warmup:.0f}秒（{warmup / 3600:.2f}小时）"
+    ]
+    for node_name, node_stats in result["stats"].items():
+        lines.append(f"{node_name}（预热期后 {node_stats['observations']} 个零件）")
+        for label, key, unit in (("稳态每天吞吐量", "throughput_per_day", "个/天"),
+                                 ("稳态平均寿命", "lifespan", "秒")):
+            interval = node_stats[key]
+            half_width = interval["half_width"]
+            half_text = "∞" if math.isinf(half_width) else f"{half_width:.2f}"
+            lines.append(
+                f"  {label}: {interval['mean']:.2f} ± {half_text} {unit}"
+                f"（{interval['batches']}批 × {interval['batch_size']}，"
+                f"批均值自相关 {interval['lag1']:.2f}）"
+            )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    sample_graph_data = {
+        "nodes": [
+            {
+                "name": "源",
+                "type": "源",
+                "data": {
+                    "time": {
+                        "interval_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 600},
+                        },
+                        "stop_time": "30:0:0:0",
+                    }
+                },
+            },
+            {"name": "缓冲区", "type": "缓冲区", "data": {"capacity": 20}},
+            {
+                "name": "加工工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 540},
+                        }
+                    }
+                },
+            },
+            {"name": "合格库存", "type": "物料终结", "data": {}},
+        ],
+        "edges": [
+            {"from": "源", "to": "缓冲区"},
+            {"from": "缓冲区", "to": "加工工位"},
+            {"from": "加工工位", "to": "合格库存"},
+        ],
+    }
+    print(format_steady_state(estimate_steady_state(sample_graph_data, seed=1)))
+    print(f"理论每天吞吐量: {SECONDS_PER_DAY / 600 * (1 - 0.9**21 * 0.1 / (1 - 0.9**22)):.2f}")
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+代理模型（元模型）：用试验设计（见experiment_design）的结果拟合因子取值到各统计量的映射，
+在拟合区域内不再仿真，直接插值回答what-if问题
+
+- 二次多项式回归：最小二乘，设计点不足时退化为一次或常数模型
+- 高斯过程（克里金）：平方指数核，长度尺度和噪声从候选网格中按对数边际似然选取
+- 拟合质量用留一交叉验证（LOO）衡量：多项式用帽子矩阵对角元，高斯过程用核矩阵的逆，
+  无需重复拟合；kind为"auto"时选LOO误差较小的模型
+- 所有统计量共用一组特征（多项式）或核向量（高斯过程），一次矩阵乘法得到全部预测值，
+  单点预测只需数微秒
+"""
+
+import math
+import re
+import time
+
+import numpy as np
+
+from experiment_design import (
+    DEFAULT_LHS_POINTS,
+    LATIN_HYPERCUBE,
+    _find_node,
+    apply_factors,
+    factor_name,
+    run_experiment,
+)
+from replication_runner import KPI_LABELS, KPI_NAMES
+from simulation_engine import BUFFER, CONVEYOR, STATION, parse_quantity, simulate_graph
+
+POLYNOMIAL = "polynomial"
+GAUSSIAN_PROCESS = "gp"
+SURROGATE_KINDS = (POLYNOMIAL, GAUSSIAN_PROCESS)
+
+# 高斯过程超参数候选（输入已缩放到[-1, 1]，输出已标准化）
+GP_LENGTH_SCALES = (0.15, 0.25, 0.4, 0.6, 0.8, 1.2, 1.8, 2.5)
+GP_NOISES = (1e-6, 1e-4, 1e-3, 1e-2, 5e-2, 1e-1)
+
+# 查询时的默认因子：节点名称后不写属性时使用
+DEFAULT_FIELDS = {
+    BUFFER: "capacity",
+    CONVEYOR: "capacity",
+    STATION: "time.processing_time.parameters.mean",
+}
+INTEGER_FIELDS = ("capacity",)
+DEFAULT_QUERY_SPAN = 0.5
+DEFAULT_QUERY_REPLICATIONS = 2
+
+
+def _polynomial_features(units, degree):
+    """常数项、一次项和（degree为2时）全部二次项"""
+    count, dims = units.shape
+    columns = [np.ones(count)]
+    if degree >= 1:
+        columns += [units[:, j] for j in range(dims)]
+    if degree >= 2:
+        columns += [units[:, j] * units[:, l] for j in range(dims) for l in range(j, dims)]
+    return np.column_stack(columns)
+
+
+def _polynomial_degree(points, dims):
+    for degree, features in ((2, 1 + dims + dims * (dims + 1) // 2), (1, 1 + dims)):
+        if points > features:
+            return degree
+    return 0
+
+
+def _fit_polynomial(units, targets):
+    """
+    返回:
+        tuple: (参数, LOO残差)
+    """
+    degree = _polynomial_degree(*units.shape)
+    features = _polynomial_features(units, degree)
+    pinv = np.linalg.pinv(features)
+    coefficients = pinv @ targets
+    leverage = np.einsum("ij,ji->i", features, pinv)
+    residuals = targets - features @ coefficients
+    with np.errstate(divide="ignore", invalid="ignore"):
+        loo = residuals / (1.0 - leverage)[:, None]
+    loo[~np.isfinite(loo)] = np.inf
+    return {"degree": degree, "coefficients": coefficients}, loo
+
+
+def _squared_distances(a, b):
+    return ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2)
+
+
+def _fit_gaussian_process(units, targets):
+    """
+    按对数边际似然（各统计量之和）选取长度尺度和噪声
+
+    返回:
+        tuple: (参数, LOO残差)
+    """
+    count = len(units)
+    distances = _squared_distances(units, units)
+    best = None
+    for length in GP_LENGTH_SCALES:
+        kernel = np.exp(-0.5 * distances / length ** 2)
+        for noise in GP_NOISES:
+            try:
+                factor = np.linalg.cholesky(kernel + noise * np.eye(count))
+            except np.linalg.LinAlgError:
+                continue
+            alpha = np.linalg.solve(factor.T, np.linalg.solve(factor, targets))
+            likelihood = (
+                -0.5 * np.sum(targets * alpha)
+                - targets.shape[1] * np.sum(np.log(np.diag(factor)))
+            )
+            if best is None or likelihood > best[0]:
+                best = (likelihood, length, noise, factor, alpha)
+    if best is None:
+        raise ValueError("高斯过程拟合失败：核矩阵不正定")
+    _, length, noise, factor, alpha = best
+    inverse_factor = np.linalg.solve(factor, np.eye(count))
+    inverse_diagonal = np.sum(inverse_factor ** 2, axis=0)
+    loo = alpha / inverse_diagonal[:, None]
+    return {"length": length, "noise": noise, "alpha": alpha, "points": units}, loo
+
+
+class SurrogateModel:
+    """拟合好的代理模型，predict()在拟合区域内插值全部统计量"""
+
+    def __init__(self, factors, kind, parameters, lower, upper, outputs, offset, scale, quality):
+        self.factors = factors
+        self.factor_names = [factor_name(factor) for factor in factors]
+        self.kind = kind
+        self.parameters = parameters
+        self.lower = lower
+        self.upper = upper
+        self._span = np.where(upper > lower, upper - lower, 1.0)
+        self.outputs = outputs  # [(物料终结名称, 统计量名称)]
+        self._offset = offset
+        self._scale = scale
+        self.quality = quality
+
+    def _units(self, values):
+        return 2.0 * (np.asarray(values, dtype=float) - self.lower) / self._span - 1.0
+
+    def predict_array(self, values):
+        """
+        批量预测
+
+        参数:
+            values: 形状(点数, 因子数)的取值
+
+        返回:
+            numpy.ndarray: 形状(点数, 输出数)，列顺序与outputs一致
+        """
+        units = self._units(np.atleast_2d(values))
+        parameters = self.parameters
+        if self.kind == POLYNOMIAL:
+            normalized = _polynomial_features(units, parameters["degree"]) @ parameters["coefficients"]
+        else:
+            kernel = np.exp(
+                -0.5 * _squared_distances(units, parameters["points"]) / parameters["length"] ** 2
+            )
+            normalized = kernel @ parameters["alpha"]
+        return normalized * self._scale + self._offset
+
+    def predict(self, values):
+        """
+        单点预测
+
+        参数:
+            values: 与因子一一对应的取值列表，或{因子列名: 取值}
+
+        返回:
+            dict: {物料终结名称: {统计量名称: 预测值}}
+        """
+        if isinstance(values, dict):
+            values = [values[name] for name in self.factor_names]
+        predicted = self.predict_array(values)[0]
+        result = {}
+        for (drain, kpi), value in zip(self.outputs, predicted):
+            result.setdefault(drain, {})[kpi] = float(value)
+        return result
+
+    def contains(self, values, tolerance=1e-9):
+        """取值是否在拟合区域内"""
+        if isinstance(values, dict):
+            values = [values[name] for name in self.factor_names]
+        values = np.asarray(values, dtype=float)
+        slack = tolerance * self._span
+        return bool(np.all(values >= self.lower - slack) and np.all(values <= self.upper + slack))
+
+
+def fit_surrogate(result, factors, kind="auto", kpis=KPI_NAMES):
+    """
+    用试验结果拟合代理模型
+
+    参数:
+        result: run_experiment的返回值
+        factors: 试验使用的因子声明列表（取值必须为数值）
+        kind: "polynomial"、"gp"或"auto"（选留一交叉验证误差较小的模型）
+        kpis: 需要拟合的统计量
+
+    返回:
+        SurrogateModel: quality为{物料终结名称: {统计量名称: {"r2", "loo_r2", "loo_rmse"}}}
+    """
+    if kind not in SURROGATE_KINDS + ("auto",):
+        raise ValueError(f"未知的代理模型类型 '{kind}'，可选: {', '.join(SURROGATE_KINDS)}, auto")
+    try:
+        values = np.array(result["points"], dtype=float).reshape(len(result["points"]), len(factors))
+    except (TypeError, ValueError):
+        raise ValueError("代理模型只支持数值因子")
+    if len(values) < 2:
+        raise ValueError("至少需要2个设计点才能拟合代理模型")
+    rows = result["rows"]
+    outputs = [(drain, kpi) for drain in rows[0]["summary"] for kpi in kpis]
+    targets = np.array([
+        [row["summary"][drain][kpi]["mean"] for drain, kpi in outputs] for row in rows
+    ], dtype=float)
+
+    # 拟合区域：因子的low/high（未给出时为设计点的取值范围）
+    lower, upper = values.min(axis=0), values.max(axis=0)
+    for column, factor in enumerate(factors):
+        if "low" in factor and "high" in factor:
+            lower[column] = min(lower[column], float(factor["low"]))
+            upper[column] = max(upper[column], float(factor["high"]))
+    span = np.where(upper > lower, upper - lower, 1.0)
+    units = 2.0 * (values - lower) / span - 1.0
+    offset = targets.mean(axis=0)
+    scale = targets.std(axis=0)
+    scale[scale <= 0] = 1.0
+    normalized = (targets - offset) / scale
+
+    candidates = {}
+    for candidate in (SURROGATE_KINDS if kind == "auto" else (kind,)):
+        fitter = _fit_polynomial if candidate == POLYNOMIAL else _fit_gaussian_process
+        try:
+            candidates[candidate] = fitter(units, normalized)
+        except (ValueError, np.linalg.LinAlgError):
+            continue
+    if not candidates:
+        raise ValueError("代理模型拟合失败")
+    chosen = min(candidates, key=lambda name: np.mean(candidates[name][1] ** 2))
+    parameters, loo = candidates[chosen]
+
+    model = SurrogateModel(factors, chosen, parameters, lower, upper, outputs, offset, scale, {})
+    fitted = model.predict_array(values)
+    total = ((targets - offset) ** 2).sum(axis=0)
+    for column, (drain, kpi) in enumerate(outputs):
+        loo_squares = float(np.sum((loo[:, column] * scale[column]) ** 2))
+        fit_squares = float(np.sum((targets[:, column] - fitted[:, column]) ** 2))
+        model.quality.setdefault(drain, {})[kpi] = {
+            "r2": 1.0 - fit_squares / total[column] if total[column] > 0 else 1.0,
+            "loo_r2": 1.0 - loo_squares / total[column] if total[column] > 0 else 1.0,
+            "loo_rmse": math.sqrt(loo_squares / len(values)),
+        }
+    return model
+
+
+def parse_query(text):
+    """
+    解析查询中的“名称=取值”对，如"缓冲区1=10 铣削工位=180"
+
+    返回:
+        dict: {名称: 数值}
+    """
+    pattern = r"([^\s=,，;；:：]+)\s*[=:：]\s*(-?\d+(?:\.\d+)?)"
+    return {name: float(value) for name, value in re.findall(pattern, text)}
+
+
+class SurrogateAdvisor:
+    """
+    交互式what-if问答：在已确认的图数据上按需拟合代理模型，
+    查询点在拟合区域内时直接插值，否则仿真
+    """
+
+    def __init__(self, graph_data, session=None, points=None,
+                 replications=DEFAULT_QUERY_REPLICATIONS, span=DEFAULT_QUERY_SPAN, seed=1):
+        """
+        参数:
+            graph_data: 当前图数据
+            session: 当前图数据的WhatIfSession（区域外的查询用它增量仿真），None时完整仿真
+            points: 拟合时拉丁超立方设计的点数，默认按因子个数确定
+            replications: 每个设计点的重复次数
+            span: 拟合区域为当前取值的±span倍（并包含查询值）
+        """
+        self.graph_data = graph_data
+        self.session = session
+        self.points = points
+        self.replications = replications
+        self.span = span
+        self.seed = seed
+        self.model = None
+
+    def _factor(self, name, value):
+        """把查询名称解析为因子声明（节点名称或“节点名称.属性路径”）"""
+        node_name, field = name, None
+        try:
+            node = _find_node(self.graph_data, name)
+        except ValueError:
+            node_name, _, field = name.partition(".")
+            node = _find_node(self.graph_data, node_name)
+        if field is None:
+            field = DEFAULT_FIELDS.get(node["type"])
+            if field is None:
+                raise ValueError(f"节点 {node_name} 没有默认的查询属性，请写成“节点名称.属性”")
+        current = node.get("data", {})
+        for key in field.split("."):
+            current = current.get(key) if isinstance(current, dict) else None
+        current = parse_quantity(current, value)
+        integer = field.split(".")[-1] in INTEGER_FIELDS
+        low = min(current * (1 - self.span), value)
+        high = max(current * (1 + self.span), value)
+        if integer:
+            low, high = max(1, math.floor(low)), math.ceil(high)
+        return {"node": node_name, "field": field, "low": low, "high": high, "integer": integer,
+                "name": name}
+
+    def fit(self, factors):
+        dims = len(factors)
+        points = self.points or max(DEFAULT_LHS_POINTS, (dims + 1) * (dims + 2) // 2 + 4)
+        result = run_experiment(
+            self.graph_data, factors, LATIN_HYPERCUBE, points=points,
+            replications=self.replications, seed=self.seed,
+        )
+        self.model = fit_surrogate(result, factors)
+        return self.model
+
+    def answer(self, text):
+        """
+        回答what-if查询
+
+        返回:
+            dict: values（{名称: 取值}）、prediction（{物料终结名称: {统计量名称: 值}}）、
+                  source（"surrogate"或"simulation"）、fitted（本次是否拟合了新模型）、
+                  quality（代理模型的拟合质量）、wall_time
+        """
+        start = time.perf_counter()
+        query = parse_query(text)
+        if not query:
+            raise ValueError("查询格式应为“名称=取值”，如“缓冲区1=10 铣削工位=180”")
+        factors = [self._factor(name, value) for name, value in query.items()]
+        values = [
+            int(round(value)) if factor["integer"] else value
+            for factor, value in zip(factors, query.values())
+        ]
+        model = self.model
+        fitted = False
+        if model is None or model.factor_names != [factor["name"] for factor in factors]:
+            model = self.fit(factors)
+            fitted = True
+
+        if model.contains(values):
+            prediction = model.predict(values)
+            source = "surrogate"
+        else:
+            variant = apply_factors(self.graph_data, factors, values)
+            if self.session is not None:
+                prediction = self.session.evaluate(variant)["statistics"]
+            else:
+                prediction = simulate_graph(variant, seed=self.seed)
+            source = "simulation"
+        return {
+            "values": dict(zip(query, values)),
+            "prediction": prediction,
+            "source": source,
+            "fitted": fitted,
+            "quality": model.quality,
+            "wall_time": time.perf_counter() - start,
+        }
+
+
+def format_surrogate(model):
+    """格式化代理模型的拟合质量"""
+    detail = (
+        f"{model.parameters['degree']}次多项式" if model.kind == POLYNOMIAL
+        else f"高斯过程（长度尺度 {model.parameters['length']}，噪声 {model.parameters['noise']}）"
+    )
+    lines = [f"代理模型: {detail}，因子: {', '.join(model.factor_names)}"]
+    for drain, kpis in model.quality.items():
+        for kpi, quality in kpis.items():
+            lines.append(
+                f"  {drain}.{KPI_LABELS[kpi]}: R² {quality['r2']:.3f}，"
+                f"留一R² {quality['loo_r2']:.3f}，留一RMSE {quality['loo_rmse']:.3f}"
+            )
+    return "\n".join(lines)
+
+
+def format_answer(answer, kpis=("statthroughputperday", "statavglifespan")):
+    """格式化what-if查询的回答"""
+    condition = "，".join(f"{name}={value:g}" for name, value in answer["values"].items())
+    if answer["source"] != "surrogate":
+        source = "超出拟合区域，已仿真"
+    elif answer["fitted"]:
+        source = "首次查询，已运行试验设计并拟合代理模型"
+    else:
+        source = "代理模型插值，未仿真"
+    lines = [f"🔮 {condition}（{source}，耗时 {answer['wall_time'] * 1000:.2f}毫秒）"]
+    for drain, values in answer["prediction"].items():
+        lines.append(
+            f"  {drain}: " + "，".join(f"{KPI_LABELS[kpi]} {values[kpi]:.2f}" for kpi in kpis)
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    sample_graph_data = {
+        "nodes": [
+            {
+                "name": "源",
+                "type": "源",
+                "data": {"time": {"interval_time": "0:0:4:0", "stop_time": "2:0:0:0"}},
+            },
+            {"name": "缓冲区", "type": "缓冲区", "data": {"capacity": 5}},
+            {
+                "name": "车削工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 200},
+                        }
+                    }
+                },
+            },
+            {
+                "name": "铣削工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 210},
+                        }
+                    }
+                },
+            },
+            {"name": "合格库存", "type": "物料终结", "data": {}},
+        ],
+        "edges": [
+            {"from": "源", "to": "缓冲区"},
+            {"from": "缓冲区", "to": "车削工位"},
+            {"from": "车削工位", "to": "铣削工位"},
+            {"from": "铣削工位", "to": "合格库存"},
+        ],
+    }
+    advisor = SurrogateAdvisor(sample_graph_data)
+    print(format_answer(advisor.answer("缓冲区=10 铣削工位=180")))
+    print(format_surrogate(advisor.model))
+    print(format_answer(advisor.answer("缓冲区=3 铣削工位=250")))
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        advisor.model.predict_array([8, 200])
+    print(f"单点预测耗时: {(time.perf_counter() - start) * 1000:.1f}微秒")
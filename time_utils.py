@@ -37,3 +37,41 @@ def format_time_value(time_data):
         else:
             # 默认格式化为分钟
             return f'"{time_data}:00"'
+
+
+def parse_time_to_seconds(time_data):
+    """
+    将传统时间格式转换为秒数（浮点数）
+    支持 "天:小时:分钟:秒"、"小时:分钟:秒"、"小时:分钟"、单独分钟值以及数值（单位为秒）
+    与format_time_value的字符串解释规则保持一致（"a:b"会被补成"a:b:00"，
+    Plant Simulation按小时:分钟:秒读取）
+    """
+    if isinstance(time_data, (int, float)):
+        return float(time_data)
+
+    time_parts = [part.strip() for part in str(time_data).strip().split(":")]
+    if len(time_parts) == 4:  # 天:小时:分钟:秒
+        days, hours, minutes, seconds = (float(part or 0) for part in time_parts)
+    elif len(time_parts) == 3:  # 小时:分钟:秒
+        days = 0.0
+        hours, minutes, seconds = (float(part or 0) for part in time_parts)
+    elif len(time_parts) == 2:  # 小时:分钟
+        days = seconds = 0.0
+        hours, minutes = (float(part or 0) for part in time_parts)
+    else:
+        # 默认按分钟解释（format_time_value会补成"分钟:00"）
+        days = hours = seconds = 0.0
+        minutes = float(time_parts[0])
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def parse_exported_time_to_seconds(text):
+    """
+    将Plant Simulation导出的时间统计量转换为秒数
+    导出格式与图数据不同："分钟:秒"（两段）、"小时:分钟:秒"（三段）、"天:小时:分钟:秒"（四段）
+    """
+    time_parts = [part.strip() for part in str(text).strip().split(":")]
+    if len(time_parts) == 2:  # 分钟:秒
+        minutes, seconds = (float(part or 0) for part in time_parts)
+        return minutes * 60 + seconds
+    return parse_time_to_seconds(text)
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基于事件轨迹（见event_trace）的向量化KPI计算：缓冲区的时间加权在制品、
+工位的利用率和可用率、物料终结的生存时间分布和分时段产出，并用利特尔法则检验一致性
+
+所有计算都是对整个记录数组的numpy运算（按节点稳定排序、累加求占用水平、
+按节点bincount求时间积分），不对单个事件做Python循环，千万级事件只需数秒
+"""
+
+import numpy as np
+
+from event_trace import (
+    TRACE_BLOCK,
+    TRACE_CREATE,
+    TRACE_ENTER,
+    TRACE_EXIT,
+    TRACE_FAIL,
+    TRACE_OUTAGE_END,
+    TRACE_OUTAGE_START,
+    TRACE_REPAIR,
+    TRACE_UNBLOCK,
+    EventTrace,
+    load_trace,
+)
+from simulation_engine import BUFFER, CONVEYOR, DRAIN, SECONDS_PER_DAY, STATION
+from time_utils import parse_time_to_seconds
+
+LIFESPAN_PERCENTILES = (5, 25, 50, 75, 95)
+DEFAULT_HISTOGRAM_BINS = 20
+# 利特尔法则L = λW的相对偏差不超过该值时视为一致（有限时长的边界效应）
+LITTLE_TOLERANCE = 0.05
+
+
+def _as_trace(trace):
+    return trace if isinstance(trace, EventTrace) else load_trace(trace)
+
+
+def _window(trace, start, end):
+    records = trace.records
+    if start is None:
+        start = trace.meta.get("start", 0.0)
+    if end is None:
+        end = trace.meta.get("end_time")
+        if end is None:
+            end = float(records["time"][-1]) if len(records) else start
+    return parse_time_to_seconds(start), parse_time_to_seconds(end)
+
+
+def _step_levels(nodes, times, deltas, start, end):
+    """
+    按节点累加阶跃变化，求每段的水平和（截断到[start, end]的）持续时间
+
+    参数:
+        nodes, times: 按时间排序的变化点
+        deltas: 变化量，形状(变化点个数, 计数器个数)，每列为一个计数器
+
+    返回:
+        tuple: (nodes, levels, durations)，按节点排序；levels为每个变化点之后各计数器的水平
+    """
+    order = np.argsort(nodes, kind="stable")
+    nodes = nodes[order]
+    times = times[order]
+    levels = np.cumsum(deltas[order], axis=0)
+    if len(nodes) == 0:
+        return nodes, levels, np.zeros(0)
+    # 减去此前节点累计的水平，使每个节点从0开始
+    boundary = nodes[1:] != nodes[:-1]
+    first = np.flatnonzero(np.r_[True, boundary])
+    base = np.zeros((len(first), levels.shape[1]), dtype=levels.dtype)
+    base[1:] = levels[first[1:] - 1]
+    levels -= base[np.cumsum(np.r_[True, boundary]) - 1]
+
+    following = np.empty_like(times)
+    following[:-1] = times[1:]
+    following[np.r_[boundary, True]] = end
+    durations = np.clip(following, start, end) - np.clip(times, start, end)
+    return nodes, levels, np.maximum(durations, 0.0)
+
+
+def _occupancy_changes(records):
+    """零件进入/产生（+1）和离开（-1）引起的各节点占用变化"""
+    kinds = records["kind"]
+    mask = (kinds == TRACE_ENTER) | (kinds == TRACE_CREATE) | (kinds == TRACE_EXIT)
+    selected = records[mask]
+    deltas = np.where(selected["kind"] == TRACE_EXIT, -1, 1).astype(np.int64)
+    return selected["node"], selected["time"], deltas
+
+
+def wip_by_node(trace, start=None, end=None):
+    """
+    各节点的时间加权平均在制品
+
+    返回:
+        dict: {节点名称: {"average": 平均在制品, "max": 最大在制品, "integral": 在制品×秒}}
+    """
+    trace = _as_trace(trace)
+    start, end = _window(trace, start, end)
+    horizon = end - start
+    count = len(trace.node_names)
+    nodes, times, deltas = _occupancy_changes(trace.records)
+    nodes, levels, durations = _step_levels(nodes, times, deltas[:, None], start, end)
+    level = levels[:, 0]
+    integral = np.bincount(nodes, weights=level * durations, minlength=count)
+    peak = np.zeros(count, dtype=np.int64)
+    if len(nodes):
+        np.maximum.at(peak, nodes, level)
+    return {
+        name: {
+            "average": float(integral[index] / horizon) if horizon > 0 else 0.0,
+            "max": int(peak[index]),
+            "integral": float(integral[index]),
+        }
+        for index, name in enumerate(trace.node_names)
+    }
+
+
+def station_states(trace, start=None, end=None):
+    """
+    各工位处于故障、阻塞、工作、缺料状态的时间占比（优先级依次降低，与bottleneck一致）
+
+    返回:
+        dict: {工位名称: {"working", "blocked", "starved", "failed",
+                          "utilisation"（工作占比）, "availability"（非故障占比）}}
+    """
+    trace = _as_trace(trace)
+    start, end = _window(trace, start, end)
+    horizon = end - start
+    records = trace.records
+    types = np.asarray(trace.node_types)
+    count = len(types)
+    is_station = types == STATION
+
+    kinds = records["kind"]
+    mask = is_station[records["node"]] & (kinds != TRACE_CREATE)
+    selected = records[mask]
+    kinds = selected["kind"]
+    # 三个计数器：占用、阻塞、停机（随机故障和计划停机可以重叠）
+    deltas = np.zeros((len(selected), 3), dtype=np.int64)
+    deltas[kinds == TRACE_ENTER, 0] = 1
+    deltas[kinds == TRACE_EXIT, 0] = -1
+    deltas[kinds == TRACE_BLOCK, 1] = 1
+    deltas[kinds == TRACE_UNBLOCK, 1] = -1
+    deltas[(kinds == TRACE_FAIL) | (kinds == TRACE_OUTAGE_START), 2] = 1
+    deltas[(kinds == TRACE_REPAIR) | (kinds == TRACE_OUTAGE_END), 2] = -1
+    nodes, levels, durations = _step_levels(selected["node"], selected["time"], deltas, start, end)
+
+    failed = levels[:, 2] > 0
+    blocked = ~failed & (levels[:, 1] > 0)
+    working = ~failed & ~blocked & (levels[:, 0] > 0)
+    totals = {
+        state: np.bincount(nodes, weights=durations * flags, minlength=count)
+        for state, flags in (("working", working), ("blocked", blocked), ("failed", failed))
+    }
+
+    result = {}
+    for index in np.flatnonzero(is_station):
+        shares = {
+            state: float(values[index] / horizon) if horizon > 0 else 0.0
+            for state, values in totals.items()
+        }
+        shares["starved"] = max(0.0, 1.0 - shares["working"] - shares["blocked"] - shares["failed"])
+        shares["utilisation"] = shares["working"]
+        shares["availability"] = 1.0 - shares["failed"]
+        result[trace.node_names[index]] = shares
+    return result
+
+
+def _creation_times(records):
+    """按零件编号索引的产生时间（零件编号按产生顺序连续分配）"""
+    created = records[records["kind"] == TRACE_CREATE]
+    times = np.full(int(created["part"].max()) + 1 if len(created) else 0, np.nan)
+    times[created["part"]] = created["time"]
+    return times
+
+
+def _drain_exits(records, types):
+    drain = np.asarray(types) == DRAIN
+    exits = records[records["kind"] == TRACE_EXIT]
+    return exits[drain[exits["node"]]] if len(drain) else exits[:0]
+
+
+def lifespan_distribution(trace, bins=DEFAULT_HISTOGRAM_BINS, percentiles=LIFESPAN_PERCENTILES):
+    """
+    各物料终结删除的零件的生存时间（离开时刻 - 产生时刻）分布
+
+    返回:
+        dict: {物料终结名称: {"count", "mean", "stddev", "min", "max",
+                              "percentiles": {百分位: 秒}, "histogram": {"edges", "counts"}}}
+    """
+    trace = _as_trace(trace)
+    records = trace.records
+    created = _creation_times(records)
+    exits = _drain_exits(records, trace.node_types)
+    lifespans = exits["time"] - created[exits["part"]] if len(exits) else np.zeros(0)
+    result = {}
+    for index, (name, node_type) in enumerate(zip(trace.node_names, trace.node_types)):
+        if node_type != DRAIN:
+            continue
+        values = lifespans[exits["node"] == index]
+        if len(values) == 0:
+            result[name] = {"count": 0}
+            continue
+        counts, edges = np.histogram(values, bins=bins)
+        result[name] = {
+            "count": int(len(values)),
+            "mean": float(values.mean()),
+            "stddev": float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "percentiles": {
+                percentile: float(value)
+                for percentile, value in zip(percentiles, np.percentile(values, percentiles))
+            },
+            "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+        }
+    return result
+
+
+def bucket_throughput(trace, bucket, start=None, end=None):
+    """
+    各物料终结按时间段统计的产出
+
+    参数:
+        bucket: 时间段长度（秒或时间字符串，如"0:1:0:0"为每小时）
+
+    返回:
+        dict: {"edges": 时间段边界（秒）, "drains": {物料终结名称: {"counts": 各段产出个数,
+               "per_day": 各段折算的日产出}}}
+    """
+    trace = _as_trace(trace)
+    start, end = _window(trace, start, end)
+    bucket = parse_time_to_seconds(bucket)
+    if bucket <= 0:
+        raise ValueError("时间段长度必须大于0")
+    edges = np.arange(start, end, bucket, dtype=float)
+    edges = np.append(edges, end) if len(edges) == 0 or edges[-1] < end else edges
+    widths = np.diff(edges)
+    exits = _drain_exits(trace.records, trace.node_types)
+    drains = {}
+    for index, (name, node_type) in enumerate(zip(trace.node_names, trace.node_types)):
+        if node_type != DRAIN:
+            continue
+        counts, _ = np.histogram(exits["time"][exits["node"] == index], bins=edges)
+        drains[name] = {
+            "counts": counts.tolist(),
+            "per_day": (counts * SECONDS_PER_DAY / np.where(widths > 0, widths, np.inf)).tolist(),
+        }
+    return {"edges": edges.tolist(), "drains": drains}
+
+
+def _sojourn_times(records):
+    """
+    各零件在各节点的停留时间（进入与离开按(节点, 零件)配对）
+
+    返回:
+        tuple: (nodes, departure_times, sojourns)，只包含已离开的零件
+    """
+    kinds = records["kind"]
+    arrivals = records[(kinds == TRACE_ENTER) | (kinds == TRACE_CREATE)]
+    departures = records[kinds == TRACE_EXIT]
+    if len(arrivals) == 0 or len(departures) == 0:
+        return np.zeros(0, dtype=np.int32), np.zeros(0), np.zeros(0)
+    stride = np.int64(max(int(arrivals["part"].max()), int(departures["part"].max())) + 1)
+    arrival_keys = arrivals["node"].astype(np.int64) * stride + arrivals["part"]
+    departure_keys = departures["node"].astype(np.int64) * stride + departures["part"]
+    order = np.argsort(arrival_keys, kind="stable")
+    sorted_keys = arrival_keys[order]
+    position = np.clip(np.searchsorted(sorted_keys, departure_keys), 0, len(sorted_keys) - 1)
+    matched = sorted_keys[position] == departure_keys
+    sojourns = departures["time"][matched] - arrivals["time"][order[position[matched]]]
+    return departures["node"][matched], departures["time"][matched], sojourns
+
+
+def littles_law(trace, start=None, end=None, tolerance=LITTLE_TOLERANCE, wip=None):
+    """
+    利特尔法则检验：时间加权平均在制品L与离开率λ×平均停留时间W比较
+
+    从产生到仿真结束的完整轨迹中两者只差边界效应（开始/结束时仍在系统中的零件），
+    偏差明显时说明轨迹不完整或统计有误
+
+    参数:
+        wip: 同一时间窗口已计算的wip_by_node结果（避免重复计算）
+
+    返回:
+        dict: {"system": {...}, "nodes": {节点名称: {...}}}，每项为
+              {"L", "lambda"（个/秒）, "W"（秒）, "lambda_W", "deviation"（相对偏差）, "consistent"}
+    """
+    trace = _as_trace(trace)
+    start, end = _window(trace, start, end)
+    horizon = end - start
+    records = trace.records
+    count = len(trace.node_names)
+
+    def check(average_wip, departures, mean_sojourn):
+        rate = departures / horizon if horizon > 0 else 0.0
+        product = rate * mean_sojourn
+        scale = max(abs(average_wip), abs(product))
+        deviation = abs(average_wip - product) / scale if scale > 0 else 0.0
+        return {
+            "L": float(average_wip),
+            "lambda": float(rate),
+            "W": float(mean_sojourn),
+            "lambda_W": float(product),
+            "deviation": float(deviation),
+            "consistent": bool(deviation <= tolerance),
+        }
+
+    if wip is None:
+        wip = wip_by_node(trace, start, end)
+    nodes, departed_at, sojourns = _sojourn_times(records)
+    inside = (departed_at >= start) & (departed_at <= end)  # 只统计在窗口内离开的零件
+    node_checks = {}
+    departure_counts = np.bincount(nodes[inside], minlength=count)
+    sojourn_totals = np.bincount(nodes[inside], weights=sojourns[inside], minlength=count)
+    for index, name in enumerate(trace.node_names):
+        departed = departure_counts[index]
+        mean = sojourn_totals[index] / departed if departed else 0.0
+        node_checks[name] = check(wip[name]["average"], departed, mean)
+
+    # 整个系统：在制品为全部节点之和，停留时间为生存时间
+    system_wip = sum(values["average"] for values in wip.values())
+    created = _creation_times(records)
+    exits = _drain_exits(records, trace.node_types)
+    exits = exits[(exits["time"] >= start) & (exits["time"] <= end)]
+    lifespans = exits["time"] - created[exits["part"]] if len(exits) else np.zeros(0)
+    system = check(system_wip, len(lifespans), lifespans.mean() if len(lifespans) else 0.0)
+    return {"system": system, "nodes": node_checks}
+
+
+def trace_kpis(trace, bucket="0:1:0:0", start=None, end=None, bins=DEFAULT_HISTOGRAM_BINS):
+    """
+    计算全部KPI
+
+    参数:
+        trace: EventTrace或轨迹文件路径
+        bucket: 分时段产出的时间段长度，None表示不统计
+        start/end: 统计时间窗口，默认为统计开始时刻和仿真结束时间
+
+    返回:
+        dict: horizon、wip（缓冲区和传送器）、stations、lifespans、throughput、little
+    """
+    trace = _as_trace(trace)
+    start, end = _window(trace, start, end)
+    wip = wip_by_node(trace, start, end)
+    return {
+        "horizon": end - start,
+        "wip": {
+            name: wip[name]
+            for name, node_type in zip(trace.node_names, trace.node_types)
+            if node_type in (BUFFER, CONVEYOR)
+        },
+        "stations": station_states(trace, start, end),
+        "lifespans": lifespan_distribution(trace, bins=bins),
+        "throughput": bucket_throughput(trace, bucket, start, end) if bucket else None,
+        "little": littles_law(trace, start, end, wip=wip),
+    }
+
+
+def format_trace_kpis(kpis):
+    """格式化KPI结果"""
+    lines = [f"统计时长: {kpis['horizon'] / 3600:.2f} 小时"]
+    for name, values in kpis["wip"].items():
+        lines.append(f"{name}: 平均在制品 {values['average']:.2f}，最大 {values['max']}")
+    for name, shares in kpis["stations"].items():
+        lines.append(
+            f"{name}: 利用率 {shares['utilisation'] * 100:.1f}%，可用率 {shares['availability'] * 100:.1f}%"
+            f"（阻塞 {shares['blocked'] * 100:.1f}%，缺料 {shares['starved'] * 100:.1f}%）"
+        )
+    for name, values in kpis["lifespans"].items():
+        if not values["count"]:
+            lines.append(f"{name}: 无产出")
+            continue
+        percentiles = "，".join(
+            f"P{percentile} {value:.0f}秒" for percentile, value in values["percentiles"].items()
+        )
+        lines.append(
+            f"{name}: 生存时间均值 {values['mean']:.1f}秒，标准差 {values['stddev']:.1f}秒（{percentiles}）"
+        )
+    if kpis["throughput"]:
+        for name, values in kpis["throughput"]["drains"].items():
+            per_day = np.asarray(values["per_day"])
+            lines.append(
+                f"{name}: 分时段日产出 最小 {per_day.min():.1f}，最大 {per_day.max():.1f}"
+            )
+    system = kpis["little"]["system"]
+    mark = "✅" if system["consistent"] else "⚠️"
+    lines.append(
+        f"{mark} 利特尔法则: L = {system['L']:.2f}，λW = {system['lambda_W']:.2f}"
+        f"（偏差 {system['deviation'] * 100:.2f}%）"
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+
+    from event_trace import trace_simulation
+
+    sample_graph_data = {
+        "nodes": [
+            {
+                "name": "源",
+                "type": "源",
+                "data": {"time": {"interval_time": "0:0:1:0", "stop_time": "7:0:0:0"}},
+            },
+            {"name": "缓冲区", "type": "缓冲区", "data": {"capacity": 5}},
+            {
+                "name": "测试工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 55},
+                        }
+                    },
+                    "failure": {
+                        "interval_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 20000},
+                        },
+                        "duration_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 1200},
+                        },
+                    },
+                },
+            },
+            {"name": "合格库存", "type": "物料终结", "data": {}},
+        ],
+        "edges": [
+            {"from": "源", "to": "缓冲区"},
+            {"from": "缓冲区", "to": "测试工位"},
+            {"from": "测试工位", "to": "合格库存"},
+        ],
+    }
+    path = os.path.join(tempfile.gettempdir(), "sitp_trace.bin")
+    statistics = trace_simulation(sample_graph_data, path, seed=1)
+    start = time.perf_counter()
+    kpis = trace_kpis(path, bucket="1:0:0:0")
+    print(f"KPI计算耗时 {time.perf_counter() - start:.3f}秒")
+    print(format_trace_kpis(kpis))
+    print(f"仿真统计的平均生存时间: {statistics['合格库存']['statavglifespan']:.1f}秒")
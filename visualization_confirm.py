@@ -3,6 +3,19 @@
 """
 import json
 from visualize import ProductionLineVisualizer
+from queueing_estimator import estimate_graph, format_estimate
+from bottleneck import bottleneck_highlight, format_bottleneck_report
+from what_if import WhatIfSession, format_what_if
+from surrogate import SurrogateAdvisor, format_answer
+
+# 上一版图数据的what-if会话：用户修改后只重新仿真受影响的部分，并显示与上一版的差值
+_what_if_session = None
+
+
+def reset_what_if_session():
+    """开始处理新的生产线描述时调用，丢弃上一条描述的what-if会话"""
+    global _what_if_session
+    _what_if_session = None
 
 
 def visualize_and_confirm(graph_data, conversation_history):
@@ -17,19 +30,61 @@ def visualize_and_confirm(graph_data, conversation_history):
         bool: 用户是否最终确认（True/False）
         dict: 最终确认的图形数据（仅当确认时有效）
     """
+    global _what_if_session
     try:
         while True:
             # 初始化字体配置
             ProductionLineVisualizer.initialize_fonts(print_fonts=False)
 
+            # 解析估算作为可视化旁的参考数据（无需Plant Simulation）
+            try:
+                print(format_estimate(estimate_graph(graph_data)))
+            except Exception as e:
+                print(f"⚠️ 解析估算失败: {str(e)}")
+
+            # 与上一版图数据比较（结构相同时从受影响的检查点开始重新仿真）
+            try:
+                streams = None
+                if _what_if_session is not None:
+                    print("🔁 与上一版本相比:")
+                    print(format_what_if(_what_if_session.evaluate(graph_data)))
+                    # 沿用上一版的随机数流：图数据未变时瓶颈分析结果也不变
+                    streams = _what_if_session.streams
+                _what_if_session = WhatIfSession(graph_data, seed=streams)
+            except Exception as e:
+                _what_if_session = None
+                print(f"⚠️ what-if比较失败: {str(e)}")
+
+            # “? 缓冲区1=10 铣削工位=180”形式的查询：按需拟合代理模型，拟合区域内无需仿真
+            advisor = SurrogateAdvisor(graph_data, session=_what_if_session)
+
+            # 用what-if会话的基准运行进行瓶颈分析，在有向图上标记主导瓶颈
+            highlight = {}
+            if _what_if_session is not None:
+                try:
+                    bottleneck_report = _what_if_session.bottlenecks
+                    print(format_bottleneck_report(bottleneck_report))
+                    highlight = bottleneck_highlight(bottleneck_report)
+                except Exception as e:
+                    print(f"⚠️ 瓶颈分析失败: {str(e)}")
+
             # 可视化有向图
             print("📊 正在可视化有向图...")
             visualizer = ProductionLineVisualizer()
-            visualizer.show_static(graph_data, title="生产线有向图可视化")
+            visualizer.show_static(graph_data, title="生产线有向图可视化", highlight=highlight)
 
             # 用户确认流程
             while True:
-                confirm = input("\n👀 请查看可视化图形，是否符合预期？(yes/no): ").strip().lower()
+                answer = input(
+                    "\n👀 请查看可视化图形，是否符合预期？(yes/no，输入“? 节点=取值”查询假设情景): "
+                ).strip()
+                if answer.startswith(("?", "？")):
+                    try:
+                        print(format_answer(advisor.answer(answer[1:])))
+                    except Exception as e:
+                        print(f"⚠️ 查询失败: {str(e)}")
+                    continue
+                confirm = answer.lower()
                 if confirm in ["yes", "y"]:
                     print("👍 确认符合预期，继续生成模型...")
                     return True, graph_data
@@ -226,8 +226,15 @@ class ProductionLineVisualizer:
         text_widget.insert(tk.END, "\n".join(attr_text))
         text_widget.config(state=tk.DISABLED)  # 设置为只读
 
-    def show_static(self, graph_data, title="生产线有向图模型"):
-        """显示静态有向图，支持点击节点查看属性"""
+    def show_static(self, graph_data, title="生产线有向图模型", highlight=None):
+        """
+        显示静态有向图，支持点击节点查看属性
+
+        参数:
+            highlight: 需要标记的节点{节点名称: 标注文字}（如瓶颈分析的主导瓶颈），
+                       标记的节点以红色粗边框显示，标注文字显示在节点名称下方
+        """
+        highlight = highlight or {}
         G = nx.DiGraph()
         valid_nodes = []
         self.node_info = {}  # 重置节点信息
@@ -310,6 +317,8 @@ class ProductionLineVisualizer:
             per_char_size = 500
             node_size = base_size + name_length * per_char_size
             node_sizes.append(node_size)
+        edge_colors = ['#D50000' if node in highlight else 'black' for node in G.nodes]
+        edge_widths = [4.0 if node in highlight else 1.2 for node in G.nodes]
 
         # 创建图形和轴
         fig, ax = plt.subplots(figsize=(10, 6))
@@ -319,14 +328,15 @@ class ProductionLineVisualizer:
             G, self.pos,
             node_color=node_colors,
             node_size=node_sizes,
-            edgecolors='black',
-            linewidths=1.2,
+            edgecolors=edge_colors,
+            linewidths=edge_widths,
             ax=ax
         )
 
         # 绘制节点标签
         nx.draw_networkx_labels(
             G, self.pos,
+            labels={node: f"{node}\n{highlight[node]}" if node in highlight else node for node in G.nodes},
             font_size=12,
             font_family=['SimHei', 'WenQuanYi Micro Hei', 'Heiti TC'],
             verticalalignment='center',
@@ -359,6 +369,19 @@ class ProductionLineVisualizer:
                     markeredgewidth=1.2
                 )
             )
+        if highlight:
+            legend_elements.append(
+                plt.Line2D(
+                    [0], [0],
+                    marker='o',
+                    color='w',
+                    label='瓶颈',
+                    markerfacecolor='w',
+                    markersize=12,
+                    markeredgecolor='#D50000',
+                    markeredgewidth=3
+                )
+            )
 
         ax.legend(
             handles=legend_elements,
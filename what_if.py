@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量what-if仿真：保留基准运行的随机数流和检查点，修改参数后只从变更开始影响
+轨迹之前的最后一个检查点重新仿真，并给出相对基准统计量的差值
+
+- 基准运行按固定间隔保存检查点（见snapshot.capture_state：事件表、各节点的零件、
+  故障状态、抽样器已取出的样本数），
+  物料终结的退出记录只保存长度（基准记录的前缀即检查点时刻的记录）
+- 每个(节点, 用途)的随机数流在变体中保持不变（公共随机数），
+  恢复检查点时按已取出的样本数把抽样器推进到相同位置
+- 变更开始影响轨迹的时刻:
+    - 时间分布（加工时间、源的产出间隔、故障间隔/持续时间）和合格率：该抽样器第一次取样
+    - 缓冲区/传送器容量：容量减小到c时为占用第一次超过c，增大时为第一次占满
+    - 传送器长度/速度：第一个零件进入
+    - 其他修改（节点、边的增删，源的开始/结束时间等）：从头重新仿真
+"""
+
+import time
+
+from bottleneck import StateTrackingSimulator, bottleneck_report
+from experiment_design import apply_factors
+from replication_runner import KPI_LABELS
+from sampling import (
+    PURPOSE_FAILURE_DURATION,
+    PURPOSE_FAILURE_INTERVAL,
+    PURPOSE_INTERVAL,
+    PURPOSE_PROCESSING,
+    PURPOSE_ROUTING,
+    RandomStreams,
+)
+from simulation_engine import BUFFER, CONVEYOR, DRAIN, SOURCE, ProductionLineSimulator
+from snapshot import capture_state, restore_state
+
+DEFAULT_CHECKPOINTS = 50
+
+
+class _RecordingSimulator(StateTrackingSimulator):
+    """
+    记录各节点最大占用量的仿真器（用于判断容量修改开始影响轨迹的时刻），
+    同时记录工位状态，基准运行的瓶颈分析无需再仿真一次
+    """
+
+    def __init__(self, graph_data, seed=None, end_time=None):
+        super().__init__(graph_data, seed=seed, end_time=end_time)
+        self.peak = [0] * len(self.nodes)
+
+    def _enter(self, sim_node, part):
+        super()._enter(sim_node, part)
+        if len(sim_node.parts) > self.peak[sim_node.index]:
+            self.peak[sim_node.index] = len(sim_node.parts)
+
+
+def _same_structure(baseline_graph, variant_graph):
+    base_nodes = baseline_graph.get("nodes", [])
+    variant_nodes = variant_graph.get("nodes", [])
+    if [(n["name"], n["type"]) for n in base_nodes] != [(n["name"], n["type"]) for n in variant_nodes]:
+        return False
+    return [(e["from"], e["to"]) for e in baseline_graph.get("edges", [])] == [
+        (e["from"], e["to"]) for e in variant_graph.get("edges", [])
+    ]
+
+
+def _time_changes(old_time, new_time):
+    """比较节点time属性，返回变化的键"""
+    old_time = old_time if isinstance(old_time, dict) else {}
+    new_time = new_time if isinstance(new_time, dict) else {}
+    return {key for key in set(old_time) | set(new_time) if old_time.get(key) != new_time.get(key)}
+
+
+def _change_conditions(index, node_type, old_data, new_data):
+    """
+    节点修改对应的“尚未影响轨迹”条件
+
+    返回:
+        list: [(种类, 节点序号, 参数)]，种类为"sampler"（参数用途的抽样器尚未取样）、
+              "capacity"（容量修改尚未起作用）、"peak_at_most"（最大占用不超过参数）；
+              返回None表示需要从头重新仿真
+    """
+    conditions = []
+    for key in set(old_data) | set(new_data):
+        old_value, new_value = old_data.get(key), new_data.get(key)
+        if old_value == new_value:
+            continue
+        if key == "time":
+            for time_key in _time_changes(old_value, new_value):
+                if node_type == SOURCE and time_key == "interval_time":
+                    conditions.append(("sampler", index, PURPOSE_INTERVAL))
+                elif node_type != SOURCE and time_key == "processing_time":
+                    conditions.append(("sampler", index, PURPOSE_PROCESSING))
+                else:
+                    return None
+        elif key == "failure" and isinstance(old_value, dict) and isinstance(new_value, dict):
+            for failure_key in set(old_value) | set(new_value):
+                if old_value.get(failure_key) == new_value.get(failure_key):
+                    continue
+                if failure_key == "interval_time":
+                    conditions.append(("sampler", index, PURPOSE_FAILURE_INTERVAL))
+                elif failure_key == "duration_time":
+                    conditions.append(("sampler", index, PURPOSE_FAILURE_DURATION))
+                elif failure_key != "failure_name":
+                    return None
+        elif key == "production_status":
+            conditions.append(("sampler", index, PURPOSE_ROUTING))
+        elif key == "capacity" and node_type in (BUFFER, CONVEYOR):
+            conditions.append(("capacity", index, None))
+        elif key in ("length", "speed") and node_type == CONVEYOR:
+            conditions.append(("peak_at_most", index, 0))
+        else:
+            return None
+    return conditions
+
+
+class WhatIfSession:
+    """保留基准运行的what-if会话，evaluate()可反复调用"""
+
+    def __init__(self, graph_data, seed=None, end_time=None, checkpoints=DEFAULT_CHECKPOINTS):
+        """
+        参数:
+            graph_data: 基准图数据
+            seed: 随机数种子，基准和所有变体共用同一组随机数流
+            end_time: 仿真结束时间，默认使用源节点的stop_time
+            checkpoints: 基准运行中等间隔保存的检查点个数
+
+        基准运行的瓶颈分析保存在bottlenecks中（格式同bottleneck.analyze_bottlenecks）
+        """
+        self.graph_data = graph_data
+        self.end_time = end_time
+        self.streams = seed if isinstance(seed, RandomStreams) else RandomStreams(seed)
+        start = time.perf_counter()
+        sim = _RecordingSimulator(graph_data, seed=self.streams, end_time=end_time)
+        self.checkpoints = []
+        horizon = sim.end_time
+        for position in range(1, checkpoints + 1):
+            until = horizon * position / (checkpoints + 1)
+            sim._advance(until)
+            sim.now = until
+            state = capture_state(sim)
+            state["peak"] = list(sim.peak)
+            self.checkpoints.append(state)
+        self.statistics = sim.run()
+        sim.finish_tracking()
+        self.bottlenecks = bottleneck_report(sim, self.statistics)
+        self.wall_time = time.perf_counter() - start
+        self.horizon = horizon
+        self.capacities = [sim_node.capacity for sim_node in sim.nodes]
+        self.exit_history = {
+            sim_node.index: (sim_node.exit_times, sim_node.lifespans)
+            for sim_node in sim.nodes
+            if sim_node.type == DRAIN
+        }
+
+    @staticmethod
+    def _unaffected(state, conditions):
+        for kind, index, value in conditions:
+            if kind == "sampler":
+                if state["nodes"][index]["drawn"].get(value, 0) > 0:
+                    return False
+            elif state["peak"][index] > value:
+                return False
+        return True
+
+    def resume_point(self, variant_graph):
+        """
+        变体可以复用的最后一个检查点
+
+        返回:
+            dict: 检查点状态；需要从头重新仿真时返回None
+        """
+        if not _same_structure(self.graph_data, variant_graph):
+            return None
+        variant_sim = ProductionLineSimulator(variant_graph, seed=self.streams, end_time=self.end_time)
+        if variant_sim.end_time != self.horizon:
+            return None
+        conditions = []
+        for index, (old_node, new_node) in enumerate(
+            zip(self.graph_data["nodes"], variant_graph["nodes"])
+        ):
+            node_conditions = _change_conditions(
+                index, old_node["type"], old_node.get("data", {}), new_node.get("data", {})
+            )
+            if node_conditions is None:
+                return None
+            for kind, node_index, value in node_conditions:
+                if kind == "capacity":
+                    # 容量减小到c：最大占用不超过c；增大：基准中从未占满
+                    old_capacity = self.capacities[node_index]
+                    new_capacity = variant_sim.nodes[node_index].capacity
+                    if new_capacity == old_capacity:
+                        continue
+                    kind, value = "peak_at_most", min(new_capacity, old_capacity - 1)
+                conditions.append((kind, node_index, value))
+
+        resume = None
+        for state in self.checkpoints:
+            if not self._unaffected(state, conditions):
+                break
+            resume = state
+        return resume
+
+    def evaluate(self, variant_graph):
+        """
+        仿真变体并与基准比较
+
+        返回:
+            dict: statistics（变体统计）、delta（{物料终结名称: {统计量名称:
+                  {"baseline", "variant", "delta", "relative"}}}）、resumed_from（复用到的时刻，秒）、
+                  resimulated（重新仿真的时长占比）、wall_time、baseline_wall_time
+        """
+        start = time.perf_counter()
+        resume = self.resume_point(variant_graph)
+        sim = ProductionLineSimulator(variant_graph, seed=self.streams, end_time=self.end_time)
+        if resume is not None:
+            restore_state(sim, resume, self.exit_history)
+        statistics = sim.run()
+        resumed_from = resume["now"] if resume is not None else 0.0
+
+        delta = {}
+        for node_name, kpis in statistics.items():
+            baseline = self.statistics.get(node_name)
+            if baseline is None:
+                continue
+            delta[node_name] = {}
+            for kpi, value in kpis.items():
+                base_value = baseline[kpi]
+                delta[node_name][kpi] = {
+                    "baseline": base_value,
+                    "variant": value,
+                    "delta": value - base_value,
+                    "relative": (value - base_value) / base_value if base_value else 0.0,
+                }
+        return {
+            "statistics": statistics,
+            "delta": delta,
+            "resumed_from": resumed_from,
+            "resimulated": (self.horizon - resumed_from) / self.horizon if self.horizon > 0 else 1.0,
+            "wall_time": time.perf_counter() - start,
+            "baseline_wall_time": self.wall_time,
+        }
+
+    def what_if(self, node_name, field, value):
+        """
+        修改单个节点属性后的what-if（如加工时间均值改为原来的0.9倍）
+
+        参数:
+            field: 节点data中的属性路径，以“.”分隔，如"time.processing_time.parameters.mean"
+        """
+        factors = [{"node": node_name, "field": field}]
+        return self.evaluate(apply_factors(self.graph_data, factors, [value]))
+
+
+def format_what_if(result):
+    """格式化what-if结果"""
+    lines = [
+        f"what-if: 从 {result['resumed_from'] / 3600:.2f} 小时处恢复，"
+        f"重新仿真 {result['resimulated'] * 100:.1f}% 的时长，耗时 {result['wall_time']:.3f}秒"
+        f"（基准 {result['baseline_wall_time']:.3f}秒）"
+    ]
+    for node_name, kpis in result["delta"].items():
+        lines.append(node_name)
+        for kpi, values in kpis.items():
+            lines.append(
+                f"  {KPI_LABELS[kpi]}: {values['baseline']:.2f} → {values['variant']:.2f}"
+                f"（{values['delta']:+.2f}，{values['relative'] * 100:+.1f}%）"
+            )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    sample_graph_data = {
+        "nodes": [
+            {
+                "name": "源",
+                "type": "源",
+                "data": {"time": {"interval_time": "0:0:5:0", "stop_time": "5:0:0:0"}},
+            },
+            {"name": "缓冲区", "type": "缓冲区", "data": {"capacity": 5}},
+            {
+                "name": "铣削工位",
+                "type": "工位",
+                "data": {
+                    "time": {
+                        "processing_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 270},
+                        }
+                    },
+                    "failure": {
+                        "start_time": "0:0:0:0",
+                        "interval_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 36000},
+                        },
+                        "duration_time": {
+                            "distribution_pattern": "negexp",
+                            "parameters": {"mean": 3600},
+                        },
+                    },
+                },
+            },
+            {"name": "合格库存", "type": "物料终结", "data": {}},
+        ],
+        "edges": [
+            {"from": "源", "to": "缓冲区"},
+            {"from": "缓冲区", "to": "铣削工位"},
+            {"from": "铣削工位", "to": "合格库存"},
+        ],
+    }
+    session = WhatIfSession(sample_graph_data, seed=1)
+    # 铣削工位快10%：从第一个零件开始影响轨迹，需要完整重新仿真
+    print(format_what_if(session.what_if("铣削工位", "time.processing_time.parameters.mean", 243)))
+    # 故障持续时间加倍：从第一次故障开始影响轨迹
+    print(format_what_if(session.what_if("铣削工位", "failure.duration_time.parameters.mean", 7200)))
+    # 缓冲区容量加倍：从缓冲区第一次占满开始影响轨迹
+    print(format_what_if(session.what_if("缓冲区", "capacity", 10)))